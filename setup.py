@@ -47,6 +47,7 @@ setup(
         'console_scripts': [
             'srs2d-pso = srs2d.pso:main',
             'srs2d-ga = srs2d.ga:main',
+            'srs2d-cmaes = srs2d.cmaes:main',
         ],
     }
 )
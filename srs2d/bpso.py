@@ -19,24 +19,29 @@ __author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
 __date__ = "04 Jul 2013"
 
 import os
+import sys
 import argparse
 import random
 import logging
 import physics
+import codec
+import checkpoint
+import recorder
 import pyopencl as cl
 import logging.config
-import solace
+import report
+import sweep
+import evaluator
 import io
 # import png
 import subprocess
 import numpy as np
 import math
-import tempfile
 
 logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
 __log__ = logging.getLogger(__name__)
 
-def main():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbosity",        help="increase output verbosity", action="count")
     parser.add_argument("-q", "--quiet",            help="supress output (except errors)", action="store_true")
@@ -58,7 +63,14 @@ def main():
     parser.add_argument("--random-targets",         help="place targets at random position (obeying targets distances)", action="store_true")
     parser.add_argument("--symetrical-targets",     help="place targets at symetrical position", action="store_true")
     parser.add_argument("-t", "--trials",           help="number of trials per distance, default is 3", type=int, default=3)
-    args = parser.parse_args()
+    parser.add_argument("--checkpoint",             help="save the state of each run to FILE.runNN periodically", metavar="FILE", type=str)
+    parser.add_argument("--checkpoint-freq",        help="frequency of checkpoints (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--resume",                 help="resume runs from their checkpoints (requires --checkpoint)", action="store_true")
+    parser.add_argument("--lazy-recording",         help="do not record new bests, write an index to FILE.runNN to replay them later", metavar="FILE", type=str)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    parser.add_argument("--lockstep",               help="advance all runs together, evaluating their populations in one simulation batch per generation", action="store_true")
+    evaluator.add_arguments(parser)
+    args = parser.parse_args(argv)
 
     if args.verbosity >= 2:
         __log__.setLevel(logging.DEBUG)
@@ -70,31 +82,20 @@ def main():
     if args.quiet:
         __log__.setLevel(logging.ERROR)
 
-    uri = os.environ.get('SOLACE_URI')
-    username = os.environ.get('SOLACE_USERNAME')
-    password = os.environ.get('SOLACE_PASSWORD')
+    if args.resume and (args.checkpoint is None):
+        __log__.error('--resume requires --checkpoint!')
+        sys.exit(1)
 
     try:
-        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
-    except:
-        git_version = None
+        evaluator.check_args(args)
+    except ValueError as e:
+        __log__.error(str(e))
+        sys.exit(1)
 
-    if (uri is None) or (username is None) or (password is None):
-        raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set!')
-
-    device_type = cl.device_type.ALL
-    if args.device_type == 'cpu':
-        device_type = cl.device_type.CPU
-    elif args.device_type == 'gpu':
-        device_type = cl.device_type.GPU
+    return args
 
-    platform = cl.get_platforms()[0]
-    devices = platform.get_devices(device_type=device_type)
-    context = cl.Context(devices=devices)
-    queue = cl.CommandQueue(context)
-
-    exp = solace.get_experiment(uri, username, password)
-    inst = exp.create_instance(args.num_runs, {
+def instance_params(args):
+    params = {
         'W': args.inertia,
         'ALFA': args.alfa,
         'BETA': args.beta,
@@ -109,109 +110,93 @@ def main():
         'TRIALS': args.trials,
         'RANDOM_TARGETS': 1 if args.random_targets else 0,
         'SYMETRICAL_TARGETS': 1 if args.symetrical_targets else 0
-    }, code_version=git_version)
-
-    for run in inst.runs:
-        BinaryPSO(context, queue).execute(run, args)
-
-class BinaryPSO(object):
-    def __init__(self, context, queue):
-        self.context = context
-        self.queue = queue
-
-    def execute(self, run, args):
-        __log__.info('Starting BinaryPSO...')
+    }
 
-        run.begin()
+    params.update(evaluator.instance_params(args))
+    return params
 
-        self.gbest = None
-        self.gbest_fitness = None
+def main():
+    args = parse_args()
 
-        self.particles = [ Particle(physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta) for i in range(args.population_size) ]
+    try:
+        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
+    except:
+        git_version = None
 
-        self.simulator = physics.Simulator(self.context, self.queue,
-                                           num_worlds=args.population_size,
-                                           num_robots=args.num_robots,
-                                           ta=args.ta, tb=args.tb,
-                                           random_targets=args.random_targets,
-                                           symetrical_targets=args.symetrical_targets)
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
 
-        generation = 1
-        while (generation <= args.num_generations):
-            __log__.info('[gen=%d] Evaluating particles...', generation)
-            self.evaluate(args.targets_distances, args.targets_angles, args.trials)
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
 
-            __log__.info('[gen=%d] Updating particles...', generation)
-            for p in self.particles:
-                p.update_pbest()
+    exp = report.get_experiment(args.results_dir)
+    inst = exp.create_instance(args.num_runs, instance_params(args), code_version=git_version)
 
-            new_gbest = False
-            for p in self.particles:
-                if (self.gbest is None) or (p.pbest.fitness > self.gbest.fitness):
-                    self.gbest = p.pbest.copy()
-                    new_gbest = True
+    runs = [ report.AsyncRun(run) for run in inst.runs ]
 
-            for p in self.particles:
-                p.gbest = self.gbest
-                p.update_pos_vel()
+    if args.lockstep:
+        sweep.lockstep(context, queue, [ (args, run, i+1) for i, run in enumerate(runs) ], execute_run)
+    else:
+        for i, run in enumerate(runs):
+            execute_run(context, queue, args, run, i+1)
 
-            avg_pbest = 0
-            for p in self.particles:
-                avg_pbest += p.pbest.fitness
-            avg_pbest /= len(self.particles)
+def execute_run(context, queue, args, run, run_index, fused_evaluator=None):
+    """ Executes one run, the populations are evaluated by fused_evaluator when given (see sweep.py). """
+    checkpointer = None
+    if args.checkpoint:
+        filename = checkpoint.run_filename(args.checkpoint, run_index)
+        if (not args.resume) and os.path.exists(filename):
+            os.remove(filename)
+        checkpointer = checkpoint.Checkpointer(filename, args.checkpoint_freq)
 
-            __log__.info('[gen=%d] Particles updated, avg(pbest fitness) = %.5f, gbest fitness: %.5f', generation, avg_pbest, self.gbest.fitness)
+    best_recorder = recorder.create(context, args, run_index)
 
-            run.progress(generation / float(args.num_generations), {
-                'generation': generation,
-                'avg_pbest_fitness': avg_pbest,
-                'gbest_fitness': self.gbest.fitness,
-                'gbest_position': self.gbest.position_hex
-            })
+    engine = evaluator.create_engine(context, queue, args, fused_evaluator)
+    engine.run(BinaryPSO(args), run, checkpointer, best_recorder)
 
-            if new_gbest and (not args.no_save):
-                __log__.info('[gen=%d] Saving simulation for the new found gbest...', generation)
-                _, filename = tempfile.mkstemp(prefix='bpso_sim_', suffix='.srs')
+    if checkpointer:
+        checkpointer.close()
 
-                fitness = self.simulator.simulate_and_save(
-                    filename,
-                    [ self.gbest.position_decoded for i in xrange(len(self.particles)) ],
-                    targets_distance=args.targets_distances[ random.randint(0, len(args.targets_distances)-1) ],
-                    targets_angle=args.targets_angles[ random.randint(0, len(args.targets_angles)-1) ]
-                )
+class BinaryPSO(evaluator.Optimizer):
+    best_name = 'gbest'
 
-                run.upload(filename, 'run-%02d-new-gbest-gen-%04d-fit-%.4f.srs' % (run.id, generation, fitness[0]) )
-                os.remove(filename)
+    def __init__(self, args):
+        self.args = args
+        self.swarm = Swarm(args.population_size, physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta)
 
-            generation += 1
+    def ask(self):
+        return self.swarm.position
 
-        run.done()
+    def tell(self, fitness, measured=None):
+        self.swarm.fitness = np.asarray(fitness, dtype=np.float64)
+        self.swarm.update_bests(measured)
+        self.swarm.update_pos_vel()
 
-    def evaluate(self, targets_distances, targets_angles, trials):
-        for p in self.particles:
-            p.fitness = 0.0
+    def statistics(self):
+        return {
+            'avg_pbest_fitness': float(np.mean(self.swarm.pbest_fitness)),
+            'gbest_fitness': self.swarm.gbest_fitness,
+            'gbest_position': codec.to_hex(self.swarm.gbest_genome)
+        }
 
-        for d in targets_distances:
-            for a in targets_angles:
-                for t in range(trials):
-                    fitness = self.simulator.simulate([ p.position_decoded for p in self.particles ], targets_distance=d, targets_angle=a)
+    def get_best(self):
+        return self.swarm.gbest_genome, self.swarm.gbest_fitness
 
-                    for i in xrange(len(self.particles)):
-                        self.particles[i].fitness += fitness[i]
+    def get_state(self):
+        return self.swarm.get_state()
 
-        for p in self.particles:
-            p.fitness /= len(targets_distances) * len(targets_angles) * trials
+    def set_state(self, header, arrays):
+        self.swarm.set_state(header, arrays)
 
     def generate_image(self, filename, block_width=8, block_height=8):
-        blocks = [ [] for p in xrange(len(self.particles)) ]
+        blocks = self.swarm.position.tolist()
         pixels = []
 
-        for p in xrange(len(self.particles)):
-            pos = self.particles[p].position
-
-            for c in pos:
-                blocks[p].append(ord(c))
-
         for i in xrange(len(blocks[0])):
             line = []
             for b in blocks:
@@ -223,101 +208,103 @@ class BinaryPSO(object):
 
         # png.from_array(pixels, 'L').save(filename)
 
-class Particle(object):
-    MAX_VEL = 6
+def unpack_bits(genomes):
+    """ (particles x bytes) uint8 -> (particles x bits) uint8, least significant bit of each byte first. """
+    bits = np.unpackbits(genomes[:,:,np.newaxis], axis=2)[:,:,::-1]
+    return bits.reshape(len(genomes), -1)
 
-    def __init__(self, size, inertia=0.9, alfa=2.0, beta=2.0):
-        self.id = id(self)
+def pack_bits(bits):
+    """ Inverse of unpack_bits. """
+    return np.packbits(bits.reshape(len(bits), -1, 8)[:,:,::-1], axis=2)[:,:,0]
 
-        self.fitness = 0
+class Swarm(object):
+    """
+    The whole swarm as bit matrices: the positions are a (particles x genes)
+    uint8 genome matrix, unpacked to one column per bit for the update, and
+    the velocity of every bit is a (particles x bits) matrix. Each bit is set
+    with probability sigmoid(velocity).
+    """
 
+    MAX_VEL = 6
+
+    def __init__(self, num_particles, size, inertia=0.9, alfa=2.0, beta=2.0):
         self.inertia = inertia
         self.alfa = alfa
         self.beta = beta
 
-        self.position = ''
-        for i in xrange(size):
-            self.position += chr(random.randint(0,255))
-
-        self.velocity = np.random.uniform(-self.MAX_VEL, self.MAX_VEL, size*8)
-
-        self.pbest = None
-        self.gbest = None
+        self.position = codec.to_matrix([ codec.random_genome(size) for i in xrange(num_particles) ])
+        self.velocity = np.random.uniform(-self.MAX_VEL, self.MAX_VEL, (num_particles, size*8))
+        self.fitness = np.zeros(num_particles)
 
-    def __repr__(self):
-        return 'Particle(%d, fitness=%.5f)' % (self.id, self.fitness)
+        self.pbest_position = np.copy(self.position)
+        self.pbest_fitness = np.empty(num_particles)
+        self.pbest_fitness.fill(-np.inf)
 
-    @property
-    def position_hex(self):
-        ret = ''
-        for c in self.position:
-            ret += c.encode('hex')
-        return ret
+        self.gbest_position = None
+        self.gbest_fitness = None
 
     @property
-    def position_decoded(self):
-        ret = np.zeros(len(self.position))
-        for i in xrange(len(self.position)):
-            ret[i] = float(ord(self.position[i])) / 255
-        return ret
-
-    def copy(self):
-        p = Particle(len(self.position), self.inertia, self.alfa, self.beta)
-        p.fitness = self.fitness
-        p.position = self.position
-        p.velocity = np.copy(self.velocity)
-        p.pbest = self.pbest
-        p.gbest = self.gbest
-        return p
-
-    def update_pbest(self):
-        if (self.pbest is None) or (self.fitness > self.pbest.fitness):
-            self.pbest = self.copy()
+    def gbest_genome(self):
+        return self.gbest_position.tostring()
+
+    def update_bests(self, measured=None):
+        """
+        Updates the personal and global bests from the particles in the
+        measured mask (default all), returns True if the global best changed.
+        """
+        improved = self.fitness > self.pbest_fitness
+        if measured is not None:
+            improved &= measured
+        self.pbest_position[improved] = self.position[improved]
+        self.pbest_fitness[improved] = self.fitness[improved]
+
+        best = np.argmax(self.pbest_fitness)
+        if (self.gbest_fitness is None) or (self.pbest_fitness[best] > self.gbest_fitness):
+            self.gbest_position = np.copy(self.pbest_position[best])
+            self.gbest_fitness = float(self.pbest_fitness[best])
+            return True
+
+        return False
 
     def update_pos_vel(self):
-        new_pos = ''
-
-        for idx in xrange(len(self.position)):
-            pos = ord(self.position[idx])
-            pbest = ord(self.pbest.position[idx])
-            gbest = ord(self.gbest.position[idx])
-
-            for bit in xrange(8):
-                p = 1 if (pos & (2**bit) != 0) else 0
-                pb = 1 if (pbest & (2**bit) != 0) else 0
-                gb = 1 if (gbest & (2**bit) != 0) else 0
-
-                self.velocity[idx*8+bit] = \
-                    self.inertia * self.velocity[idx*8+bit] + \
-                    self.alfa * random.random() * (pb - p) + \
-                    self.beta * random.random() * (gb - p)
-
-                if self.velocity[idx*8+bit] > self.MAX_VEL:
-                    self.velocity[idx*8+bit] = self.MAX_VEL
-                elif self.velocity[idx*8+bit] < -self.MAX_VEL:
-                    self.velocity[idx*8+bit] = -self.MAX_VEL
-
-                if random.random() < self.sigmoid(self.velocity[idx*8+bit]):
-                    pos |= 2**bit # set
-                else:
-                    pos &= ~ (2**bit) # clear
-
-            new_pos += chr(pos)
-
-        self.position = new_pos
-
-    def sub(self, pos1, pos2):
-        if len(pos1) != len(pos2):
-            raise Exception('Cannot substract arrays with different sizes.')
-
-        ret = ''
-        for i in xrange(len(pos1)):
-            ret += chr(ord(pos1[i]) - ord(pos2[i]))
-
-        return ret
-
-    def sigmoid(self, x):
-        return 1 / (1 + math.exp(-x))
+        position = unpack_bits(self.position).astype(np.int8)
+        pbest = unpack_bits(self.pbest_position).astype(np.int8)
+        gbest = unpack_bits(self.gbest_position[np.newaxis,:]).astype(np.int8)
+
+        shape = self.velocity.shape
+        self.velocity *= self.inertia
+        self.velocity += self.alfa * np.random.random(shape) * (pbest - position)
+        self.velocity += self.beta * np.random.random(shape) * (gbest - position)
+        np.clip(self.velocity, -self.MAX_VEL, self.MAX_VEL, out=self.velocity)
+
+        bits = np.random.random(shape) < 1.0 / (1.0 + np.exp(-self.velocity))
+        self.position = pack_bits(bits.astype(np.uint8))
+
+    def get_state(self):
+        header = { 'gbest_fitness': float(self.gbest_fitness) }
+        # copies, the checkpoint is written in the background while the
+        # swarm keeps being updated in place
+        arrays = {
+            'position': np.copy(self.position),
+            'velocity': np.copy(self.velocity),
+            'fitness': np.copy(self.fitness),
+            'pbest_position': np.copy(self.pbest_position),
+            'pbest_fitness': np.copy(self.pbest_fitness),
+            'gbest_position': np.copy(self.gbest_position)
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        # checkpoints of the former per particle swarm also had the velocity
+        # of each best, which is not needed
+        self.position = np.array(arrays['position'], dtype=np.uint8)
+        self.velocity = np.array(arrays['velocity'], dtype=np.float64)
+        self.fitness = np.array(arrays['fitness'], dtype=np.float64)
+        self.pbest_position = np.array(arrays['pbest_position'], dtype=np.uint8)
+        self.pbest_fitness = np.array(arrays['pbest_fitness'], dtype=np.float64)
+        self.gbest_position = np.array(arrays['gbest_position'], dtype=np.uint8)
+        self.gbest_fitness = header['gbest_fitness']
 
 if __name__=="__main__":
     main()
\ No newline at end of file
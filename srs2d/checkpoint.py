@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Binary checkpoints for the optimizers.
+
+A checkpoint is a small JSON header followed by a NumPy .npz archive with the
+optimizer arrays (population, swarm matrices, RNG state, ...):
+
+    'SRSCKPT' | version (uint8) | header length (uint32) | header | npz
+
+Files are written to a temporary file and renamed, so a checkpoint is either
+the previous one or the new one, never a partial file.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import json
+import struct
+import random
+import logging
+import threading
+import Queue
+import numpy as np
+from cStringIO import StringIO
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+MAGIC = 'SRSCKPT'
+CURRENT_VERSION = 1
+
+def save(filename, header, arrays):
+    data = json.dumps(header)
+
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as fd:
+        fd.write(struct.pack('>7sBI', MAGIC, CURRENT_VERSION, len(data)))
+        fd.write(data)
+        np.savez(fd, **arrays)
+        fd.flush()
+        os.fsync(fd.fileno())
+
+    os.rename(tmp, filename)
+
+def load(filename):
+    with open(filename, 'rb') as fd:
+        magic, version, length = struct.unpack('>7sBI', fd.read(12))
+
+        if magic != MAGIC:
+            raise Exception('%s is not a checkpoint file!' % filename)
+
+        if version != CURRENT_VERSION:
+            raise Exception('Unsupported checkpoint version (%d)!' % version)
+
+        header = json.loads(fd.read(length))
+        npz = np.load(StringIO(fd.read()))
+        arrays = dict((k, npz[k]) for k in npz.files)
+
+    return header, arrays
+
+def get_rng_state():
+    """ State of Python's and NumPy's global generators as (header, arrays). """
+    version, internal, gauss = random.getstate()
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+
+    header = {
+        'random_version': version,
+        'random_gauss': gauss,
+        'np_pos': int(pos),
+        'np_has_gauss': int(has_gauss),
+        'np_cached_gaussian': float(cached_gaussian)
+    }
+
+    arrays = {
+        'random_internal': np.array(internal, dtype=np.int64),
+        'np_keys': np.array(keys, dtype=np.uint32)
+    }
+
+    return header, arrays
+
+def set_rng_state(header, arrays):
+    random.setstate((header['random_version'],
+                     tuple(int(v) for v in arrays['random_internal']),
+                     header['random_gauss']))
+    np.random.set_state(('MT19937', arrays['np_keys'], header['np_pos'],
+                         header['np_has_gauss'], header['np_cached_gaussian']))
+
+def run_filename(prefix, run_index):
+    return '%s.run%02d' % (prefix, run_index)
+
+class Checkpointer(object):
+    """
+    Writes optimizer snapshots every `freq` generations on a background
+    thread. Only the most recent pending snapshot is kept, an older one still
+    waiting to be written is simply dropped.
+    """
+
+    def __init__(self, filename, freq=10):
+        self.filename = filename
+        self.freq = freq
+
+        self.lock = threading.Lock()
+        self.pending = None
+        self.wakeup = Queue.Queue()
+        self.idle = threading.Event()
+        self.idle.set()
+
+        t = threading.Thread(target=self.writer)
+        t.daemon = True
+        t.start()
+
+    def load(self):
+        """ Returns (header, arrays) of the last checkpoint, or None. """
+        if not os.path.exists(self.filename):
+            return None
+
+        header, arrays = load(self.filename)
+
+        rng_header = dict((k[4:], v) for k, v in header.iteritems() if k.startswith('rng_'))
+        rng_arrays = dict((k[4:], v) for k, v in arrays.iteritems() if k.startswith('rng_'))
+        set_rng_state(rng_header, rng_arrays)
+
+        __log__.info('Resuming from checkpoint %s (generation %d)', self.filename, header['generation'])
+
+        return header, arrays
+
+    def due(self, generation, num_generations):
+        """ True if a snapshot should be taken at the end of this generation. """
+        return (generation % self.freq) == 0 or generation == num_generations
+
+    def save(self, generation, header, arrays):
+        """
+        Queues a snapshot taken at the end of generation. The arrays must not
+        be modified afterwards, pass copies.
+        """
+        header = dict(header)
+        arrays = dict(arrays)
+        header['generation'] = generation
+
+        rng_header, rng_arrays = get_rng_state()
+        for k, v in rng_header.iteritems():
+            header['rng_' + k] = v
+        for k, v in rng_arrays.iteritems():
+            arrays['rng_' + k] = v
+
+        with self.lock:
+            self.pending = (header, arrays)
+            self.idle.clear()
+
+        self.wakeup.put(None)
+
+    def close(self):
+        """ Blocks until every queued snapshot is on disk. """
+        self.idle.wait()
+
+    def writer(self):
+        while True:
+            self.wakeup.get()
+
+            with self.lock:
+                snapshot = self.pending
+                self.pending = None
+
+            if snapshot is not None:
+                try:
+                    save(self.filename, *snapshot)
+                except Exception:
+                    __log__.exception('Could not write checkpoint %s', self.filename)
+
+            with self.lock:
+                if self.pending is None:
+                    self.idle.set()
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+CMA-ES (Hansen's covariance matrix adaptation evolution strategy) on the
+decoded controller parameters, vectors in [0, 1] like the PSO positions.
+
+Samples falling outside [0, 1] are clipped before the evaluation and the
+clipped samples are used for the update, so the mean never leaves the box.
+With --diagonal only the variances are adapted (sep-CMA-ES, Ros & Hansen),
+each generation then costs O(n) instead of an eigendecomposition.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import sys
+import argparse
+import logging
+import physics
+import codec
+import checkpoint
+import recorder
+import pyopencl as cl
+import report
+import sweep
+import evaluator
+import subprocess
+import numpy as np
+import math
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+def default_population_size(n):
+    return 4 + int(3 * math.log(n))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--verbosity",        help="increase output verbosity", action="count")
+    parser.add_argument("-q", "--quiet",            help="supress output (except errors)", action="store_true")
+    parser.add_argument("--device-type",            help="device type (all, gpu or cpu), default is all", type=str, default='all')
+    parser.add_argument("--no-save",                help="skip saving best fitness simulation", action="store_true")
+    parser.add_argument("-s", "--sigma",            help="initial step size, default is 0.3", type=float, default=0.3)
+    parser.add_argument("--diagonal",               help="adapt only the variances (sep-CMA-ES)", action="store_true")
+    parser.add_argument("--ta",                     help="number of timesteps without fitness avaliation, default is 600", type=int, default=600)
+    parser.add_argument("--tb",                     help="number of timesteps with fitness avaliation, default is 5400", type=int, default=5400)
+    parser.add_argument("-g", "--num-generations",  help="number of generations, default is 500", type=int, default=500)
+    parser.add_argument("-r", "--num-runs",         help="number of runs, default is 3", type=int, default=3)
+    parser.add_argument("-n", "--num-robots",       help="number of robots, default is 10", type=int, default=10)
+    parser.add_argument("-p", "--population-size",  help="samples per generation (lambda), default is 4 + 3 ln(%d) = %d" % (physics.ANN_PARAMS_SIZE, default_population_size(physics.ANN_PARAMS_SIZE)),
+        type=int, default=default_population_size(physics.ANN_PARAMS_SIZE))
+    parser.add_argument("--targets-distances",      help="list of distances between target areas to be evaluated \
+        each generation, default is 0.7 0.9 1.1 1.3 1.5", type=float, nargs='+', default=[0.7, 0.9, 1.1, 1.3, 1.5])
+    parser.add_argument("--targets-angles",         help="list of axis angles where the target areas \
+        are located each trial (between 0 and PI), default is [3*pi/4]", type=float, nargs='+', default=[2.356194490192345])
+    parser.add_argument("--random-targets",         help="place targets at random position (obeying targets distances)", action="store_true")
+    parser.add_argument("--symetrical-targets",     help="place targets at symetrical position", action="store_true")
+    parser.add_argument("-t", "--trials",           help="number of trials per distance, default is 3", type=int, default=3)
+    parser.add_argument("--checkpoint",             help="save the state of each run to FILE.runNN periodically", metavar="FILE", type=str)
+    parser.add_argument("--checkpoint-freq",        help="frequency of checkpoints (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--resume",                 help="resume runs from their checkpoints (requires --checkpoint)", action="store_true")
+    parser.add_argument("--lazy-recording",         help="do not record new bests, write an index to FILE.runNN to replay them later", metavar="FILE", type=str)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    parser.add_argument("--lockstep",               help="advance all runs together, evaluating their populations in one simulation batch per generation", action="store_true")
+    evaluator.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.verbosity >= 2:
+        __log__.setLevel(logging.DEBUG)
+    elif args.verbosity == 1:
+        __log__.setLevel(logging.INFO)
+    else:
+        __log__.setLevel(logging.WARNING)
+
+    if args.quiet:
+        __log__.setLevel(logging.ERROR)
+
+    if args.resume and (args.checkpoint is None):
+        __log__.error('--resume requires --checkpoint!')
+        sys.exit(1)
+
+    try:
+        evaluator.check_args(args)
+    except ValueError as e:
+        __log__.error(str(e))
+        sys.exit(1)
+
+    if args.population_size < 4:
+        __log__.error('Population size must be at least 4!')
+        sys.exit(1)
+
+    return args
+
+def instance_params(args):
+    params = {
+        'SIGMA': args.sigma,
+        'DIAGONAL': 1 if args.diagonal else 0,
+        'STEPS_TA': args.ta,
+        'STEPS_TB': args.tb,
+        'NUM_GENERATIONS': args.num_generations,
+        'NUM_RUNS': args.num_runs,
+        'NUM_ROBOTS': args.num_robots,
+        'POPULATION_SIZE': args.population_size,
+        'TARGETS_DISTANCES': args.targets_distances,
+        'TARGETS_ANGLES': args.targets_angles,
+        'TRIALS': args.trials,
+        'RANDOM_TARGETS': 1 if args.random_targets else 0,
+        'SYMETRICAL_TARGETS': 1 if args.symetrical_targets else 0
+    }
+
+    params.update(evaluator.instance_params(args))
+    return params
+
+def main():
+    args = parse_args()
+
+    try:
+        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
+    except:
+        git_version = None
+
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
+
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
+
+    exp = report.get_experiment(args.results_dir)
+    inst = exp.create_instance(args.num_runs, instance_params(args), code_version=git_version)
+
+    runs = [ report.AsyncRun(run) for run in inst.runs ]
+
+    if args.lockstep:
+        sweep.lockstep(context, queue, [ (args, run, i+1) for i, run in enumerate(runs) ], execute_run)
+    else:
+        for i, run in enumerate(runs):
+            execute_run(context, queue, args, run, i+1)
+
+def execute_run(context, queue, args, run, run_index, fused_evaluator=None):
+    """ Executes one run, the populations are evaluated by fused_evaluator when given (see sweep.py). """
+    checkpointer = None
+    if args.checkpoint:
+        filename = checkpoint.run_filename(args.checkpoint, run_index)
+        if (not args.resume) and os.path.exists(filename):
+            os.remove(filename)
+        checkpointer = checkpoint.Checkpointer(filename, args.checkpoint_freq)
+
+    best_recorder = recorder.create(context, args, run_index)
+
+    engine = evaluator.create_engine(context, queue, args, fused_evaluator)
+    engine.run(CMAES(args), run, checkpointer, best_recorder)
+
+    if checkpointer:
+        checkpointer.close()
+
+class CMAES(evaluator.Optimizer):
+    def __init__(self, args):
+        self.args = args
+        self.strategy = Strategy(physics.ANN_PARAMS_SIZE, args.population_size, args.sigma, args.diagonal)
+
+        self.samples = None
+        self.fitness = None
+        self.measured = None
+
+    def ask(self):
+        self.samples = self.strategy.sample()
+        return self.samples.astype(np.float32)
+
+    def selection_size(self):
+        return self.strategy.mu
+
+    def tell(self, fitness, measured=None):
+        self.fitness = np.asarray(fitness, dtype=np.float64)
+        self.measured = measured
+        self.strategy.update(self.samples, self.fitness, measured)
+
+    def statistics(self):
+        fitness = evaluator.measured_fitness(self.fitness, self.measured)
+
+        return {
+            'avg_fitness': float(np.mean(fitness)),
+            'best_fitness': float(np.max(fitness)),
+            'sigma': self.strategy.sigma,
+            'best_position': codec.to_hex(codec.encode(self.strategy.best_position))
+        }
+
+    def get_best(self):
+        return self.strategy.best_position.tolist(), self.strategy.best_fitness
+
+    def get_state(self):
+        header, arrays = self.strategy.get_state()
+        arrays['fitness'] = self.fitness
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        self.strategy.set_state(header, arrays)
+        self.fitness = np.array(arrays['fitness'], dtype=np.float64)
+
+class Strategy(object):
+    """
+    State of a (mu/mu_w, lambda)-CMA-ES maximizing the fitness, with the
+    default parameters of Hansen's tutorial. The covariance matrix is
+    decomposed lazily, every few generations.
+    """
+
+    MIN_POS = 0
+    MAX_POS = 1
+
+    def __init__(self, n, population_size, sigma=0.3, diagonal=False):
+        self.n = n
+        self.population_size = population_size
+        self.diagonal = diagonal
+
+        self.mu = population_size / 2
+        weights = math.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / np.sum(weights)
+        self.mueff = 1.0 / np.sum(self.weights ** 2)
+
+        self.cc = (4.0 + self.mueff / n) / (n + 4.0 + 2.0 * self.mueff / n)
+        self.cs = (self.mueff + 2.0) / (n + self.mueff + 5.0)
+        self.c1 = 2.0 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1.0 - self.c1, 2.0 * (self.mueff - 2.0 + 1.0 / self.mueff) / ((n + 2.0) ** 2 + self.mueff))
+        if diagonal:
+            # sep-CMA-ES learns n variances, so it can learn them faster
+            self.c1 = min(1.0, self.c1 * (n + 2.0) / 3.0)
+            self.cmu = min(1.0 - self.c1, self.cmu * (n + 2.0) / 3.0)
+        self.damps = 1.0 + 2.0 * max(0.0, math.sqrt((self.mueff - 1.0) / (n + 1.0)) - 1.0) + self.cs
+        self.chin = math.sqrt(n) * (1.0 - 1.0 / (4.0 * n) + 1.0 / (21.0 * n * n))
+
+        self.mean = np.random.uniform(self.MIN_POS, self.MAX_POS, n)
+        self.sigma = sigma
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+
+        if diagonal:
+            self.C = np.ones(n)
+        else:
+            self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+
+        self.generation = 0
+        self.eigen_generation = 0
+
+        self.best_position = None
+        self.best_fitness = None
+
+    def sample(self):
+        """ population_size samples, already clipped to the box. """
+        z = np.random.standard_normal((self.population_size, self.n))
+
+        if self.diagonal:
+            y = z * self.D
+        else:
+            y = np.dot(z * self.D, self.B.T)
+
+        return np.clip(self.mean + self.sigma * y, self.MIN_POS, self.MAX_POS)
+
+    def update(self, samples, fitness, measured=None):
+        n = self.n
+        self.generation += 1
+
+        order = np.argsort(-fitness)
+
+        # the best so far only comes from simulated samples
+        best = order[0]
+        if measured is not None:
+            best = order[measured[order]][0]
+
+        if (self.best_fitness is None) or (fitness[best] > self.best_fitness):
+            self.best_fitness = float(fitness[best])
+            self.best_position = np.copy(samples[best])
+
+        # steps of the selected samples from the old mean, in sigma units
+        y = (samples[order[:self.mu]] - self.mean) / self.sigma
+        yw = np.dot(self.weights, y)
+
+        self.mean = self.mean + self.sigma * yw
+
+        # C^-1/2 yw
+        if self.diagonal:
+            invsqrt_yw = yw / self.D
+        else:
+            invsqrt_yw = np.dot(self.B, np.dot(self.B.T, yw) / self.D)
+
+        self.ps = (1 - self.cs) * self.ps + math.sqrt(self.cs * (2 - self.cs) * self.mueff) * invsqrt_yw
+
+        norm_ps = np.linalg.norm(self.ps)
+        hsig = norm_ps / math.sqrt(1 - (1 - self.cs) ** (2 * self.generation)) / self.chin < 1.4 + 2.0 / (n + 1)
+
+        self.pc = (1 - self.cc) * self.pc
+        if hsig:
+            self.pc += math.sqrt(self.cc * (2 - self.cc) * self.mueff) * yw
+
+        decay = 1 - self.c1 - self.cmu
+        if not hsig:
+            decay += self.c1 * self.cc * (2 - self.cc)
+
+        if self.diagonal:
+            self.C = decay * self.C + self.c1 * self.pc ** 2 + self.cmu * np.dot(self.weights, y ** 2)
+        else:
+            self.C = decay * self.C + self.c1 * np.outer(self.pc, self.pc) + self.cmu * np.dot(y.T * self.weights, y)
+
+        self.sigma *= math.exp((self.cs / self.damps) * (norm_ps / self.chin - 1))
+
+        self.decompose()
+
+    def decompose(self):
+        if self.diagonal:
+            self.D = np.sqrt(self.C)
+            return
+
+        # O(n^3), done once every O(1 / ((c1 + cmu) n)) generations
+        if (self.generation - self.eigen_generation) < self.population_size / (self.c1 + self.cmu) / self.n / 10.0:
+            return
+
+        self.eigen_generation = self.generation
+        self.C = np.triu(self.C) + np.triu(self.C, 1).T
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+    def get_state(self):
+        header = {
+            'sigma': self.sigma,
+            'updates': self.generation,
+            'eigen_updates': self.eigen_generation,
+            'best_fitness': self.best_fitness
+        }
+
+        arrays = {
+            'mean': self.mean,
+            'pc': self.pc,
+            'ps': self.ps,
+            'C': self.C,
+            'B': self.B,
+            'D': self.D,
+            'best_position': self.best_position
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        self.sigma = header['sigma']
+        self.generation = header['updates']
+        self.eigen_generation = header['eigen_updates']
+        self.best_fitness = header['best_fitness']
+
+        self.mean = np.array(arrays['mean'], dtype=np.float64)
+        self.pc = np.array(arrays['pc'], dtype=np.float64)
+        self.ps = np.array(arrays['ps'], dtype=np.float64)
+        self.C = np.array(arrays['C'], dtype=np.float64)
+        self.B = np.array(arrays['B'], dtype=np.float64)
+        self.D = np.array(arrays['D'], dtype=np.float64)
+        self.best_position = np.array(arrays['best_position'], dtype=np.float64)
+
+if __name__=="__main__":
+    main()
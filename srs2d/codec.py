@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Genome codec shared by every optimizer.
+
+A genome is a byte string with one byte per ANN parameter. These helpers
+convert between that representation, its hex form (used for reporting) and
+the NumPy arrays uploaded to the simulator, using views instead of Python
+loops whenever possible.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import binascii
+import numpy as np
+
+def random_genome(size):
+    """ Returns a random genome with `size` bytes. """
+    return np.random.randint(0, 256, size).astype(np.uint8).tostring()
+
+def to_array(genome):
+    """ Read-only uint8 view of a genome (no copy). """
+    return np.frombuffer(genome, dtype=np.uint8)
+
+def to_matrix(genomes):
+    """ Stacks a list of genomes into a (len(genomes), genome_length) uint8 matrix. """
+    if len(genomes) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+    return np.frombuffer(''.join(genomes), dtype=np.uint8).reshape(len(genomes), -1)
+
+def decode(genome):
+    """ Maps every byte of the genome to [0,1]. """
+    return to_array(genome) / 255.0
+
+def encode(values):
+    """ Inverse of decode(), values in [0,1] are truncated to a byte. """
+    return (np.clip(np.asarray(values), 0, 1) * 255).astype(np.uint8).tostring()
+
+def to_hex(genome):
+    """ Hex representation of a genome (str or uint8 array). """
+    if isinstance(genome, np.ndarray):
+        genome = genome.astype(np.uint8).tostring()
+    return binascii.hexlify(genome)
+
+def from_hex(hexstr):
+    return binascii.unhexlify(hexstr)
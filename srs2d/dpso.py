@@ -19,24 +19,29 @@ __author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
 __date__ = "04 Jul 2013"
 
 import os
+import sys
 import argparse
 import random
 import logging
 import physics
+import codec
+import checkpoint
+import recorder
 import pyopencl as cl
 import logging.config
-import solace
+import report
+import sweep
+import evaluator
 import io
 # import png
 import subprocess
 import numpy as np
 import math
-import tempfile
 
 logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
 __log__ = logging.getLogger(__name__)
 
-def main():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbosity",        help="increase output verbosity", action="count")
     parser.add_argument("-q", "--quiet",            help="supress output (except errors)", action="store_true")
@@ -58,7 +63,14 @@ def main():
     parser.add_argument("--random-targets",         help="place targets at random position (obeying targets distances)", action="store_true")
     parser.add_argument("--symetrical-targets",     help="place targets at symetrical position", action="store_true")
     parser.add_argument("-t", "--trials",           help="number of trials per distance, default is 3", type=int, default=3)
-    args = parser.parse_args()
+    parser.add_argument("--checkpoint",             help="save the state of each run to FILE.runNN periodically", metavar="FILE", type=str)
+    parser.add_argument("--checkpoint-freq",        help="frequency of checkpoints (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--resume",                 help="resume runs from their checkpoints (requires --checkpoint)", action="store_true")
+    parser.add_argument("--lazy-recording",         help="do not record new bests, write an index to FILE.runNN to replay them later", metavar="FILE", type=str)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    parser.add_argument("--lockstep",               help="advance all runs together, evaluating their populations in one simulation batch per generation", action="store_true")
+    evaluator.add_arguments(parser)
+    args = parser.parse_args(argv)
 
     if args.verbosity >= 2:
         __log__.setLevel(logging.DEBUG)
@@ -70,31 +82,20 @@ def main():
     if args.quiet:
         __log__.setLevel(logging.ERROR)
 
-    uri = os.environ.get('SOLACE_URI')
-    username = os.environ.get('SOLACE_USERNAME')
-    password = os.environ.get('SOLACE_PASSWORD')
+    if args.resume and (args.checkpoint is None):
+        __log__.error('--resume requires --checkpoint!')
+        sys.exit(1)
 
     try:
-        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
-    except:
-        git_version = None
-
-    if (uri is None) or (username is None) or (password is None):
-        raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set!')
-
-    device_type = cl.device_type.ALL
-    if args.device_type == 'cpu':
-        device_type = cl.device_type.CPU
-    elif args.device_type == 'gpu':
-        device_type = cl.device_type.GPU
+        evaluator.check_args(args)
+    except ValueError as e:
+        __log__.error(str(e))
+        sys.exit(1)
 
-    platform = cl.get_platforms()[0]
-    devices = platform.get_devices(device_type=device_type)
-    context = cl.Context(devices=devices)
-    queue = cl.CommandQueue(context)
+    return args
 
-    exp = solace.get_experiment(uri, username, password)
-    inst = exp.create_instance(args.num_runs, {
+def instance_params(args):
+    params = {
         'W': args.inertia,
         'ALFA': args.alfa,
         'BETA': args.beta,
@@ -109,112 +110,95 @@ def main():
         'TRIALS': args.trials,
         'RANDOM_TARGETS': 1 if args.random_targets else 0,
         'SYMETRICAL_TARGETS': 1 if args.symetrical_targets else 0
-    }, code_version=git_version)
+    }
 
-    for run in inst.runs:
-        DiscretePSO(context, queue).execute(run, args)
+    params.update(evaluator.instance_params(args))
+    return params
 
-class DiscretePSO(object):
-    def __init__(self, context, queue):
-        self.context = context
-        self.queue = queue
-
-    def execute(self, run, args):
-        __log__.info('Starting DiscretePSO...')
-
-        run.begin()
+def main():
+    args = parse_args()
 
-        self.gbest = None
-        self.gbest_fitness = None
+    try:
+        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
+    except:
+        git_version = None
 
-        self.particles = [ Particle(physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta) for i in range(args.population_size) ]
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
 
-        self.simulator = physics.Simulator(self.context, self.queue,
-                                           num_worlds=args.population_size,
-                                           num_robots=args.num_robots,
-                                           ta=args.ta, tb=args.tb,
-                                           random_targets=args.random_targets,
-                                           symetrical_targets=args.symetrical_targets)
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
 
-        generation = 1
-        while (generation <= args.num_generations):
-            __log__.info('[gen=%d] Evaluating particles...', generation)
-            self.evaluate(args.targets_distances, args.targets_angles, args.trials)
+    exp = report.get_experiment(args.results_dir)
+    inst = exp.create_instance(args.num_runs, instance_params(args), code_version=git_version)
 
-            __log__.info('[gen=%d] Updating particles...', generation)
-            for p in self.particles:
-                p.update_pbest()
+    runs = [ report.AsyncRun(run) for run in inst.runs ]
 
-            new_gbest = False
-            for p in self.particles:
-                if (self.gbest is None) or (p.pbest.fitness > self.gbest.fitness):
-                    self.gbest = p.pbest.copy()
-                    new_gbest = True
+    if args.lockstep:
+        sweep.lockstep(context, queue, [ (args, run, i+1) for i, run in enumerate(runs) ], execute_run)
+    else:
+        for i, run in enumerate(runs):
+            execute_run(context, queue, args, run, i+1)
 
-            for p in self.particles:
-                p.gbest = self.gbest
-                p.update_pos_vel()
+def execute_run(context, queue, args, run, run_index, fused_evaluator=None):
+    """ Executes one run, the populations are evaluated by fused_evaluator when given (see sweep.py). """
+    checkpointer = None
+    if args.checkpoint:
+        filename = checkpoint.run_filename(args.checkpoint, run_index)
+        if (not args.resume) and os.path.exists(filename):
+            os.remove(filename)
+        checkpointer = checkpoint.Checkpointer(filename, args.checkpoint_freq)
 
-            avg_fitness = 0
-            best_fitness = 0
-            for p in self.particles:
-                if p.fitness >= best_fitness:
-                    best_fitness = p.fitness
-                avg_fitness += p.fitness
-            avg_fitness /= len(self.particles)
+    best_recorder = recorder.create(context, args, run_index)
 
-            __log__.info('[gen=%d] Particles updated, avg fitness) = %.5f, best fitness: %.5f', generation, avg_fitness, best_fitness)
+    engine = evaluator.create_engine(context, queue, args, fused_evaluator)
+    engine.run(DiscretePSO(args), run, checkpointer, best_recorder)
 
-            run.progress(generation / float(args.num_generations), {
-                'generation': generation,
-                'avg_fitness': avg_fitness,
-                'best_fitness': best_fitness,
-                'gbest_position': self.gbest.position_hex
-            })
+    if checkpointer:
+        checkpointer.close()
 
-            if new_gbest and (not args.no_save):
-                __log__.info('[gen=%d] Saving simulation for the new found gbest...', generation)
-                _, filename = tempfile.mkstemp(prefix='bpso_sim_', suffix='.srs')
+class DiscretePSO(evaluator.Optimizer):
+    best_name = 'gbest'
 
-                fitness = self.simulator.simulate_and_save(
-                    filename,
-                    [ self.gbest.position_decoded for i in xrange(len(self.particles)) ],
-                    targets_distance=args.targets_distances[ random.randint(0, len(args.targets_distances)-1) ],
-                    targets_angle=args.targets_angles[ random.randint(0, len(args.targets_angles)-1) ]
-                )
+    def __init__(self, args):
+        self.args = args
+        self.swarm = Swarm(args.population_size, physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta)
 
-                run.upload(filename, 'run-%02d-new-gbest-gen-%04d-fit-%.4f.srs' % (run.id, generation, fitness[0]) )
-                os.remove(filename)
+    def ask(self):
+        return self.swarm.position
 
-            generation += 1
+    def tell(self, fitness, measured=None):
+        self.swarm.fitness = np.asarray(fitness, dtype=np.float64)
+        self.swarm.update_bests(measured)
+        self.swarm.update_pos_vel()
 
-        run.done()
+    def statistics(self):
+        fitness = evaluator.measured_fitness(self.swarm.fitness, self.swarm.measured)
 
-    def evaluate(self, targets_distances, targets_angles, trials):
-        for p in self.particles:
-            p.fitness = 0.0
+        return {
+            'avg_fitness': float(np.mean(fitness)),
+            'best_fitness': max(0.0, float(np.max(fitness))),
+            'gbest_position': codec.to_hex(self.swarm.gbest_genome)
+        }
 
-        for d in targets_distances:
-            for a in targets_angles:
-                for t in range(trials):
-                    fitness = self.simulator.simulate([ p.position_decoded for p in self.particles ], targets_distance=d, targets_angle=a)
+    def get_best(self):
+        return self.swarm.gbest_genome, self.swarm.gbest_fitness
 
-                    for i in xrange(len(self.particles)):
-                        self.particles[i].fitness += fitness[i]
+    def get_state(self):
+        return self.swarm.get_state()
 
-        for p in self.particles:
-            p.fitness /= len(targets_distances) * len(targets_angles) * trials
+    def set_state(self, header, arrays):
+        self.swarm.set_state(header, arrays)
 
     def generate_image(self, filename, block_width=8, block_height=8):
-        blocks = [ [] for p in xrange(len(self.particles)) ]
+        blocks = self.swarm.position.tolist()
         pixels = []
 
-        for p in xrange(len(self.particles)):
-            pos = self.particles[p].position
-
-            for c in pos:
-                blocks[p].append(ord(c))
-
         for i in xrange(len(blocks[0])):
             line = []
             for b in blocks:
@@ -226,92 +210,129 @@ class DiscretePSO(object):
 
         # png.from_array(pixels, 'L').save(filename)
 
-class Particle(object):
+class Swarm(object):
+    """
+    The whole swarm in bulk. Every gene of every particle has a score per
+    value (0 to 254) and its velocity, (particles x genes x values) float32
+    arrays; positions are a (particles x genes) uint8 genome matrix sampled
+    from the normalised sigmoid of the scores, by a cumulative sum and one
+    uniform draw per gene.
+    """
+
     MIN = -6
     MAX =  6
 
-    def __init__(self, size, inertia=0.9, alfa=2.0, beta=2.0):
-        self.id = id(self)
-
-        self.fitness = 0
+    NUM_VALUES = 255
 
+    def __init__(self, num_particles, size, inertia=0.9, alfa=2.0, beta=2.0):
         self.inertia = inertia
         self.alfa = alfa
         self.beta = beta
 
-        self.position = ''
-        for i in xrange(size):
-            self.position += chr(random.randint(0,255))
-
-        self.probabilities = np.random.uniform(self.MIN, self.MAX, (size,255))
-        self.velocity = np.random.uniform(self.MIN, self.MAX, (size,255))
+        shape = (num_particles, size, self.NUM_VALUES)
+        self.position = codec.to_matrix([ codec.random_genome(size) for i in xrange(num_particles) ])
+        self.probabilities = np.random.uniform(self.MIN, self.MAX, shape).astype(np.float32)
+        self.velocity = np.random.uniform(self.MIN, self.MAX, shape).astype(np.float32)
+        self.fitness = np.zeros(num_particles)
 
-        self.pbest = None
-        self.gbest = None
+        self.pbest_position = np.copy(self.position)
+        self.pbest_probabilities = np.copy(self.probabilities)
+        self.pbest_fitness = np.empty(num_particles)
+        self.pbest_fitness.fill(-np.inf)
 
-    def __repr__(self):
-        return 'Particle(%d, fitness=%.5f)' % (self.id, self.fitness)
+        self.gbest_position = None
+        self.gbest_probabilities = None
+        self.gbest_fitness = None
 
-    @property
-    def position_hex(self):
-        ret = ''
-        for c in self.position:
-            ret += c.encode('hex')
-        return ret
+        # particles of the last update_bests() simulated in full
+        self.measured = None
 
     @property
-    def position_decoded(self):
-        ret = np.zeros(len(self.position))
-        for i in xrange(len(self.position)):
-            ret[i] = float(ord(self.position[i])) / 255
-        return ret
-
-    def copy(self):
-        p = Particle(len(self.position), self.inertia, self.alfa, self.beta)
-        p.fitness = self.fitness
-        p.position = self.position
-        p.velocity = np.copy(self.velocity)
-        p.probabilities = np.copy(self.probabilities)
-        p.pbest = self.pbest
-        p.gbest = self.gbest
-        return p
-
-    def update_pbest(self):
-        if (self.pbest is None) or (self.fitness > self.pbest.fitness):
-            self.pbest = self.copy()
+    def gbest_genome(self):
+        return self.gbest_position.tostring()
+
+    def update_bests(self, measured=None):
+        """
+        Updates the personal and global bests from the particles in the
+        measured mask (default all), returns True if the global best changed.
+        """
+        self.measured = measured
+
+        improved = self.fitness > self.pbest_fitness
+        if measured is not None:
+            improved &= measured
+        self.pbest_position[improved] = self.position[improved]
+        self.pbest_probabilities[improved] = self.probabilities[improved]
+        self.pbest_fitness[improved] = self.fitness[improved]
+
+        best = np.argmax(self.pbest_fitness)
+        if (self.gbest_fitness is None) or (self.pbest_fitness[best] > self.gbest_fitness):
+            self.gbest_position = np.copy(self.pbest_position[best])
+            self.gbest_probabilities = np.copy(self.pbest_probabilities[best])
+            self.gbest_fitness = float(self.pbest_fitness[best])
+            return True
+
+        return False
 
     def update_pos_vel(self):
-        self.velocity = self.inertia * self.velocity + \
-                        self.alfa * random.uniform(0, 1.0) * (self.pbest.probabilities - self.probabilities) + \
-                        self.beta * random.uniform(0, 1.0) * (self.gbest.probabilities - self.probabilities)
-        self.velocity = np.clip(self.velocity, self.MIN, self.MAX)
-
-        self.probabilities = self.probabilities + self.velocity
-        self.probabilities = np.clip(self.probabilities, self.MIN, self.MAX)
-
-        new_pos = ''
-        for i in xrange(len(self.position)):
-            p = np.zeros(255)
-            for j in xrange(len(self.probabilities[i])):
-                p[j] = self.sigmoid(self.probabilities[i][j])
-            p /= np.sum(p)
-
-            # weighted choice
-            choices = sorted([ (i, p[i]) for i in xrange(len(p)) ], key=lambda (v, w): w)
-            # choices = [ (i, p[i]) for i in xrange(len(p)) ]
-            r = random.random()
-            s = 0
-            for v,w in choices:
-                if (s+w) > r:
-                    break
-                s += w
-
-            new_pos += chr(v)
-
-        self.position = new_pos
-
-    def sigmoid(self, x):
-        return 1 / (1 + math.exp(-x))
+        # one pair of random coefficients per particle
+        num_particles = len(self.position)
+        r1 = np.random.uniform(0, 1.0, (num_particles, 1, 1)).astype(np.float32)
+        r2 = np.random.uniform(0, 1.0, (num_particles, 1, 1)).astype(np.float32)
+
+        self.velocity *= np.float32(self.inertia)
+        self.velocity += np.float32(self.alfa) * r1 * (self.pbest_probabilities - self.probabilities)
+        self.velocity += np.float32(self.beta) * r2 * (self.gbest_probabilities - self.probabilities)
+        np.clip(self.velocity, self.MIN, self.MAX, out=self.velocity)
+
+        self.probabilities += self.velocity
+        np.clip(self.probabilities, self.MIN, self.MAX, out=self.probabilities)
+
+        self.position = self.sample()
+
+    def sample(self):
+        """ One value per gene drawn with probability proportional to the sigmoid of its score. """
+        weights = 1.0 / (1.0 + np.exp(-self.probabilities))
+        cumulative = np.cumsum(weights, axis=2)
+
+        # a draw in [0, total) falls in the interval of value v when
+        # cumulative[v-1] <= draw < cumulative[v]
+        draws = np.random.uniform(0, 1.0, cumulative.shape[:2]).astype(np.float32) * cumulative[:,:,-1]
+        values = np.sum(cumulative <= draws[:,:,np.newaxis], axis=2)
+
+        return np.minimum(values, self.NUM_VALUES - 1).astype(np.uint8)
+
+    def get_state(self):
+        header = { 'gbest_fitness': float(self.gbest_fitness) }
+        # copies, the checkpoint is written in the background while the
+        # swarm keeps being updated in place
+        arrays = {
+            'position': np.copy(self.position),
+            'velocity': np.copy(self.velocity),
+            'probabilities': np.copy(self.probabilities),
+            'fitness': np.copy(self.fitness),
+            'pbest_position': np.copy(self.pbest_position),
+            'pbest_probabilities': np.copy(self.pbest_probabilities),
+            'pbest_fitness': np.copy(self.pbest_fitness),
+            'gbest_position': np.copy(self.gbest_position),
+            'gbest_probabilities': np.copy(self.gbest_probabilities)
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        # checkpoints of the former per particle swarm also had the velocity
+        # of each best, which is not needed
+        self.position = np.array(arrays['position'], dtype=np.uint8)
+        self.velocity = np.array(arrays['velocity'], dtype=np.float32)
+        self.probabilities = np.array(arrays['probabilities'], dtype=np.float32)
+        self.fitness = np.array(arrays['fitness'], dtype=np.float64)
+        self.pbest_position = np.array(arrays['pbest_position'], dtype=np.uint8)
+        self.pbest_probabilities = np.array(arrays['pbest_probabilities'], dtype=np.float32)
+        self.pbest_fitness = np.array(arrays['pbest_fitness'], dtype=np.float64)
+        self.gbest_position = np.array(arrays['gbest_position'], dtype=np.uint8)
+        self.gbest_probabilities = np.array(arrays['gbest_probabilities'], dtype=np.float32)
+        self.gbest_fitness = header['gbest_fitness']
 
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,653 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Evaluation of the populations of every optimizer.
+
+Optimizers are written as ask/tell (see Optimizer): ask() returns the batch
+of genomes (or parameter vectors) to evaluate and tell() takes back their
+fitness. An Engine drives them generation by generation and owns
+everything around it: the simulators, caching, progress reports, best
+recordings and checkpoints.
+
+With --racing the engine does not spend every episode (target distance,
+angle and trial) on every genome: all of them get --base-episodes first,
+then further episodes only go to the genomes whose confidence interval
+still straddles the selection cut-off of the optimizer, until the
+--episode-budget of the generation is spent.
+
+With --surrogate MODEL a surrogate model (see surrogate.py) trained on the
+genomes simulated so far predicts the fitness of new ones, and only the
+best predicted fraction, plus a few random ones, is simulated.
+
+With --promote SCHEDULE every genome is first screened at a cheap fidelity
+(shorter episodes, fewer robots, coarser time step, fewer trials, see the
+--screening-* options) and only the best fraction is promoted to the full
+evaluation. The fraction may change along the run, e.g. "1:0.25;300:1"
+promotes a quarter of the genomes up to generation 299 and all of them
+afterwards. Only full fidelity fitness is reported as the best fitness.
+
+Populations evolved by different threads (the runs of a lockstep sweep,
+see sweep.py) submit their genomes to the same FusedEvaluator. Once every active
+client has submitted, the last one concatenates all the parameter matrices,
+runs a single simulation batch on the device and scatters the fitness back,
+so a device shared by several small populations is filled as if they were
+one big population.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import math
+import random
+import logging
+import threading
+import numpy as np
+import physics
+import surrogate
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+def add_arguments(parser):
+    """ Adds the options of the engine to an optimizer's argument parser. """
+    parser.add_argument("--cache-fitness",          help="reuse the fitness of genomes evaluated before instead of simulating them again", action="store_true")
+    parser.add_argument("--racing",                 help="allocate the episodes of each generation adaptively, to the genomes near the selection cut-off", action="store_true")
+    parser.add_argument("--base-episodes",          help="racing: episodes every genome is evaluated on first, default is 5", type=int, default=5)
+    parser.add_argument("--episode-budget",         help="racing: episodes per generation as a fraction of evaluating every genome \
+        on every distance, angle and trial, default is 0.5", type=float, default=0.5)
+    parser.add_argument("--surrogate",              help="pre-screen genomes with a surrogate model of the fitness (ridge or knn)", metavar="MODEL", type=str)
+    parser.add_argument("--surrogate-fraction",     help="surrogate: fraction of the best predicted genomes that is simulated, default is 0.5", type=float, default=0.5)
+    parser.add_argument("--surrogate-exploration",  help="surrogate: fraction of random genomes simulated besides, default is 0.1", type=float, default=0.1)
+    parser.add_argument("--surrogate-archive",      help="surrogate: number of simulated genomes the model is trained on, default is 2000", type=int, default=2000)
+    parser.add_argument("--promote",                help="multi-fidelity: fraction of the genomes screened at low fidelity that is promoted to the full \
+        evaluation from a generation on, e.g. 1:0.25;300:1", metavar="SCHEDULE", type=str)
+    parser.add_argument("--screening-ta",           help="multi-fidelity: screening timesteps without fitness avaliation, default is --ta", type=int)
+    parser.add_argument("--screening-tb",           help="multi-fidelity: screening timesteps with fitness avaliation, default is --tb / 4", type=int)
+    parser.add_argument("--screening-robots",       help="multi-fidelity: screening number of robots, default is --num-robots", type=int)
+    parser.add_argument("--screening-time-step",    help="multi-fidelity: screening time step (seconds), default is 0.1", type=float, default=0.1)
+    parser.add_argument("--screening-trials",       help="multi-fidelity: screening trials per distance, default is 1", type=int, default=1)
+
+def check_args(args):
+    """ Raises ValueError if the options of the engine conflict. """
+    if args.racing and args.lockstep:
+        raise ValueError('--racing cannot be used with --lockstep!')
+
+    if args.cache_fitness and args.lockstep:
+        raise ValueError('--cache-fitness cannot be used with --lockstep!')
+
+    if args.racing and args.cache_fitness:
+        raise ValueError('--racing cannot be used with --cache-fitness!')
+
+    if args.base_episodes < 1:
+        raise ValueError('--base-episodes must be at least 1!')
+
+    if not (0 < args.episode_budget <= 1):
+        raise ValueError('--episode-budget must be in (0, 1]!')
+
+    if (args.surrogate is not None) and (args.surrogate not in surrogate.Surrogate.MODELS):
+        raise ValueError('Surrogate model must be one of %s!' % ', '.join(sorted(surrogate.Surrogate.MODELS)))
+
+    if not (0 < args.surrogate_fraction <= 1) or not (0 <= args.surrogate_exploration < 1):
+        raise ValueError('--surrogate-fraction must be in (0, 1] and --surrogate-exploration in [0, 1)!')
+
+    if args.promote is not None:
+        parse_schedule(args.promote)
+
+        if args.lockstep:
+            raise ValueError('--promote cannot be used with --lockstep!')
+
+def parse_schedule(text):
+    """ 'GEN:FRACTION;GEN:FRACTION...' -> [ (GEN, FRACTION), ... ] sorted by generation. """
+    schedule = []
+
+    try:
+        for item in text.split(';'):
+            generation, fraction = item.split(':')
+            schedule.append((int(generation), float(fraction)))
+    except ValueError:
+        raise ValueError('Schedule must be given as GEN:FRACTION[;GEN:FRACTION...]: %s' % text)
+
+    for generation, fraction in schedule:
+        if not (0 < fraction <= 1):
+            raise ValueError('Schedule fractions must be in (0, 1]: %s' % text)
+
+    return sorted(schedule)
+
+def scheduled(schedule, generation):
+    """ Value of a parsed schedule at a generation, None before its first entry. """
+    value = None
+    for start, v in schedule:
+        if start <= generation:
+            value = v
+    return value
+
+def screening_fidelity(args):
+    """ (ta, tb, num_robots, time_step) of the screening simulations. """
+    return (args.screening_ta if args.screening_ta is not None else args.ta,
+            args.screening_tb if args.screening_tb is not None else max(1, args.tb / 4),
+            args.screening_robots if args.screening_robots is not None else args.num_robots,
+            args.screening_time_step)
+
+def instance_params(args):
+    """ Settings of the engine, for the instance parameters of the optimizers. """
+    params = {
+        'CACHE_FITNESS': 1 if args.cache_fitness else 0,
+        'RACING': 1 if args.racing else 0,
+        'SURROGATE': args.surrogate
+    }
+
+    if args.promote is not None:
+        ta, tb, num_robots, time_step = screening_fidelity(args)
+        params.update({
+            'PROMOTE': args.promote,
+            'SCREENING_TA': ta,
+            'SCREENING_TB': tb,
+            'SCREENING_ROBOTS': num_robots,
+            'SCREENING_TIME_STEP': time_step,
+            'SCREENING_TRIALS': args.screening_trials
+        })
+
+    return params
+
+def shift_below(values, limit):
+    """
+    values moved down together, if needed, so that they keep their order
+    but are all strictly below limit.
+    """
+    top = np.nextafter(limit, -np.inf)
+    excess = np.max(values) - top
+    if excess > 0:
+        values = np.minimum(values - excess, top)
+    return values
+
+def measured_fitness(fitness, measured=None):
+    """ The entries of fitness in the measured mask (default all). """
+    if measured is None:
+        return fitness
+    return fitness[measured]
+
+def evaluate_genomes(simulator, params, targets_distances, targets_angles, trials, ta=None, tb=None, time_step=None):
+    """
+    Average fitness of each row of params over every distance, angle and
+    trial, episodes of the simulator's length unless ta, tb or time_step
+    are given.
+    """
+    fitness = np.zeros(len(params))
+
+    for d in targets_distances:
+        for a in targets_angles:
+            for t in range(trials):
+                fitness += simulator.simulate(params, targets_distance=d, targets_angle=a, ta=ta, tb=tb, time_step=time_step)
+
+    return fitness / (len(targets_distances) * len(targets_angles) * trials)
+
+class FusedEvaluator(object):
+    """
+    Rendezvous of the populations sharing a device. Clients join() before
+    evolving and leave() when they stop, evaluate() blocks until every
+    joined client submitted its genomes for the current round.
+    """
+
+    def __init__(self, context, queue, args):
+        self.context = context
+        self.queue = queue
+        self.args = args
+
+        self.simulator = None
+
+        self.cond = threading.Condition()
+        self.active = 0
+        self.round = 0
+        self.submitted = []
+        self.results = {}
+
+    def join(self):
+        with self.cond:
+            self.active += 1
+
+    def leave(self):
+        with self.cond:
+            self.active -= 1
+
+            if self.submitted and len(self.submitted) >= self.active:
+                self.launch()
+
+    def evaluate(self, params):
+        """ Fitness of each row of params (a genome matrix, see codec.to_matrix). """
+        with self.cond:
+            token = object()
+            current = self.round
+            self.submitted.append((token, params))
+
+            if len(self.submitted) >= self.active:
+                self.launch()
+            else:
+                while self.round == current:
+                    self.cond.wait()
+
+            result = self.results.pop(token)
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+    def launch(self):
+        """ Evaluates every submitted matrix at once, called with the lock held. """
+        submitted = self.submitted
+        self.submitted = []
+
+        try:
+            params = np.vstack([ p for token, p in submitted ])
+            fitness = evaluate_genomes(self.get_simulator(), params,
+                                       self.args.targets_distances, self.args.targets_angles, self.args.trials)
+
+            offset = 0
+            for token, p in submitted:
+                self.results[token] = fitness[offset:offset+len(p)]
+                offset += len(p)
+
+        except Exception as e:
+            __log__.exception('Fused evaluation failed')
+            for token, p in submitted:
+                self.results[token] = e
+
+        self.round += 1
+        self.cond.notify_all()
+
+    def get_simulator(self):
+        # the simulator grows with the combined size of the populations
+        if self.simulator is None:
+            self.simulator = physics.Simulator(self.context, self.queue,
+                                               num_robots=self.args.num_robots,
+                                               ta=self.args.ta, tb=self.args.tb,
+                                               random_targets=self.args.random_targets,
+                                               symetrical_targets=self.args.symetrical_targets)
+        return self.simulator
+
+def create_engine(context, queue, args, fused_evaluator=None):
+    """ Engine configured by the options of add_arguments(). """
+    return Engine(context, queue, args, fused_evaluator,
+                  cache=args.cache_fitness,
+                  racing=args.racing,
+                  surrogate_model=args.surrogate,
+                  promote_schedule=parse_schedule(args.promote) if args.promote else None)
+
+class Optimizer(object):
+    """
+    Ask/tell interface of the optimizers driven by Engine. ask() returns a
+    matrix with one genome (or parameter vector) per row and tell() updates
+    the state with the fitness of each row. Optimizers whose population
+    lives in device memory override step() instead, simulating it with the
+    simulators of the engine.
+    """
+
+    # recordings are named 'run-NN-new-<best_name>-gen-...'
+    best_name = 'best'
+
+    def ask(self):
+        raise NotImplementedError()
+
+    def tell(self, fitness, measured=None):
+        """
+        Ranks the genomes of the last ask() by fitness. Only the ones in the
+        measured mask (default all) were simulated in full, the others may
+        be predictions and must not become bests nor count in the
+        statistics.
+        """
+        raise NotImplementedError()
+
+    def step(self, engine):
+        """ One generation. """
+        fitness = engine.evaluate(self.ask(), self.selection_size())
+        self.tell(fitness, engine.measured)
+
+    def selection_size(self):
+        """ How many of the best ranked genomes are selected (racing cut-off), None for half. """
+        return None
+
+    def statistics(self):
+        """ Progress data of the last generation (a dict). """
+        raise NotImplementedError()
+
+    def get_best(self):
+        """ (params, fitness) of the best found so far, params as accepted by the recorder. """
+        raise NotImplementedError()
+
+    def get_state(self):
+        raise NotImplementedError()
+
+    def set_state(self, header, arrays):
+        raise NotImplementedError()
+
+class Engine(object):
+    """
+    Runs an Optimizer. Batches are evaluated by fused_evaluator when given
+    (lockstep runs, or the evaluator slot of a PGA island) or else by
+    simulators of the engine, one per number of robots.
+
+    With cache=True the fitness of every evaluated genome is kept and
+    reused when the same genome is asked for again (elites, unchanged
+    offspring), so only the new ones are simulated. The cached fitness is
+    not re-sampled, which makes it a poor fit for noisy scenarios.
+
+    With racing=True episodes are allocated adaptively (see race()).
+
+    With a surrogate_model (see surrogate.py) the genomes are pre-screened
+    once the model has seen enough simulations: the ones not simulated get
+    their predicted fitness, shifted strictly below the lowest simulated
+    one, so they keep their predicted order but are never selected over a
+    simulated genome, and they are left out of the measured mask given to
+    Optimizer.tell() so they never become bests nor count in the averages.
+    The model is not checkpointed, after a resume it warms up again.
+
+    With a promote_schedule (see parse_schedule()) genomes are screened by
+    simulations at the screening_fidelity(args) and the promoted ones are
+    evaluated in full. The others keep their screening fitness, shifted
+    strictly below the lowest full fidelity one and left out of the
+    measured mask, like the surrogate predictions.
+    """
+
+    CACHE_SIZE = 100000
+
+    # half width of the racing confidence intervals, in standard errors
+    RACING_Z = 1.96
+
+    def __init__(self, context, queue, args, fused_evaluator=None, cache=False, racing=False, surrogate_model=None, promote_schedule=None):
+        self.context = context
+        self.queue = queue
+        self.args = args
+        self.fused_evaluator = fused_evaluator
+        self.racing = racing
+
+        self.simulators = {}
+        self.cache = {} if cache else None
+
+        self.surrogate = None
+        if surrogate_model is not None:
+            self.surrogate = surrogate.Surrogate(surrogate_model, args.surrogate_archive)
+
+        self.promote_schedule = promote_schedule
+        self.generation = 1
+
+        # fraction of the genomes evaluated in full in the last generation
+        self.promoted = 1.0
+
+        # mask of the genomes of the last evaluate() simulated at full fidelity
+        self.measured = None
+
+        self.evaluations = 0
+        self.cache_hits = 0
+        self.episodes = 0
+        self.screened_out = 0
+
+    def get_simulator(self, num_robots=None):
+        """
+        Simulator of num_robots robots per world (default args.num_robots),
+        batches of any size and the episode length and time step are given
+        per launch.
+        """
+        if num_robots is None:
+            num_robots = self.args.num_robots
+
+        if num_robots not in self.simulators:
+            self.simulators[num_robots] = physics.Simulator(self.context, self.queue,
+                                                            num_robots=num_robots,
+                                                            ta=self.args.ta, tb=self.args.tb,
+                                                            random_targets=self.args.random_targets,
+                                                            symetrical_targets=self.args.symetrical_targets)
+        return self.simulators[num_robots]
+
+    def evaluate(self, params, selection_size=None):
+        """ Fitness of each row of params, selection_size is the racing cut-off. """
+        self.measured = np.zeros(len(params), dtype=bool)
+
+        if self.surrogate is None:
+            fitness, full = self.evaluate_fidelities(params, selection_size)
+            self.measured[full] = True
+            return fitness
+
+        # the model only learns from full fidelity fitness
+        if not self.surrogate.ready:
+            fitness, full = self.evaluate_fidelities(params, selection_size)
+            self.surrogate.record(params[full], fitness[full])
+            self.measured[full] = True
+            return fitness
+
+        predicted = self.surrogate.predict(params)
+        chosen = self.surrogate.screen(predicted, self.args.surrogate_fraction, self.args.surrogate_exploration)
+
+        simulated, full = self.evaluate_fidelities(params[chosen], selection_size)
+        self.surrogate.record(params[chosen][full], simulated[full], predicted[chosen][full])
+
+        fitness = shift_below(predicted, np.min(simulated))
+        fitness[chosen] = simulated
+        self.measured[chosen[full]] = True
+
+        self.screened_out += len(params) - len(chosen)
+        return fitness
+
+    def evaluate_fidelities(self, params, selection_size=None):
+        """ Fitness of each row of params and the indexes of the rows evaluated at full fidelity. """
+        fraction = None
+        if self.promote_schedule is not None:
+            fraction = scheduled(self.promote_schedule, self.generation)
+
+        if (fraction is None) or (fraction >= 1):
+            self.promoted = 1.0
+            return self.evaluate_batch(params, selection_size), np.arange(len(params))
+
+        ta, tb, num_robots, time_step = screening_fidelity(self.args)
+        screened = evaluate_genomes(self.get_simulator(num_robots), params,
+                                    self.args.targets_distances, self.args.targets_angles, self.args.screening_trials,
+                                    ta=ta, tb=tb, time_step=time_step)
+
+        num_promoted = max(1, int(math.ceil(fraction * len(params))))
+        promoted = np.sort(np.argsort(-screened)[:num_promoted])
+
+        full = self.evaluate_batch(params[promoted], selection_size)
+
+        fitness = shift_below(screened, np.min(full))
+        fitness[promoted] = full
+
+        self.promoted = num_promoted / float(len(params))
+        return fitness, promoted
+
+    def evaluate_batch(self, params, selection_size=None):
+        self.evaluations += len(params)
+
+        if self.racing:
+            return self.race(params, selection_size)
+
+        if self.cache is None:
+            return self.simulate(params)
+
+        keys = [ p.tostring() for p in params ]
+
+        missing = []
+        seen = set()
+        for i, key in enumerate(keys):
+            if (key not in self.cache) and (key not in seen):
+                missing.append(i)
+                seen.add(key)
+
+        self.cache_hits += len(params) - len(missing)
+
+        if missing:
+            fitness = self.simulate(params[missing])
+
+            if len(self.cache) + len(missing) > self.CACHE_SIZE:
+                self.cache.clear()
+
+            for i, f in zip(missing, fitness):
+                self.cache[keys[i]] = float(f)
+
+        return np.array([ self.cache[key] for key in keys ])
+
+    def simulate(self, params):
+        if self.fused_evaluator is not None:
+            return np.asarray(self.fused_evaluator.evaluate(params), dtype=np.float64)
+
+        return evaluate_genomes(self.get_simulator(), params,
+                                self.args.targets_distances, self.args.targets_angles, self.args.trials)
+
+    def race(self, params, selection_size=None):
+        """
+        Estimated fitness of each row of params. Every row is evaluated on
+        the first args.base_episodes episodes, then the rows whose mean is
+        within RACING_Z standard errors of the cut-off between the
+        selection_size best and the rest get one more episode, round after
+        round, until no row is contested or the budget is spent.
+        """
+        # distances vary fastest, so the base episodes cover them first
+        scenarios = [ (d, a) for t in range(self.args.trials) for a in self.args.targets_angles for d in self.args.targets_distances ]
+
+        n = len(params)
+        base = min(self.args.base_episodes, len(scenarios))
+        budget = max(n * base, int(self.args.episode_budget * n * len(scenarios)))
+
+        sums = np.zeros(n)
+        sumsq = np.zeros(n)
+        counts = np.zeros(n, dtype=np.int32)
+
+        def run_episodes(rows):
+            # rows at the same episode share one simulation
+            for e in np.unique(counts[rows]):
+                group = rows[counts[rows] == e]
+                d, a = scenarios[e]
+
+                fitness = self.get_simulator().simulate(params[group], targets_distance=d, targets_angle=a)
+
+                sums[group] += fitness
+                sumsq[group] += fitness ** 2
+                counts[group] += 1
+
+        for e in range(base):
+            run_episodes(np.arange(n))
+        used = n * base
+
+        k = min(selection_size or n / 2, n - 1)
+        while (used < budget) and (k > 0):
+            means = sums / counts
+            deviations = sumsq - counts * means ** 2
+
+            # rows with a single episode use the pooled variance
+            multiple = counts > 1
+            if np.any(multiple):
+                pooled = np.sum(deviations[multiple]) / np.sum(counts[multiple] - 1)
+            else:
+                pooled = np.var(means)
+
+            variance = np.empty(n)
+            variance.fill(pooled)
+            variance[multiple] = np.maximum(deviations[multiple], 0) / (counts[multiple] - 1)
+
+            ranked = np.sort(means)[::-1]
+            cutoff = (ranked[k-1] + ranked[k]) / 2.0
+            distance = np.abs(means - cutoff)
+
+            contested = np.where((distance <= self.RACING_Z * np.sqrt(variance / counts)) & (counts < len(scenarios)))[0]
+            if len(contested) == 0:
+                break
+
+            if len(contested) > budget - used:
+                contested = contested[np.argsort(distance[contested])[:budget - used]]
+
+            run_episodes(contested)
+            used += len(contested)
+
+        self.episodes += used
+        return sums / counts
+
+    def run(self, optimizer, run=None, checkpointer=None, best_recorder=None):
+        """ Evolves for args.num_generations (resuming from checkpointer), reporting to run. """
+        log = logging.getLogger(optimizer.__module__)
+        log.info('%s starting...', optimizer.__class__.__name__)
+
+        if run:
+            run.begin()
+
+        last_best_fitness = None
+        generation = 1
+
+        state = checkpointer.load() if checkpointer else None
+        if state is not None:
+            optimizer.set_state(*state)
+            last_best_fitness = state[0].get('last_best_fitness', optimizer.get_best()[1])
+            generation = state[0]['generation'] + 1
+
+        while generation <= self.args.num_generations:
+            log.info('[gen=%d] Evaluating...', generation)
+
+            self.generation = generation
+            optimizer.step(self)
+
+            stats = optimizer.statistics()
+
+            log.info('[gen=%d] %s', generation, ', '.join('%s = %.5f' % (k, v) for k, v in sorted(stats.items()) if isinstance(v, float)))
+            if self.cache is not None:
+                log.debug('[gen=%d] %d of %d evaluations were cached', generation, self.cache_hits, self.evaluations)
+            if self.racing:
+                log.debug('[gen=%d] %d episodes simulated in total', generation, self.episodes)
+            if (self.surrogate is not None) and (self.surrogate.rank_correlation is not None):
+                log.info('[gen=%d] surrogate rank correlation = %.3f, mean error = %.5f, %d genomes screened out in total', generation,
+                         self.surrogate.rank_correlation, self.surrogate.mean_error, self.screened_out)
+
+            if run:
+                data = { 'generation': generation }
+                data.update(stats)
+
+                if (self.surrogate is not None) and (self.surrogate.rank_correlation is not None):
+                    data['surrogate_rank_correlation'] = self.surrogate.rank_correlation
+                    data['surrogate_mean_error'] = self.surrogate.mean_error
+
+                # which fidelity the fitness of this generation comes from
+                if self.promote_schedule is not None:
+                    ta, tb, num_robots, time_step = screening_fidelity(self.args)
+                    data['fidelity'] = {
+                        'promoted': self.promoted,
+                        'screening': { 'ta': ta, 'tb': tb, 'num_robots': num_robots, 'time_step': time_step, 'trials': self.args.screening_trials },
+                        'full': { 'ta': self.args.ta, 'tb': self.args.tb, 'num_robots': self.args.num_robots, 'time_step': physics.TIME_STEP, 'trials': self.args.trials }
+                    }
+
+                run.progress(generation / float(self.args.num_generations), data)
+
+            params, fitness = optimizer.get_best()
+            if (last_best_fitness is None) or (fitness > last_best_fitness):
+                last_best_fitness = fitness
+
+                if run and best_recorder:
+                    log.info('[gen=%d] Recording the new found %s...', generation, optimizer.best_name)
+                    best_recorder.record(run, generation, params,
+                                         'run-%02d-new-%s-gen-%04d-fit-%%.4f.srs' % (run.id, optimizer.best_name, generation),
+                                         targets_distance=self.args.targets_distances[ random.randint(0, len(self.args.targets_distances)-1) ],
+                                         targets_angle=self.args.targets_angles[ random.randint(0, len(self.args.targets_angles)-1) ],
+                                         fitness=fitness)
+
+            if checkpointer and checkpointer.due(generation, self.args.num_generations):
+                header, arrays = optimizer.get_state()
+                header['last_best_fitness'] = last_best_fitness
+                checkpointer.save(generation, header, arrays)
+
+            generation += 1
+
+        if best_recorder:
+            best_recorder.close()
+
+        if run:
+            run.done()
@@ -24,19 +24,26 @@ import argparse
 import random
 import logging
 import physics
+import codec
+import checkpoint
+import recorder
 import pyopencl as cl
-import solace
+import report
+import sweep
+import evaluator
 # import png
 import subprocess
-import tempfile
 import math
 import numpy as np
 import time
+import Queue
+import threading
+import bisect
 
 logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
 __log__ = logging.getLogger(__name__)
 
-def main():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbosity",        help="increase output verbosity", action="count")
     parser.add_argument("-q", "--quiet",            help="supress output (except errors)", action="store_true")
@@ -59,7 +66,20 @@ def main():
     parser.add_argument("-m", "--pmutation",        help="probability of mutation, default is 0.03", type=float, default=0.03)
     parser.add_argument("-o", "--offspring",        help="number of children each couple of indivuals generate, MUST BE EVEN, default is 6", type=int, default=6)
     parser.add_argument("-e", "--elite-size",       help="size of population elite, default is 24", type=int, default=24)
-    args = parser.parse_args()
+    parser.add_argument("--device-ga",              help="keep the population in device memory and breed it there", action="store_true")
+    parser.add_argument("--steady-state",           help="steady state evolution, offspring batches are evaluated asynchronously", action="store_true")
+    parser.add_argument("--batch-size",             help="steady state: number of offspring evaluated together, default is 20", type=int, default=20)
+    parser.add_argument("--batches-in-flight",      help="steady state: number of batches evaluated concurrently per device, default is 2", type=int, default=2)
+    parser.add_argument("--replacement",            help="steady state: how offspring enter the population (worst or tournament), default is worst", type=str, default='worst')
+    parser.add_argument("--tournament-size",        help="steady state: tournament size for selection and replacement, default is 3", type=int, default=3)
+    parser.add_argument("--checkpoint",             help="save the state of each run to FILE.runNN periodically", metavar="FILE", type=str)
+    parser.add_argument("--checkpoint-freq",        help="frequency of checkpoints (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--resume",                 help="resume runs from their checkpoints (requires --checkpoint)", action="store_true")
+    parser.add_argument("--lazy-recording",         help="do not record new bests, write an index to FILE.runNN to replay them later", metavar="FILE", type=str)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    parser.add_argument("--lockstep",               help="advance all runs together, evaluating their populations in one simulation batch per generation", action="store_true")
+    evaluator.add_arguments(parser)
+    args = parser.parse_args(argv)
 
     if args.verbosity >= 2:
         __log__.setLevel(logging.DEBUG)
@@ -75,31 +95,36 @@ def main():
         __log__.error('Offspring must be an even number!')
         sys.exit(1)
 
-    uri = os.environ.get('SOLACE_URI')
-    username = os.environ.get('SOLACE_USERNAME')
-    password = os.environ.get('SOLACE_PASSWORD')
+    if args.steady_state and (args.population_size % args.batch_size) != 0:
+        __log__.error('Population size must be a multiple of the batch size!')
+        sys.exit(1)
+
+    if args.resume and (args.checkpoint is None):
+        __log__.error('--resume requires --checkpoint!')
+        sys.exit(1)
 
     try:
-        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
-    except:
-        git_version = None
+        evaluator.check_args(args)
+    except ValueError as e:
+        __log__.error(str(e))
+        sys.exit(1)
 
-    if (uri is None) or (username is None) or (password is None):
-        raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set!')
+    if args.replacement not in ('worst', 'tournament'):
+        __log__.error('Replacement must be worst or tournament!')
+        sys.exit(1)
 
-    device_type = cl.device_type.ALL
-    if args.device_type == 'cpu':
-        device_type = cl.device_type.CPU
-    elif args.device_type == 'gpu':
-        device_type = cl.device_type.GPU
+    if args.lockstep and (args.device_ga or args.steady_state):
+        __log__.error('--lockstep cannot be used with --device-ga or --steady-state!')
+        sys.exit(1)
 
-    platform = cl.get_platforms()[0]
-    devices = platform.get_devices(device_type=device_type)
-    context = cl.Context(devices=devices)
-    queue = cl.CommandQueue(context)
+    if (args.cache_fitness or args.racing or args.surrogate or args.promote) and (args.device_ga or args.steady_state):
+        __log__.error('--cache-fitness, --racing, --surrogate and --promote cannot be used with --device-ga or --steady-state!')
+        sys.exit(1)
+
+    return args
 
-    exp = solace.get_experiment(uri, username, password)
-    inst = exp.create_instance(args.num_runs, {
+def instance_params(args):
+    params = {
         'PCROSSOVER': args.pcrossover,
         'PMUTATION': args.pmutation,
         'ELITE_SIZE': args.elite_size,
@@ -115,24 +140,77 @@ def main():
         'TRIALS': args.trials,
         'RANDOM_TARGETS': 1 if args.random_targets else 0,
         'SYMETRICAL_TARGETS': 1 if args.symetrical_targets else 0
-    }, code_version=git_version)
+    }
 
-    for run in inst.runs:
-        GA(context, queue, args).execute(run)
+    params.update(evaluator.instance_params(args))
+    return params
 
-class GA(object):
-    def __init__(self, context, queue, args):
-        self.context = context
-        self.queue = queue
+def main():
+    args = parse_args()
+
+    try:
+        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
+    except:
+        git_version = None
+
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
+
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
+
+    exp = report.get_experiment(args.results_dir)
+    inst = exp.create_instance(args.num_runs, instance_params(args), code_version=git_version)
+
+    runs = [ report.AsyncRun(run) for run in inst.runs ]
+
+    if args.lockstep:
+        sweep.lockstep(context, queue, [ (args, run, i+1) for i, run in enumerate(runs) ], execute_run)
+    else:
+        for i, run in enumerate(runs):
+            execute_run(context, queue, args, run, i+1)
+
+def execute_run(context, queue, args, run, run_index, fused_evaluator=None):
+    """ Executes one run, the populations are evaluated by fused_evaluator when given (see sweep.py). """
+    checkpointer = None
+    if args.checkpoint:
+        filename = checkpoint.run_filename(args.checkpoint, run_index)
+        if (not args.resume) and os.path.exists(filename):
+            os.remove(filename)
+        checkpointer = checkpoint.Checkpointer(filename, args.checkpoint_freq)
+
+    best_recorder = recorder.create(context, args, run_index)
+
+    if args.steady_state:
+        queues = [ cl.CommandQueue(context, device) for device in context.devices ]
+        optimizer = SteadyStateGA(context, queues, args)
+        try:
+            optimizer.execute(run, checkpointer, best_recorder)
+        finally:
+            optimizer.close()
+    else:
+        engine = evaluator.create_engine(context, queue, args, fused_evaluator)
+
+        if args.device_ga:
+            optimizer = DeviceGA(context, queue, args)
+        else:
+            optimizer = GA(args)
+
+        engine.run(optimizer, run, checkpointer, best_recorder)
+
+    if checkpointer:
+        checkpointer.close()
+
+class GA(evaluator.Optimizer):
+    def __init__(self, args):
         self.args = args
 
         self.population = [ Individual(physics.ANN_PARAMS_SIZE) for i in range(args.population_size) ]
-        self.simulator = physics.Simulator(self.context, self.queue,
-                                           num_worlds=args.population_size,
-                                           num_robots=args.num_robots,
-                                           ta=args.ta, tb=args.tb,
-                                           random_targets=args.random_targets,
-                                           symetrical_targets=args.symetrical_targets)
 
         self.avg_fitness = None
         self.best = None
@@ -140,55 +218,113 @@ class GA(object):
         self.step_count = 0
         self.avg_step_time = 0
 
-    def execute(self, run=None):
-        __log__.info(' GA Starting...')
+    def statistics(self):
+        return {
+            'avg_fitness': self.avg_fitness,
+            'best_fitness': self.best.fitness,
+            'best_genome': self.best.genome_hex
+        }
+
+    def get_best(self):
+        return self.best.genome, self.best.fitness
+
+    def get_state(self):
+        header = {
+            'avg_fitness': float(self.avg_fitness),
+            'best_fitness': float(self.best.fitness),
+            'step_count': self.step_count,
+            'avg_step_time': self.avg_step_time
+        }
+
+        arrays = {
+            'population': codec.to_matrix([ ind.genome for ind in self.population ]),
+            'fitness': np.array([ ind.fitness for ind in self.population ], dtype=np.float64),
+            'best': codec.to_array(self.best.genome)
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        self.population = []
+        for genome, fitness in zip(arrays['population'], arrays['fitness']):
+            ind = Individual(len(genome))
+            ind.genome = genome.tostring()
+            ind.fitness = float(fitness)
+            self.population.append(ind)
+
+        self.best = Individual(len(arrays['best']))
+        self.best.genome = arrays['best'].tostring()
+        self.best.fitness = header['best_fitness']
+
+        self.avg_fitness = header['avg_fitness']
+        self.step_count = header['step_count']
+        self.avg_step_time = header['avg_step_time']
+
+    def resize(self, size):
+        """
+        Shrinks (dropping the last individuals) or grows (adding mutated copies
+        of random individuals) the population.
+        """
+        while len(self.population) > size:
+            self.population.pop()
+
+        while len(self.population) < size:
+            individual = random.choice(self.population).copy()
+            individual.mutate(self.args.pmutation)
+            self.population.append(individual)
+
+    def step(self, engine, immigrants=None, num_emigrants=0):
+        """
+        One generation. Evaluated immigrants from other populations replace
+        the worst individuals before breeding; copies of the num_emigrants
+        best individuals are returned.
+        """
+        start = time.time()
 
-        if run:
-            run.begin()
+        fitness = engine.evaluate(self.ask(), self.selection_size())
+        emigrants = self.tell(fitness, engine.measured, immigrants=immigrants, num_emigrants=num_emigrants)
 
-        last_best_fitness = None
-        generation = 1
-        while (generation <= self.args.num_generations):
-            __log__.info('[gen=%d] Evaluating population...', generation)
+        end = time.time()
+        self.step_count += 1
+        self.avg_step_time = (self.avg_step_time * (self.step_count - 1) + (end - start)) / self.step_count
 
-            self.step()
+        return emigrants
 
-            __log__.info('[gen=%d] Population evaluated, avg_fitness = %.5f, best fitness = %.5f', generation, self.avg_fitness, self.best.fitness)
+    def selection_size(self):
+        # parents are taken from the top, two per family and one for the remaining (see tell())
+        n = len(self.population)
+        parents = 2 * (n / self.args.offspring) + (1 if (n % self.args.offspring) != 0 else 0)
+        return max(parents, self.args.elite_size)
 
-            if run:
-                run.progress(generation / float(self.args.num_generations), {
-                    'generation': generation,
-                    'avg_fitness': self.avg_fitness,
-                    'best_fitness': self.best.fitness,
-                    'best_genome': self.best.genome_hex
-                })
-
-            if (last_best_fitness is None) or (self.best.fitness > last_best_fitness):
-                last_best_fitness = self.best.fitness
+    def ask(self):
+        return codec.to_matrix([ ind.genome for ind in self.population ])
 
-                if run and (not self.args.no_save):
-                    __log__.info('[gen=%d] Saving simulation for the new found best...', generation)
-                    _, filename = tempfile.mkstemp(prefix='sim_', suffix='.srs')
+    def tell(self, fitness, measured=None, immigrants=None, num_emigrants=0):
+        """
+        Ranks the population by fitness and breeds the next one (see step()).
+        The best and the average fitness only come from the individuals in
+        the measured mask (default all).
+        """
+        for i in xrange(len(self.population)):
+            self.population[i].fitness = fitness[i]
 
-                    fitness = self.simulator.simulate_and_save(
-                        filename,
-                        [ self.best.genome_decoded for i in xrange(len(self.population)) ],
-                        targets_distance=self.args.targets_distances[ random.randint(0, len(self.args.targets_distances)-1) ],
-                        targets_angle=self.args.targets_angles[ random.randint(0, len(self.args.targets_angles)-1) ]
-                    )
+        scored = self.population
+        if measured is not None:
+            scored = [ ind for ind, m in zip(self.population, measured) if m ]
 
-                    run.upload(filename, 'run-%02d-new-best-gen-%04d-fit-%.4f.srs' % (run.id, generation, fitness[0]) )
-                    os.remove(filename)
+        self.avg_fitness = sum(ind.fitness for ind in scored) / len(scored)
+        self.best = max(scored, key=lambda ind: ind.fitness)
 
-            generation += 1
+        self.population = sorted(self.population, key=lambda ind: ind.fitness)
 
-        if run:
-            run.done()
+        if immigrants:
+            immigrants = immigrants[:len(self.population) - self.args.elite_size]
+            self.population[:len(immigrants)] = immigrants
+            self.population.sort(key=lambda ind: ind.fitness)
 
-    def step(self):
-        start = time.time()
-
-        (self.avg_fitness, self.best) = self.evaluate(self.args.targets_distances, self.args.targets_angles, self.args.trials)
+        emigrants = []
+        if num_emigrants > 0:
+            emigrants = [ ind.copy() for ind in self.population[-num_emigrants:] ]
 
         # Generate new pop
         elite = []
@@ -232,60 +368,381 @@ class GA(object):
 
         self.population = new_pop
 
+        return emigrants
+
+    def select(self):
+        return self.population.pop()
+
+    def generate_image(self, filename, block_width=8, block_height=8):
+        blocks = codec.to_matrix([ ind.genome for ind in self.population ]).tolist()
+        pixels = []
+
+        for i in xrange(len(blocks[0])):
+            line = []
+            for b in blocks:
+                for x in xrange(block_width):
+                    line.append(b[i])
+
+            for y in xrange(block_height):
+                pixels.append(line)
+
+        # png.from_array(pixels, 'L').save(filename)
+
+
+class DeviceGA(GA):
+    """
+    Same algorithm as GA, but the population never leaves the device: fitness
+    is accumulated, ranked and bred (truncation selection, elitism, single
+    point crossover and bit flip mutation) by the kernels in ga.cl. Only the
+    average/best fitness and the best genome are read back each generation.
+    """
+
+    def __init__(self, context, queue, args):
+        self.context = context
+        self.queue = queue
+        self.args = args
+
+        self.population = None
+
+        options = [
+            '-I"%s"' % os.path.join(physics.__dir__, 'kernels/'),
+            '-DGENOME_SIZE=%d' % physics.ANN_PARAMS_SIZE,
+        ]
+
+        src = open(os.path.join(physics.__dir__, 'kernels/ga.cl'), 'r')
+        self.prg = cl.Program(context, src.read()).build(options=' '.join(options))
+
+        n = args.population_size
+        self.population_buf = cl.Buffer(context, 0, n * physics.ANN_PARAMS_SIZE)
+        self.offspring_buf = cl.Buffer(context, 0, n * physics.ANN_PARAMS_SIZE)
+        self.fitness_buf = cl.Buffer(context, 0, 4 * n)
+        self.total_fitness_buf = cl.Buffer(context, 0, 4 * n)
+        self.order_buf = cl.Buffer(context, 0, 4 * n)
+        self.stats_buf = cl.Buffer(context, 0, 4 * 2)
+        self.best_buf = cl.Buffer(context, 0, physics.ANN_PARAMS_SIZE)
+
+        # ranluxcl needs 112 bytes of state per work item
+        self.rng_buf = cl.Buffer(context, 0, 112 * n)
+        self.prg.init_rng(queue, (n,), None, np.uint32(np.random.randint(0, 2**31)), self.rng_buf)
+        self.prg.random_population(queue, (n,), None, self.rng_buf, self.population_buf)
+
+        self.avg_fitness = None
+        self.best = None
+
+        self.step_count = 0
+        self.avg_step_time = 0
+
+    def step(self, engine):
+        start = time.time()
+
+        (self.avg_fitness, self.best) = self.evaluate(engine.get_simulator(),
+                                                      self.args.targets_distances, self.args.targets_angles, self.args.trials)
+
+        n = self.args.population_size
+        num_parents = min(n, 2 * max(1, n / self.args.offspring))
+
+        self.prg.breed(self.queue, (n,), None,
+                       self.rng_buf, self.population_buf, self.offspring_buf, self.order_buf,
+                       np.uint32(self.args.elite_size), np.uint32(num_parents),
+                       np.float32(self.args.pcrossover), np.float32(self.args.pmutation))
+
+        self.population_buf, self.offspring_buf = self.offspring_buf, self.population_buf
+
         end = time.time()
         self.step_count += 1
         self.avg_step_time = (self.avg_step_time * (self.step_count - 1) + (end - start)) / self.step_count
 
-    def select(self):
-        return self.population.pop()
+    def evaluate(self, simulator, targets_distances, targets_angles, trials):
+        n = self.args.population_size
+        num_evaluations = len(targets_distances) * len(targets_angles) * trials
 
-    def evaluate(self, targets_distances, targets_angles, trials):
-        for i in xrange(len(self.population)):
-            self.population[i].fitness = 0
+        self.prg.clear_fitness(self.queue, (n,), None, self.total_fitness_buf)
 
         for d in targets_distances:
             for a in targets_angles:
                 for t in range(trials):
-                    fitness = self.simulator.simulate([ ind.genome_decoded for ind in self.population ], targets_distance=d, targets_angle=a)
+                    simulator.enqueue_simulate(self.fitness_buf, d, a, raw_param_buf=self.population_buf, num_worlds=n)
+                    self.prg.accumulate_fitness(self.queue, (n,), None, self.total_fitness_buf, self.fitness_buf)
+
+        self.prg.rank(self.queue, (n,), None, self.total_fitness_buf, self.order_buf, np.uint32(n))
+        self.prg.statistics(self.queue, (1,), None,
+                            self.total_fitness_buf, self.order_buf, np.uint32(n),
+                            np.float32(1.0 / num_evaluations), self.population_buf,
+                            self.stats_buf, self.best_buf)
+
+        stats = np.zeros(2, dtype=np.float32)
+        best_genome = np.zeros(physics.ANN_PARAMS_SIZE, dtype=np.uint8)
+        cl.enqueue_copy(self.queue, stats, self.stats_buf)
+        cl.enqueue_copy(self.queue, best_genome, self.best_buf).wait()
+
+        best = Individual(physics.ANN_PARAMS_SIZE)
+        best.genome = best_genome.tostring()
+        best.fitness = float(stats[1])
+
+        return (float(stats[0]), best)
+
+    def get_state(self):
+        n = self.args.population_size
+
+        population = np.zeros((n, physics.ANN_PARAMS_SIZE), dtype=np.uint8)
+        rng = np.zeros(112 * n, dtype=np.uint8)
+        cl.enqueue_copy(self.queue, population, self.population_buf)
+        cl.enqueue_copy(self.queue, rng, self.rng_buf).wait()
+
+        header = {
+            'avg_fitness': float(self.avg_fitness),
+            'best_fitness': float(self.best.fitness),
+            'step_count': self.step_count,
+            'avg_step_time': self.avg_step_time
+        }
+
+        arrays = {
+            'population': population,
+            'device_rng': rng,
+            'best': codec.to_array(self.best.genome)
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        cl.enqueue_copy(self.queue, self.population_buf, np.ascontiguousarray(arrays['population']))
+        cl.enqueue_copy(self.queue, self.rng_buf, np.ascontiguousarray(arrays['device_rng'])).wait()
+
+        self.best = Individual(len(arrays['best']))
+        self.best.genome = arrays['best'].tostring()
+        self.best.fitness = header['best_fitness']
+
+        self.avg_fitness = header['avg_fitness']
+        self.step_count = header['step_count']
+        self.avg_step_time = header['avg_step_time']
+
+class SteadyStateGA(GA):
+    """
+    Steady state GA. A pool of worker threads (batches_in_flight per device)
+    evaluates offspring batches; every finished batch is inserted into the
+    population right away and replaced by a freshly bred one, so devices are
+    never idle waiting for the slowest one or for breeding and reporting.
+
+    A "generation" is population_size evaluations. close() stops the
+    workers and releases their simulators.
+    """
+
+    def __init__(self, context, queues, args):
+        self.context = context
+        self.queues = queues
+        self.args = args
+
+        self.population = [ Individual(physics.ANN_PARAMS_SIZE) for i in range(args.population_size) ]
+        self.simulator = None
 
-                    for i in xrange(len(self.population)):
-                        self.population[i].fitness += fitness[i]
+        self.pending = Queue.Queue()
+        self.finished = Queue.Queue()
 
-        for i in xrange(len(self.population)):
-            self.population[i].fitness /= len(targets_distances) * len(targets_angles) * trials
+        self.threads = []
+        self.simulators = []
+        for queue in queues:
+            for i in xrange(args.batches_in_flight):
+                simulator = physics.Simulator(self.context, queue,
+                                              num_worlds=args.batch_size,
+                                              num_robots=args.num_robots,
+                                              ta=args.ta, tb=args.tb,
+                                              random_targets=args.random_targets,
+                                              symetrical_targets=args.symetrical_targets)
 
-        self.population = sorted(self.population, key=lambda ind: ind.fitness)
+                if self.simulator is None:
+                    self.simulator = simulator
+                self.simulators.append(simulator)
 
-        avg_fitness = 0
-        for ind in self.population:
-            avg_fitness += ind.fitness
-        avg_fitness /= len(self.population)
+                t = threading.Thread(target=self.worker, args=(simulator,))
+                t.daemon = True
+                t.start()
+                self.threads.append(t)
 
-        best = self.population[-1]
+        self.workers = len(self.threads)
 
-        return (avg_fitness, best)
+        self.avg_fitness = None
+        self.best = None
 
-    def generate_image(self, filename, block_width=8, block_height=8):
-        blocks = [ [] for p in xrange(len(self.population)) ]
-        pixels = []
+        self.evaluations = 0
 
-        for p in xrange(len(self.population)):
-            gen = self.population[p].genome
+    def execute(self, run=None, checkpointer=None, best_recorder=None):
+        __log__.info(' Steady state GA Starting (%d evaluation workers)...', self.workers)
 
-            for c in gen:
-                blocks[p].append(ord(c))
+        if run:
+            run.begin()
 
-        for i in xrange(len(blocks[0])):
-            line = []
-            for b in blocks:
-                for x in xrange(block_width):
-                    line.append(b[i])
+        last_best_fitness = None
+        generation = 1
 
-            for y in xrange(block_height):
-                pixels.append(line)
+        state = checkpointer.load() if checkpointer else None
+        if state is not None:
+            self.set_state(*state)
+            last_best_fitness = state[0]['last_best_fitness']
+            generation = state[0]['generation'] + 1
+            self.evaluations = state[0]['evaluations']
 
-        # png.from_array(pixels, 'L').save(filename)
+        else:
+            # evaluate the initial population
+            for i in xrange(0, len(self.population), self.args.batch_size):
+                self.pending.put(self.population[i:i+self.args.batch_size])
+
+            for i in xrange(len(self.population) / self.args.batch_size):
+                self.collect()
+
+            self.population = sorted(self.population, key=lambda ind: ind.fitness)
+            self.update_statistics()
+
+        total_evaluations = self.args.num_generations * self.args.population_size
+
+        in_flight = 0
+        while (in_flight < self.workers) and (self.evaluations + in_flight * self.args.batch_size) < total_evaluations:
+            self.pending.put(self.breed(self.args.batch_size))
+            in_flight += 1
+
+        while in_flight > 0:
+            batch = self.collect()
+            in_flight -= 1
+
+            for ind in batch:
+                self.insert(ind)
+
+            self.evaluations += len(batch)
+
+            if (self.evaluations + in_flight * self.args.batch_size) < total_evaluations:
+                self.pending.put(self.breed(self.args.batch_size))
+                in_flight += 1
+
+            if self.evaluations < generation * self.args.population_size:
+                continue
+
+            self.update_statistics()
+
+            __log__.info('[gen=%d] %d evaluations, avg_fitness = %.5f, best fitness = %.5f', generation, self.evaluations, self.avg_fitness, self.best.fitness)
+
+            if run:
+                run.progress(generation / float(self.args.num_generations), {
+                    'generation': generation,
+                    'avg_fitness': self.avg_fitness,
+                    'best_fitness': self.best.fitness,
+                    'best_genome': self.best.genome_hex
+                })
+
+            if (last_best_fitness is None) or (self.best.fitness > last_best_fitness):
+                last_best_fitness = self.best.fitness
+
+                if run and best_recorder:
+                    __log__.info('[gen=%d] Recording the new found best...', generation)
+                    best_recorder.record(run, generation, self.best.genome,
+                                         'run-%02d-new-best-gen-%04d-fit-%%.4f.srs' % (run.id, generation),
+                                         targets_distance=self.args.targets_distances[ random.randint(0, len(self.args.targets_distances)-1) ],
+                                         targets_angle=self.args.targets_angles[ random.randint(0, len(self.args.targets_angles)-1) ],
+                                     fitness=self.best.fitness)
+
+            if checkpointer and checkpointer.due(generation, self.args.num_generations):
+                header, arrays = self.get_state()
+                header['last_best_fitness'] = last_best_fitness
+                header['evaluations'] = self.evaluations
+                checkpointer.save(generation, header, arrays)
+
+            generation += 1
+
+        if best_recorder:
+            best_recorder.close()
+
+        if run:
+            run.done()
+
+    def close(self):
+        """ Stops the workers once their current batch is done and releases the simulators. """
+        # batches not started yet (a run that failed) are dropped
+        while True:
+            try:
+                self.pending.get_nowait()
+            except Queue.Empty:
+                break
+
+        for t in self.threads:
+            self.pending.put(None)
+        for t in self.threads:
+            t.join()
+
+        self.threads = []
+        self.simulators = []
+        self.simulator = None
+
+    def worker(self, simulator):
+        while True:
+            batch = self.pending.get()
+            if batch is None:
+                return
+
+            try:
+                params = codec.to_matrix([ ind.genome for ind in batch ])
+                fitness = evaluator.evaluate_genomes(simulator, params, self.args.targets_distances, self.args.targets_angles, self.args.trials)
+
+                for i in xrange(len(batch)):
+                    batch[i].fitness = fitness[i]
+
+                self.finished.put(batch)
+
+            except Exception as e:
+                # execute() raises it, the worker goes on with the next batch
+                __log__.exception('Evaluation of a batch failed')
+                self.finished.put(e)
+
+    def collect(self):
+        """ Next evaluated batch, raises the exception of a failed one. """
+        result = self.finished.get()
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+    def update_statistics(self):
+        self.avg_fitness = sum(ind.fitness for ind in self.population) / len(self.population)
+        self.best = self.population[-1]
+
+    def breed(self, size):
+        batch = []
+
+        while len(batch) < size:
+            father = self.tournament()
+            mother = self.tournament()
+
+            if random.random() < self.args.pcrossover:
+                brother, sister = father.crossover(mother)
+            else:
+                brother = father.copy()
+                sister = mother.copy()
+
+            brother.mutate(self.args.pmutation)
+            sister.mutate(self.args.pmutation)
+
+            batch.append(brother)
+            batch.append(sister)
+
+        return batch[:size]
+
+    def tournament(self):
+        """ Best of tournament_size random individuals (population is sorted). """
+        idx = [ random.randint(0, len(self.population)-1) for i in xrange(self.args.tournament_size) ]
+        return self.population[max(idx)]
+
+    def insert(self, individual):
+        """ Inserts an evaluated individual keeping the population sorted and its size fixed. """
+        if self.args.replacement == 'tournament':
+            victim = min(random.randint(0, len(self.population)-1) for i in xrange(self.args.tournament_size))
+        else:
+            victim = 0
+
+        if individual.fitness <= self.population[victim].fitness:
+            return
+
+        del self.population[victim]
 
+        keys = [ ind.fitness for ind in self.population ]
+        self.population.insert(bisect.bisect(keys, individual.fitness), individual)
 
 class Individual(object):
     def __init__(self, genome_length):
@@ -293,26 +750,18 @@ class Individual(object):
 
         self.fitness = 0
 
-        self.genome = ''
-        for i in xrange(genome_length):
-            self.genome += chr(random.randint(0,255))
+        self.genome = codec.random_genome(genome_length)
 
     def __repr__(self):
         return 'Individual(%d, fitness=%.5f)' % (self.id, self.fitness)
 
     @property
     def genome_hex(self):
-        ret = ''
-        for c in self.genome:
-            ret += c.encode('hex')
-        return ret
+        return codec.to_hex(self.genome)
 
     @property
     def genome_decoded(self):
-        ret = np.zeros(len(self.genome))
-        for i in xrange(len(self.genome)):
-            ret[i] = float(ord(self.genome[i])) / 255
-        return ret
+        return codec.decode(self.genome)
 
     def copy(self):
         g = Individual(len(self.genome))
@@ -97,15 +97,18 @@ typedef struct {
     wall_t walls[4];
     target_area_t target_areas[2];
 
-    // ANN parameters
+    unsigned int random_offset;
+} world_t;
+
+// ANN parameters, kept apart from the worlds so that several worlds can
+// share the same controller
+typedef struct {
     float weights[NUM_ACTUATORS][NUM_SENSORS+NUM_HIDDEN];
     float bias[NUM_ACTUATORS];
 
     float weights_hidden[NUM_HIDDEN][NUM_SENSORS];
     float bias_hidden[NUM_HIDDEN];
     float timec_hidden[NUM_HIDDEN];
-
-    unsigned int random_offset;
-} world_t;
+} controller_t;
 
 #endif
\ No newline at end of file
@@ -0,0 +1,138 @@
+#ifndef __GA_CL__
+#define __GA_CL__
+
+// genetic operators for populations kept in device memory, one work item per
+// individual. genomes are stored as GENOME_SIZE consecutive bytes.
+
+#include <rng.cl>
+
+__kernel void init_rng(unsigned int seed, __global ranluxcl_state_t *ranluxcltab)
+{
+    ranluxcl_initialization(seed, ranluxcltab);
+}
+
+__kernel void random_population(__global ranluxcl_state_t *ranluxcltab, __global uchar *population)
+{
+    rng_t rng;
+    unsigned int i;
+    __global uchar *genome = &population[get_global_id(0)*GENOME_SIZE];
+
+    ranluxcl_download_seed(&rng.state, ranluxcltab);
+    rng.available = 0;
+
+    for (i = 0; i < GENOME_SIZE; i++)
+        genome[i] = (uchar) rng_next_uint(&rng, 256);
+
+    ranluxcl_upload_seed(&rng.state, ranluxcltab);
+}
+
+__kernel void clear_fitness(__global float *total)
+{
+    total[get_global_id(0)] = 0;
+}
+
+__kernel void accumulate_fitness(__global float *total, __global const float *fitness)
+{
+    total[get_global_id(0)] += fitness[get_global_id(0)];
+}
+
+// order[0] is the index of the best individual, order[n-1] of the worst
+__kernel void rank(__global const float *total, __global unsigned int *order, unsigned int n)
+{
+    unsigned int i = get_global_id(0);
+    unsigned int j, r = 0;
+    float f = total[i];
+
+    for (j = 0; j < n; j++)
+    {
+        if ((total[j] > f) || ((total[j] == f) && (j < i)))
+            r++;
+    }
+
+    order[r] = i;
+}
+
+// single work item: stats[0] = average fitness, stats[1] = best fitness
+__kernel void statistics(__global const float *total, __global const unsigned int *order,
+                         unsigned int n, float scale,
+                         __global const uchar *population,
+                         __global float *stats, __global uchar *best)
+{
+    unsigned int i;
+    float sum = 0;
+
+    for (i = 0; i < n; i++)
+        sum += total[i];
+
+    stats[0] = (sum / n) * scale;
+    stats[1] = total[order[0]] * scale;
+
+    for (i = 0; i < GENOME_SIZE; i++)
+        best[i] = population[order[0]*GENOME_SIZE+i];
+}
+
+// the first elite_size children are copies of the best individuals, the
+// others are bred from two parents drawn among the num_parents best ones
+// (truncation selection) using single point crossover and bit flip mutation
+__kernel void breed(__global ranluxcl_state_t *ranluxcltab,
+                    __global const uchar *population,
+                    __global uchar *offspring,
+                    __global const unsigned int *order,
+                    unsigned int elite_size,
+                    unsigned int num_parents,
+                    float pcrossover,
+                    float pmutation)
+{
+    rng_t rng;
+    unsigned int i, b;
+    unsigned int id = get_global_id(0);
+    __global uchar *child = &offspring[id*GENOME_SIZE];
+
+    if (id < elite_size)
+    {
+        for (i = 0; i < GENOME_SIZE; i++)
+            child[i] = population[order[id]*GENOME_SIZE+i];
+        return;
+    }
+
+    ranluxcl_download_seed(&rng.state, ranluxcltab);
+    rng.available = 0;
+
+    __global const uchar *father = &population[order[rng_next_uint(&rng, num_parents)]*GENOME_SIZE];
+    __global const uchar *mother = &population[order[rng_next_uint(&rng, num_parents)]*GENOME_SIZE];
+
+    if (rng_next(&rng) < pcrossover)
+    {
+        // same semantics as Individual.merge() on the host
+        unsigned int point = 1 + rng_next_uint(&rng, GENOME_SIZE*8-1);
+        unsigned int idx = point / 8;
+        unsigned int bit = 7 - (point % 8); // big endian
+        uchar mask = (uchar) ((1 << bit) - 1);
+
+        for (i = 0; i < idx; i++)
+            child[i] = father[i];
+
+        child[idx] = (father[idx] & mask) | (mother[idx] & ~mask);
+
+        for (i = idx+1; i < GENOME_SIZE; i++)
+            child[i] = mother[i];
+    }
+    else
+    {
+        for (i = 0; i < GENOME_SIZE; i++)
+            child[i] = father[i];
+    }
+
+    for (i = 0; i < GENOME_SIZE; i++)
+    {
+        for (b = 0; b < 8; b++)
+        {
+            if (rng_next(&rng) < pmutation)
+                child[i] ^= (uchar) (1 << b);
+        }
+    }
+
+    ranluxcl_upload_seed(&rng.state, ranluxcltab);
+}
+
+#endif
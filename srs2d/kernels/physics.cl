@@ -10,23 +10,94 @@
 #include <ir_wall_samples.cl>
 #include <ir_round_samples.cl>
 
-void init_world(__global float *random, __global world_t *world, __local transform_t *transforms, float targets_distance, float targets_angle, __global float *params);
+void init_world(__global float *random, __global world_t *world, __local transform_t *transforms, float targets_distance, float targets_angle);
 void init_robot(__global float *random, __global world_t *world, __local transform_t *transforms, __global robot_t *robot);
 void set_random_position(__global float *random, __global world_t *world, __local transform_t *transforms, __global robot_t *robot);
-void step_actuators(__global world_t *world, __local transform_t *transforms, __global robot_t *robot);
+void step_actuators(__global world_t *world, __local transform_t *transforms, __global robot_t *robot, float time_step);
 void step_sensors(__global world_t *world, __local transform_t *transforms, __global robot_t *robot);
 void step_collisions(__global world_t *world, __local transform_t *transforms, __global robot_t *robot);
-void step_controllers(__global world_t *world, __local transform_t *transforms, __global robot_t *robot);
+void step_controllers(__global const controller_t *controller, __global world_t *world, __local transform_t *transforms, __global robot_t *robot);
 void fill_raycast_table(__global world_t *world, __local transform_t *transforms, __global robot_t *robot);
 
+// integer hash, a bijection of the 32 bit values
+unsigned int hash32(unsigned int x)
+{
+    x ^= x >> 16;
+    x *= 0x7feb352du;
+    x ^= x >> 15;
+    x *= 0x846ca68bu;
+    x ^= x >> 16;
+    return x;
+}
+
+// fills the random values of one world per work item from the world's seed:
+// seeds[i] when given, otherwise base_seed + WORLD_SEED_STEP * i (see
+// physics.world_seeds()). Nothing but the seed decides a world's values.
+__kernel void init_random(unsigned int base_seed,
+                          __global const unsigned int *seeds,
+                          __global float *random)
+{
+    unsigned int id = get_global_id(0);
+    unsigned int seed, i;
+
+    if (seeds != 0)
+        seed = hash32(seeds[id]);
+    else
+        seed = hash32(base_seed + WORLD_SEED_STEP * id);
+
+    for (i = 0; i < RANDOM_PER_WORLD; i++)
+        random[id*RANDOM_PER_WORLD+i] = (hash32(seed + i) >> 8) * (1.0f / 16777216.0f);
+}
+
+// decodes one parameter set per work item into controllers, parameters come
+// either as floats in [0,1] or as raw genome bytes
+__kernel void init_controllers(__global float *param_list,
+                               __global uchar *raw_param_list,
+                               unsigned int param_size,
+                               __global controller_t *controllers)
+{
+    __global float *params = 0;
+    __global uchar *raw_params = 0;
+
+    if (raw_param_list != 0)
+        raw_params = &raw_param_list[get_global_id(0)*param_size];
+    else
+        params = &param_list[get_global_id(0)*param_size];
+
+    __global controller_t *controller = &controllers[get_global_id(0)];
+    unsigned int i, j, p = 0;
+
+    for (i=0; i<NUM_ACTUATORS; i++)
+    {
+        for (j=0; j<(NUM_SENSORS+NUM_HIDDEN); j++)
+            controller->weights[i][j] = scale_param(load_param(params, raw_params, p++), WEIGHTS_BOUNDARY_L, WEIGHTS_BOUNDARY_H);
+
+        controller->bias[i] = scale_param(load_param(params, raw_params, p++), BIAS_BOUNDARY_L, BIAS_BOUNDARY_H);
+    }
+
+    for (i=0; i<NUM_HIDDEN; i++)
+    {
+        for (j=0; j<NUM_SENSORS; j++)
+            controller->weights_hidden[i][j] = scale_param(load_param(params, raw_params, p++), WEIGHTS_BOUNDARY_L, WEIGHTS_BOUNDARY_H);
+
+        controller->bias_hidden[i] = scale_param(load_param(params, raw_params, p++), BIAS_BOUNDARY_L, BIAS_BOUNDARY_H);
+        controller->timec_hidden[i] = scale_param(load_param(params, raw_params, p++), TIMEC_BOUNDARY_L, TIMEC_BOUNDARY_H);
+    }
+}
+
 __kernel
 __attribute__((reqd_work_group_size(WORLDS_PER_LOCAL, ROBOTS_PER_LOCAL, 1)))
 void simulate(__global float *random,
               __global world_t *worlds,
               float targets_distance,
               float targets_angle,
-              __global float *param_list,
-              unsigned int param_size,
+              __global const controller_t *controllers,
+              unsigned int num_controllers,
+
+              // episode: ta steps without fitness evaluation, then tb steps with
+              unsigned int ta,
+              unsigned int tb,
+              float time_step,
 
               // return variables
               __global float *fitness,
@@ -43,7 +114,9 @@ void simulate(__global float *random,
               unsigned int save_hist
              )
 {
-    __global float *params = &param_list[get_global_id(0)*param_size];
+    // with fewer controllers than worlds they are shared round robin: world i
+    // uses controller i % num_controllers (see Simulator.simulate())
+    __global const controller_t *controller = &controllers[get_global_id(0) % num_controllers];
 
     unsigned int cur = 0;
     unsigned int rid;
@@ -56,7 +129,7 @@ void simulate(__global float *random,
 
 #ifdef WORK_ITEMS_ARE_WORLDS
     world->id = get_global_id(0);
-    init_world(random, world, transforms, targets_distance, targets_angle, params);
+    init_world(random, world, transforms, targets_distance, targets_angle);
 
     for (rid = 0; rid < ROBOTS_PER_WORLD; rid++)
     {
@@ -65,15 +138,15 @@ void simulate(__global float *random,
     }
 
     // k = number of time steps needed for a robot to consume one unit of energy while moving at maximum speed
-    float k = (distance(world->target_areas[0].center, world->target_areas[1].center) / (2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS)) / TIME_STEP;
+    float k = (distance(world->target_areas[0].center, world->target_areas[1].center) / (2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS)) / time_step;
 
-    // max_trips = maximum number of trips a robot, at maximum speed, can perform during a simulation of TB time steps
-    int max_trips = (int) floor( ((2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS) * TB * TIME_STEP) / distance(world->target_areas[0].center, world->target_areas[1].center) );
+    // max_trips = maximum number of trips a robot, at maximum speed, can perform during a simulation of tb time steps
+    int max_trips = (int) floor( ((2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS) * tb * time_step) / distance(world->target_areas[0].center, world->target_areas[1].center) );
 
-    while (cur < (TA + TB))
+    while (cur < (ta + tb))
     {
         for (rid = 0; rid < ROBOTS_PER_WORLD; rid++)
-            step_actuators(world, transforms, &world->robots[rid]);
+            step_actuators(world, transforms, &world->robots[rid], time_step);
 
         for (rid = 0; rid < ROBOTS_PER_WORLD; rid++)
             step_sensors(world, transforms, &world->robots[rid]);
@@ -82,9 +155,9 @@ void simulate(__global float *random,
             step_collisions(world, transforms, &world->robots[rid]);
 
         for (rid = 0; rid < ROBOTS_PER_WORLD; rid++)
-            step_controllers(world, transforms, &world->robots[rid]);
+            step_controllers(controller, world, transforms, &world->robots[rid]);
 
-        if (cur > TA)
+        if (cur > ta)
         {
             for (rid = 0; rid < ROBOTS_PER_WORLD; rid++)
             {
@@ -155,7 +228,7 @@ void simulate(__global float *random,
     if (get_global_id(1) == 0)
     {
         world->id = get_global_id(0);
-        init_world(random, world, transforms, targets_distance, targets_angle, params);
+        init_world(random, world, transforms, targets_distance, targets_angle);
 
         for (rid = 0; rid < ROBOTS_PER_WORLD; rid++)
         {
@@ -167,14 +240,14 @@ void simulate(__global float *random,
     barrier(CLK_GLOBAL_MEM_FENCE);
 
     // k = number of time steps needed for a robot to consume one unit of energy while moving at maximum speed
-    float k = (distance(world->target_areas[0].center, world->target_areas[1].center) / (2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS)) / TIME_STEP;
+    float k = (distance(world->target_areas[0].center, world->target_areas[1].center) / (2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS)) / time_step;
 
-    // max_trips = maximum number of trips a robot, at maximum speed, can perform during a simulation of TB time steps
-    int max_trips = (int) floor( ((2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS) * TB * TIME_STEP) / distance(world->target_areas[0].center, world->target_areas[1].center) );
+    // max_trips = maximum number of trips a robot, at maximum speed, can perform during a simulation of tb time steps
+    int max_trips = (int) floor( ((2 * WHEELS_MAX_ANGULAR_SPEED * WHEELS_RADIUS) * tb * time_step) / distance(world->target_areas[0].center, world->target_areas[1].center) );
 
-    while (cur < (TA + TB))
+    while (cur < (ta + tb))
     {
-        step_actuators(world, transforms, robot);
+        step_actuators(world, transforms, robot, time_step);
         barrier(CLK_GLOBAL_MEM_FENCE);
 
         step_sensors(world, transforms, robot);
@@ -183,10 +256,10 @@ void simulate(__global float *random,
         step_collisions(world, transforms, robot);
         barrier(CLK_GLOBAL_MEM_FENCE);
 
-        step_controllers(world, transforms, robot);
+        step_controllers(controller, world, transforms, robot);
         barrier(CLK_GLOBAL_MEM_FENCE);
 
-        if (cur > TA)
+        if (cur > ta)
         {
             robot->energy -= (fabs(robot->wheels_angular_speed.s0) + fabs(robot->wheels_angular_speed.s1)) /
                                                 (2 * k * WHEELS_MAX_ANGULAR_SPEED);
@@ -258,14 +331,13 @@ void init_world(__global float *random,
                 __global world_t *world,
                 __local transform_t *transforms,
                 float targets_distance,
-                float targets_angle,
-                __global float *params)
+                float targets_angle)
 {
     world->random_offset = 0;
 
     // walls
     world->arena_height = ARENA_HEIGHT;
-    world->arena_width = ARENA_WIDTH_MIN + random[world->id*NUM_WORLDS+(world->random_offset++)] * (ARENA_WIDTH_MAX - ARENA_WIDTH_MIN);
+    world->arena_width = ARENA_WIDTH_MIN + random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * (ARENA_WIDTH_MAX - ARENA_WIDTH_MIN);
 
     world->walls[0].p1.x = world->arena_width / 2;
     world->walls[0].p1.y = -world->arena_height / 2;
@@ -291,8 +363,8 @@ void init_world(__global float *random,
     world->target_areas[1].radius = TARGET_AREAS_RADIUS;
 
 #if defined(RANDOM_TARGET_AREAS) && defined(SYMETRICAL_TARGET_AREAS)
-    targets_distance = (random[world->id*NUM_WORLDS+(world->random_offset++)] * 0.6) + 0.8;
-    targets_angle = (random[world->id*NUM_WORLDS+(world->random_offset++)] * M_PI);
+    targets_distance = (random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * 0.6) + 0.8;
+    targets_angle = (random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * M_PI);
 #endif
 
     world->target_areas[0].center.x = cos(targets_angle) * (targets_distance / 2);
@@ -303,8 +375,8 @@ void init_world(__global float *random,
 #if defined(RANDOM_TARGET_AREAS) && (!defined(SYMETRICAL_TARGET_AREAS))
     float max_x = (world->arena_width / 2) - TARGET_AREAS_RADIUS;
     float max_y = (world->arena_height / 2) - TARGET_AREAS_RADIUS;
-    world->target_areas[0].center.x = (random[world->id*NUM_WORLDS+(world->random_offset++)] * 2 * max_x) - max_x;
-    world->target_areas[0].center.y = (random[world->id*NUM_WORLDS+(world->random_offset++)] * 2 * max_y) - max_y;
+    world->target_areas[0].center.x = (random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * 2 * max_x) - max_x;
+    world->target_areas[0].center.y = (random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * 2 * max_y) - max_y;
 
     float gap_width = targets_distance + TARGET_AREAS_RADIUS - (world->arena_width / 2);
     float gap_height = targets_distance + TARGET_AREAS_RADIUS - (world->arena_height / 2);
@@ -325,7 +397,7 @@ void init_world(__global float *random,
             world->target_areas[0].center.y = -gap_height;
     }
 
-    float random_angle = random[world->id*NUM_WORLDS+(world->random_offset++)] * M_PI / 2;
+    float random_angle = random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * M_PI / 2;
 
     if ((world->target_areas[0].center.x > 0) && (world->target_areas[0].center.y > 0)) // first quadrant
         random_angle += M_PI;
@@ -341,25 +413,6 @@ void init_world(__global float *random,
     world->target_areas[1].center.x = world->target_areas[0].center.x + cos(random_angle) * targets_distance;
     world->target_areas[1].center.y = world->target_areas[0].center.y + sin(random_angle) * targets_distance;
 #endif
-
-    unsigned int i, j, p = 0;
-
-    for (i=0; i<NUM_ACTUATORS; i++)
-    {
-        for (j=0; j<(NUM_SENSORS+NUM_HIDDEN); j++)
-            world->weights[i][j] = scale_param(params[p++], WEIGHTS_BOUNDARY_L, WEIGHTS_BOUNDARY_H);
-
-        world->bias[i] = scale_param(params[p++], BIAS_BOUNDARY_L, BIAS_BOUNDARY_H);
-    }
-
-    for (i=0; i<NUM_HIDDEN; i++)
-    {
-        for (j=0; j<NUM_SENSORS; j++)
-            world->weights_hidden[i][j] = scale_param(params[p++], WEIGHTS_BOUNDARY_L, WEIGHTS_BOUNDARY_H);
-
-        world->bias_hidden[i] = scale_param(params[p++], BIAS_BOUNDARY_L, BIAS_BOUNDARY_H);
-        world->timec_hidden[i] = scale_param(params[p++], TIMEC_BOUNDARY_L, TIMEC_BOUNDARY_H);
-    }
 }
 
 void init_robot(__global float *random,
@@ -422,10 +475,10 @@ void set_random_position(__global float *random,
     {
         float max_x = (world->arena_width / 2) - ROBOT_BODY_RADIUS;
         float max_y = (world->arena_height / 2) - ROBOT_BODY_RADIUS;
-        float ra = random[world->id*NUM_WORLDS+(world->random_offset++)] * 2 * M_PI;
+        float ra = random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * 2 * M_PI;
 
-        transforms[robot->id].pos.x = (random[world->id*NUM_WORLDS+(world->random_offset++)] * 2 * max_x) - max_x;
-        transforms[robot->id].pos.y = (random[world->id*NUM_WORLDS+(world->random_offset++)] * 2 * max_y) - max_y;
+        transforms[robot->id].pos.x = (random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * 2 * max_x) - max_x;
+        transforms[robot->id].pos.y = (random[world->id*RANDOM_PER_WORLD+(world->random_offset++)] * 2 * max_y) - max_y;
         transforms[robot->id].rot.sin = sin(ra);
         transforms[robot->id].rot.cos = cos(ra);
 
@@ -467,7 +520,7 @@ void set_random_position(__global float *random,
     }
 }
 
-void step_actuators(__global world_t *world, __local transform_t *transforms, __global robot_t *robot)
+void step_actuators(__global world_t *world, __local transform_t *transforms, __global robot_t *robot, float time_step)
 {
     robot->previous_transform.pos.x = transforms[robot->id].pos.x;
     robot->previous_transform.pos.y = transforms[robot->id].pos.y;
@@ -483,11 +536,11 @@ void step_actuators(__global world_t *world, __local transform_t *transforms, __
     int v1 = round(robot->actuators[OUT_wheels1] * (MOTOR_SAMPLE_COUNT - 1));
     int v2 = round(robot->actuators[OUT_wheels0] * (MOTOR_SAMPLE_COUNT - 1));
 
-    transforms[robot->id].pos.x += MOTOR_LINEAR_SPEED_SAMPLES[v1][v2] * transforms[robot->id].rot.cos * TIME_STEP;
-    transforms[robot->id].pos.y += MOTOR_LINEAR_SPEED_SAMPLES[v1][v2] * transforms[robot->id].rot.sin * TIME_STEP;
+    transforms[robot->id].pos.x += MOTOR_LINEAR_SPEED_SAMPLES[v1][v2] * transforms[robot->id].rot.cos * time_step;
+    transforms[robot->id].pos.y += MOTOR_LINEAR_SPEED_SAMPLES[v1][v2] * transforms[robot->id].rot.sin * time_step;
 
     float angle_robot = angle(transforms[robot->id].rot.sin, transforms[robot->id].rot.cos);
-    angle_robot += MOTOR_ANGULAR_SPEED_SAMPLES[v1][v2] * TIME_STEP;
+    angle_robot += MOTOR_ANGULAR_SPEED_SAMPLES[v1][v2] * time_step;
     transforms[robot->id].rot.sin = sin(angle_robot);
     transforms[robot->id].rot.cos = cos(angle_robot);
 }
@@ -672,7 +725,7 @@ void step_collisions(__global world_t *world, __local transform_t *transforms, _
     }
 }
 
-void step_controllers(__global world_t *world, __local transform_t *transforms, __global robot_t *robot)
+void step_controllers(__global const controller_t *controller, __global world_t *world, __local transform_t *transforms, __global robot_t *robot)
 {
     unsigned int s,h,a;
     float aux;
@@ -682,11 +735,11 @@ void step_controllers(__global world_t *world, __local transform_t *transforms,
         aux = 0;
 
         for (s=0; s<NUM_SENSORS; s++)
-            aux += world->weights_hidden[h][s] * robot->sensors[s];
+            aux += controller->weights_hidden[h][s] * robot->sensors[s];
 
-        aux += world->bias_hidden[h];
+        aux += controller->bias_hidden[h];
 
-        robot->hidden[h] = (world->timec_hidden[h] * robot->hidden[h]) + ((1 - world->timec_hidden[h]) * sigmoid(aux));
+        robot->hidden[h] = (controller->timec_hidden[h] * robot->hidden[h]) + ((1 - controller->timec_hidden[h]) * sigmoid(aux));
     }
 
     for (a=0; a<NUM_ACTUATORS; a++)
@@ -694,12 +747,12 @@ void step_controllers(__global world_t *world, __local transform_t *transforms,
         aux = 0;
 
         for (s=0; s<NUM_SENSORS; s++)
-            aux += world->weights[a][s] * robot->sensors[s];
+            aux += controller->weights[a][s] * robot->sensors[s];
 
         for (h=0; h<NUM_HIDDEN; h++)
-            aux += world->weights[a][NUM_SENSORS+h] * robot->hidden[h];
+            aux += controller->weights[a][NUM_SENSORS+h] * robot->hidden[h];
 
-        aux += world->bias[a];
+        aux += controller->bias[a];
 
         robot->actuators[a] = sigmoid(aux);
     }
@@ -0,0 +1,242 @@
+#ifndef __PSO_CL__
+#define __PSO_CL__
+
+// particle swarm kept in device memory, one work item per particle. positions,
+// velocities and personal bests are DIMS consecutive floats, the positions
+// buffer is the float parameter buffer of the simulate kernel.
+
+#include <rng.cl>
+
+__kernel void init_rng(unsigned int seed, __global ranluxcl_state_t *ranluxcltab)
+{
+    ranluxcl_initialization(seed, ranluxcltab);
+}
+
+__kernel void random_swarm(__global ranluxcl_state_t *ranluxcltab,
+                           __global float *position,
+                           __global float *velocity,
+                           __global float *pbest_fitness)
+{
+    rng_t rng;
+    unsigned int i;
+    unsigned int id = get_global_id(0);
+
+    ranluxcl_download_seed(&rng.state, ranluxcltab);
+    rng.available = 0;
+
+    for (i = 0; i < DIMS; i++)
+    {
+        position[id*DIMS+i] = MIN_POS + (MAX_POS - MIN_POS) * rng_next(&rng);
+        velocity[id*DIMS+i] = MIN_SPEED + (MAX_SPEED - MIN_SPEED) * rng_next(&rng);
+    }
+
+    pbest_fitness[id] = -INFINITY;
+
+    ranluxcl_upload_seed(&rng.state, ranluxcltab);
+}
+
+__kernel void clear_fitness(__global float *total)
+{
+    total[get_global_id(0)] = 0;
+}
+
+__kernel void accumulate_fitness(__global float *total, __global const float *fitness)
+{
+    total[get_global_id(0)] += fitness[get_global_id(0)];
+}
+
+__kernel void update_pbest(__global const float *total, float scale,
+                           __global const float *position,
+                           __global float *pbest_position,
+                           __global float *pbest_fitness)
+{
+    unsigned int i;
+    unsigned int id = get_global_id(0);
+    float f = total[id] * scale;
+
+    if (f > pbest_fitness[id])
+    {
+        pbest_fitness[id] = f;
+
+        for (i = 0; i < DIMS; i++)
+            pbest_position[id*DIMS+i] = position[id*DIMS+i];
+    }
+}
+
+// swarm reduction in two passes of REDUCE_SIZE work items per group (a
+// power of two): reduce_swarm() leaves the partial results of each group,
+// update_gbest() reduces them in a single group. Ties of the pbest fitness
+// go to the lowest particle index.
+
+int better(float f, unsigned int i, float g, unsigned int j)
+{
+    return (f > g) || ((f == g) && (i < j));
+}
+
+void reduce_local(unsigned int lid, __local float *sum, __local float *best,
+                  __local float *pbest, __local unsigned int *index)
+{
+    unsigned int s;
+
+    for (s = REDUCE_SIZE / 2; s > 0; s >>= 1)
+    {
+        if (lid < s)
+        {
+            sum[lid] += sum[lid+s];
+            best[lid] = max(best[lid], best[lid+s]);
+
+            if (better(pbest[lid+s], index[lid+s], pbest[lid], index[lid]))
+            {
+                pbest[lid] = pbest[lid+s];
+                index[lid] = index[lid+s];
+            }
+        }
+
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+}
+
+// every group reduces a strided share of the n particles: sum and best of
+// the fitness totals of the last evaluation, best pbest and its index
+__kernel void reduce_swarm(__global const float *total, unsigned int n,
+                           __global const float *pbest_fitness,
+                           __global float *group_sum,
+                           __global float *group_best,
+                           __global float *group_pbest,
+                           __global unsigned int *group_index)
+{
+    __local float sum[REDUCE_SIZE];
+    __local float best[REDUCE_SIZE];
+    __local float pbest[REDUCE_SIZE];
+    __local unsigned int index[REDUCE_SIZE];
+
+    unsigned int i;
+    unsigned int lid = get_local_id(0);
+
+    sum[lid] = 0;
+    best[lid] = -INFINITY;
+    pbest[lid] = -INFINITY;
+    index[lid] = UINT_MAX;
+
+    for (i = get_global_id(0); i < n; i += get_global_size(0))
+    {
+        sum[lid] += total[i];
+        best[lid] = max(best[lid], total[i]);
+
+        if (better(pbest_fitness[i], i, pbest[lid], index[lid]))
+        {
+            pbest[lid] = pbest_fitness[i];
+            index[lid] = i;
+        }
+    }
+
+    barrier(CLK_LOCAL_MEM_FENCE);
+    reduce_local(lid, sum, best, pbest, index);
+
+    if (lid == 0)
+    {
+        group_sum[get_group_id(0)] = sum[0];
+        group_best[get_group_id(0)] = best[0];
+        group_pbest[get_group_id(0)] = pbest[0];
+        group_index[get_group_id(0)] = index[0];
+    }
+}
+
+// single group: stats[0] = average fitness, stats[1] = best fitness,
+// stats[2] = gbest fitness (initially -INFINITY), stats[3] = 1 when the
+// gbest changed. The work items copy the new gbest position together.
+__kernel void update_gbest(__global const float *group_sum,
+                           __global const float *group_best,
+                           __global const float *group_pbest,
+                           __global const unsigned int *group_index,
+                           unsigned int num_groups, float scale, unsigned int n,
+                           __global const float *pbest_position,
+                           __global float *gbest_position,
+                           __global float *stats)
+{
+    __local float sum[REDUCE_SIZE];
+    __local float best[REDUCE_SIZE];
+    __local float pbest[REDUCE_SIZE];
+    __local unsigned int index[REDUCE_SIZE];
+    __local int changed;
+
+    unsigned int i;
+    unsigned int lid = get_local_id(0);
+
+    if (lid < num_groups)
+    {
+        sum[lid] = group_sum[lid];
+        best[lid] = group_best[lid];
+        pbest[lid] = group_pbest[lid];
+        index[lid] = group_index[lid];
+    }
+    else
+    {
+        sum[lid] = 0;
+        best[lid] = -INFINITY;
+        pbest[lid] = -INFINITY;
+        index[lid] = UINT_MAX;
+    }
+
+    barrier(CLK_LOCAL_MEM_FENCE);
+    reduce_local(lid, sum, best, pbest, index);
+
+    if (lid == 0)
+    {
+        stats[0] = (sum[0] / n) * scale;
+        stats[1] = best[0] * scale;
+        stats[3] = 0;
+        changed = 0;
+
+        if (pbest[0] > stats[2])
+        {
+            stats[2] = pbest[0];
+            stats[3] = 1;
+            changed = 1;
+        }
+    }
+
+    barrier(CLK_LOCAL_MEM_FENCE);
+
+    if (changed)
+    {
+        for (i = lid; i < DIMS; i += REDUCE_SIZE)
+            gbest_position[i] = pbest_position[index[0]*DIMS+i];
+    }
+}
+
+// same update as Swarm.update_pos_vel() on the host, random coefficients
+// per particle and dimension
+__kernel void update_swarm(__global ranluxcl_state_t *ranluxcltab,
+                           __global float *position,
+                           __global float *velocity,
+                           __global const float *pbest_position,
+                           __global const float *gbest_position,
+                           float inertia, float alfa, float beta)
+{
+    rng_t rng;
+    unsigned int i, k;
+    unsigned int id = get_global_id(0);
+    float p, v;
+
+    ranluxcl_download_seed(&rng.state, ranluxcltab);
+    rng.available = 0;
+
+    for (i = 0; i < DIMS; i++)
+    {
+        k = id*DIMS+i;
+        p = position[k];
+
+        v = inertia * velocity[k] +
+            alfa * rng_next(&rng) * (pbest_position[k] - p) +
+            beta * rng_next(&rng) * (gbest_position[i] - p);
+        v = clamp(v, MIN_SPEED, MAX_SPEED);
+
+        velocity[k] = v;
+        position[k] = clamp(p + v, MIN_POS, MAX_POS);
+    }
+
+    ranluxcl_upload_seed(&rng.state, ranluxcltab);
+}
+
+#endif
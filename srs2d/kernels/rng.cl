@@ -0,0 +1,38 @@
+#ifndef __RNG_CL__
+#define __RNG_CL__
+
+// uniform floats in [0,1) from a ranluxcl state, four at a time. kernels
+// download the state of their work item, draw and upload it back.
+
+#define RANLUXCL_LUX 2
+#include <ranluxcl.cl>
+
+typedef struct {
+    ranluxcl_state_t state;
+    float4 pool;
+    unsigned int available;
+} rng_t;
+
+float rng_next(rng_t *rng)
+{
+    if (rng->available == 0)
+    {
+        rng->pool = ranluxcl32(&rng->state);
+        rng->available = 4;
+    }
+
+    rng->available--;
+
+    if (rng->available == 3) return rng->pool.s0;
+    if (rng->available == 2) return rng->pool.s1;
+    if (rng->available == 1) return rng->pool.s2;
+    return rng->pool.s3;
+}
+
+unsigned int rng_next_uint(rng_t *rng, unsigned int max)
+{
+    unsigned int r = (unsigned int) (rng_next(rng) * max);
+    return (r < max) ? r : max - 1;
+}
+
+#endif
@@ -36,6 +36,14 @@ float sigmoid(float z)
     return 1 / (1 + exp(-z));
 }
 
+float load_param(__global float *params, __global uchar *raw_params, unsigned int i)
+{
+    if (raw_params != 0)
+        return raw_params[i] / 255.0f;
+
+    return params[i];
+}
+
 float scale_param(float p, float boundary_l, float boundary_h)
 {
     return p * (boundary_h - boundary_l) + boundary_l;
@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Multi-node archipelago over TCP.
+
+A Coordinator accepts nodes (one PGA per machine, see pga.py --coordinator),
+forwards the migrants of each node to the next connected node (a ring
+ordered by node id) and collects the progress of every node. Nodes may
+join at any time, leave with a BYE and reconnect after a network failure
+under the same node id. Connected nodes send a HEARTBEAT every few seconds,
+a node silent for longer than the coordinator's timeout, or whose socket
+closed, counts as gone until it reconnects.
+
+Every message is a 5 byte header (type: uint8, payload length: uint32,
+big endian) followed by the payload:
+
+    HELLO     node id (uint32, 0 for a new node) | node name
+    WELCOME   node id (uint32)
+    PROGRESS  generation (uint32) | avg fitness (float64) | best fitness (float64) | best genome
+    MIGRANTS  count (uint16) | genome size (uint16) | count * (fitness (float64) | genome)
+    BYE, STOP, HEARTBEAT (empty)
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import sys
+import time
+import struct
+import socket
+import logging
+import argparse
+import threading
+import collections
+import Queue
+import codec
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+MSG_HELLO = 1
+MSG_WELCOME = 2
+MSG_PROGRESS = 3
+MSG_MIGRANTS = 4
+MSG_BYE = 5
+MSG_STOP = 6
+MSG_HEARTBEAT = 7
+
+HEADER = struct.Struct('>BI')
+PROGRESS = struct.Struct('>Idd')
+MIGRANTS = struct.Struct('>HH')
+FITNESS = struct.Struct('>d')
+NODE_ID = struct.Struct('>I')
+
+def send_message(sock, msg_type, payload=''):
+    sock.sendall(HEADER.pack(msg_type, len(payload)) + payload)
+
+def recv_exactly(sock, size):
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError('Connection closed')
+        data += chunk
+    return data
+
+def recv_message(sock):
+    msg_type, length = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    return msg_type, recv_exactly(sock, length)
+
+def encode_progress(generation, avg_fitness, best_fitness, best_genome):
+    return PROGRESS.pack(generation, avg_fitness, best_fitness) + best_genome
+
+def decode_progress(payload):
+    generation, avg_fitness, best_fitness = PROGRESS.unpack(payload[:PROGRESS.size])
+    return generation, avg_fitness, best_fitness, payload[PROGRESS.size:]
+
+def encode_migrants(migrants):
+    """ migrants is a list of (genome, fitness), every genome of the same size. """
+    genome_size = len(migrants[0][0]) if migrants else 0
+    data = [ MIGRANTS.pack(len(migrants), genome_size) ]
+    for genome, fitness in migrants:
+        data.append(FITNESS.pack(fitness))
+        data.append(genome)
+    return ''.join(data)
+
+def decode_migrants(payload):
+    count, genome_size = MIGRANTS.unpack(payload[:MIGRANTS.size])
+    migrants = []
+    pos = MIGRANTS.size
+    for i in xrange(count):
+        fitness, = FITNESS.unpack(payload[pos:pos+FITNESS.size])
+        pos += FITNESS.size
+        migrants.append((payload[pos:pos+genome_size], fitness))
+        pos += genome_size
+    return migrants
+
+class Peer(object):
+    """
+    Coordinator side of a node connection. Messages are sent by a thread
+    of their own from a bounded queue, migrants are dropped when the node
+    does not keep up, so a slow node never stalls the others.
+    """
+
+    # seconds to wait for room in the queue for a message that is not droppable
+    SEND_TIMEOUT = 5.0
+
+    def __init__(self, node_id, name, sock, queue_size):
+        self.node_id = node_id
+        self.name = name
+        self.sock = sock
+        self.outgoing = Queue.Queue(queue_size)
+
+        self.generation = 0
+        self.avg_fitness = None
+        self.best_fitness = None
+        self.best_genome = None
+
+        t = threading.Thread(target=self.sender)
+        t.daemon = True
+        t.start()
+
+    def send(self, msg_type, payload='', droppable=False):
+        try:
+            if droppable:
+                self.outgoing.put_nowait((msg_type, payload))
+            else:
+                self.outgoing.put((msg_type, payload), timeout=self.SEND_TIMEOUT)
+        except Queue.Full:
+            __log__.debug('Dropping message for node %d', self.node_id)
+
+    def close(self):
+        try:
+            self.outgoing.put_nowait(None)
+        except Queue.Full:
+            # the sender is stuck on the socket or gone, closing it ends it
+            self.shutdown()
+
+    def shutdown(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+    def sender(self):
+        while True:
+            message = self.outgoing.get()
+
+            if message is None:
+                break
+
+            try:
+                send_message(self.sock, *message)
+            except (socket.error, EOFError):
+                break
+
+        self.shutdown()
+        self.sock.close()
+
+class Coordinator(object):
+    def __init__(self, host='', port=0, queue_size=16, timeout=30.0):
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(16)
+        self.address = self.server.getsockname()
+
+        self.lock = threading.Lock()
+        self.peers = {}         # connected nodes
+        self.known = {}         # every node that ever joined, by id
+        self.left = set()       # nodes that sent a BYE
+        self.lost = {}          # nodes that went away without one, time lost by id
+        self.next_id = 1
+
+        # (node_id, generation, avg_fitness, best_fitness, best_genome)
+        self.progress = Queue.Queue()
+
+        self.closed = False
+
+        t = threading.Thread(target=self.accept_loop)
+        t.daemon = True
+        t.start()
+
+    def connected(self):
+        with self.lock:
+            return sorted(self.peers.keys())
+
+    def active(self):
+        """ Connected nodes. """
+        with self.lock:
+            return self.peers.values()
+
+    def reconnecting(self):
+        """ True while a lost node may still reconnect (lost for less than the timeout). """
+        now = time.time()
+        with self.lock:
+            return any(now - t < self.timeout for t in self.lost.values())
+
+    def archipelago(self):
+        """
+        (generation, number of nodes, average fitness) of the connected
+        nodes: the generation every one of them reached and the average
+        over the ones that reported. None when no node is connected.
+        """
+        with self.lock:
+            active = self.peers.values()
+            if not active:
+                return None
+
+            generation = min(p.generation for p in active)
+            reported = [ p.avg_fitness for p in active if p.avg_fitness is not None ]
+
+        avg_fitness = sum(reported) / len(reported) if reported else None
+        return generation, len(active), avg_fitness
+
+    def best(self):
+        """ (fitness, genome, node id) of the best individual reported so far. """
+        with self.lock:
+            reported = [ (p.best_fitness, p.best_genome, p.node_id) for p in self.known.values() if p.best_genome is not None ]
+        return max(reported) if reported else None
+
+    def disconnect(self, node_id):
+        """ Drops the connection of a node, which may reconnect. """
+        with self.lock:
+            peer = self.peers.pop(node_id, None)
+            if peer is not None:
+                self.lost[node_id] = time.time()
+
+        if peer is not None:
+            peer.shutdown()
+
+    def stop(self):
+        """ Tells every node to stop and closes the server. """
+        self.closed = True
+
+        with self.lock:
+            peers = self.peers.values()
+            self.peers = {}
+
+        # never wait on a node that does not read, it is disconnected anyway
+        for peer in peers:
+            peer.send(MSG_STOP, droppable=True)
+            peer.close()
+
+        self.server.close()
+
+    def accept_loop(self):
+        while not self.closed:
+            try:
+                sock, address = self.server.accept()
+            except socket.error:
+                break
+
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            t = threading.Thread(target=self.serve, args=(sock, address))
+            t.daemon = True
+            t.start()
+
+    def serve(self, sock, address):
+        peer = None
+        sock.settimeout(self.timeout)
+
+        try:
+            msg_type, payload = recv_message(sock)
+            if msg_type != MSG_HELLO:
+                raise EOFError('Expected HELLO from %s:%d' % address)
+
+            node_id, = NODE_ID.unpack(payload[:NODE_ID.size])
+            name = payload[NODE_ID.size:]
+
+            with self.lock:
+                if node_id == 0 or node_id not in self.known:
+                    node_id = self.next_id
+                    self.next_id += 1
+                    __log__.info('Node %d (%s) joined from %s:%d', node_id, name, address[0], address[1])
+                else:
+                    __log__.info('Node %d (%s) reconnected from %s:%d', node_id, name, address[0], address[1])
+
+                peer = Peer(node_id, name, sock, self.queue_size)
+
+                previous = self.known.get(node_id)
+                if previous is not None:
+                    peer.generation = previous.generation
+                    peer.avg_fitness = previous.avg_fitness
+                    peer.best_fitness = previous.best_fitness
+                    peer.best_genome = previous.best_genome
+
+                self.known[node_id] = peer
+                self.peers[node_id] = peer
+                self.left.discard(node_id)
+                self.lost.pop(node_id, None)
+
+            peer.send(MSG_WELCOME, NODE_ID.pack(node_id))
+
+            while True:
+                msg_type, payload = recv_message(sock)
+
+                if msg_type == MSG_PROGRESS:
+                    generation, avg_fitness, best_fitness, best_genome = decode_progress(payload)
+
+                    with self.lock:
+                        peer.generation = generation
+                        peer.avg_fitness = avg_fitness
+                        if (peer.best_fitness is None) or (best_fitness > peer.best_fitness):
+                            peer.best_fitness = best_fitness
+                            peer.best_genome = best_genome
+
+                    self.progress.put((peer.node_id, generation, avg_fitness, best_fitness, best_genome))
+
+                elif msg_type == MSG_MIGRANTS:
+                    target = self.neighbour(peer.node_id)
+                    if target is not None:
+                        target.send(MSG_MIGRANTS, payload, droppable=True)
+
+                elif msg_type == MSG_BYE:
+                    __log__.info('Node %d left', peer.node_id)
+                    with self.lock:
+                        self.left.add(peer.node_id)
+                    break
+
+        except (socket.error, EOFError, struct.error):
+            # socket.timeout included, no heartbeat for too long
+            if peer is not None:
+                __log__.warning('Lost connection to node %d', peer.node_id)
+                with self.lock:
+                    if (self.peers.get(peer.node_id) is peer) and (peer.node_id not in self.left):
+                        self.lost[peer.node_id] = time.time()
+
+        if peer is not None:
+            with self.lock:
+                if self.peers.get(peer.node_id) is peer:
+                    del self.peers[peer.node_id]
+            peer.close()
+        else:
+            sock.close()
+
+    def neighbour(self, node_id):
+        """ Next connected node in the ring, None when alone. """
+        with self.lock:
+            ids = sorted(self.peers.keys())
+            if node_id not in ids or len(ids) < 2:
+                return None
+            return self.peers[ids[(ids.index(node_id) + 1) % len(ids)]]
+
+class Node(object):
+    """
+    Node side of the archipelago. The connection is kept by a background
+    thread, which reconnects (keeping the node id) whenever it is lost and
+    then sends the last progress again. Incoming migrants wait in a
+    bounded inbox, the oldest batches are dropped.
+    """
+
+    def __init__(self, host, port, name='', inbox_size=8, retry_interval=1.0, heartbeat_interval=5.0):
+        self.address = (host, port)
+        self.name = name
+        self.retry_interval = retry_interval
+        self.heartbeat_interval = heartbeat_interval
+
+        self.node_id = 0
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.inbox = collections.deque(maxlen=inbox_size)
+        self.last_progress = None
+
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.closed = False
+
+        t = threading.Thread(target=self.connection_loop)
+        t.daemon = True
+        t.start()
+
+        t = threading.Thread(target=self.heartbeat_loop)
+        t.daemon = True
+        t.start()
+
+    def wait_connected(self, timeout=None):
+        self.connected.wait(timeout)
+        return self.connected.is_set()
+
+    def report(self, generation, avg_fitness, best_fitness, best_genome):
+        self.last_progress = encode_progress(generation, avg_fitness, best_fitness, best_genome)
+        self.send(MSG_PROGRESS, self.last_progress)
+
+    def post_migrants(self, migrants):
+        """ Sends (genome, fitness) pairs to the next node, dropped while disconnected. """
+        if migrants:
+            self.send(MSG_MIGRANTS, encode_migrants(migrants))
+
+    def collect_migrants(self):
+        """ Every (genome, fitness) received since the last call. """
+        migrants = []
+        while True:
+            try:
+                migrants.extend(self.inbox.popleft())
+            except IndexError:
+                return migrants
+
+    def close(self):
+        """ Leaves the archipelago. """
+        self.closed = True
+        self.send(MSG_BYE)
+
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def send(self, msg_type, payload=''):
+        if not self.connected.is_set():
+            return False
+
+        try:
+            with self.send_lock:
+                send_message(self.sock, msg_type, payload)
+            return True
+        except (socket.error, AttributeError):
+            return False
+
+    def heartbeat_loop(self):
+        # a long generation must not look like a dead node to the coordinator
+        while not (self.closed or self.stopped.wait(self.heartbeat_interval)):
+            if not self.closed:
+                self.send(MSG_HEARTBEAT)
+
+    def connection_loop(self):
+        while not (self.closed or self.stopped.is_set()):
+            try:
+                sock = socket.create_connection(self.address)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+                send_message(sock, MSG_HELLO, NODE_ID.pack(self.node_id) + self.name)
+                msg_type, payload = recv_message(sock)
+                if msg_type != MSG_WELCOME:
+                    raise EOFError('Expected WELCOME')
+
+                self.node_id, = NODE_ID.unpack(payload)
+                self.sock = sock
+                self.connected.set()
+
+                if self.last_progress is not None:
+                    self.send(MSG_PROGRESS, self.last_progress)
+
+                while True:
+                    msg_type, payload = recv_message(sock)
+
+                    if msg_type == MSG_MIGRANTS:
+                        self.inbox.append(decode_migrants(payload))
+                    elif msg_type == MSG_STOP:
+                        self.stopped.set()
+                        break
+
+            except (socket.error, EOFError, struct.error):
+                pass
+
+            self.connected.clear()
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+            if not (self.closed or self.stopped.is_set()):
+                __log__.warning('Connection to coordinator %s:%d lost, retrying...', *self.address)
+                time.sleep(self.retry_interval)
+
+def main():
+    import report
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--verbosity",        help="increase output verbosity", action="count")
+    parser.add_argument("--host",                   help="address to listen on, default is all interfaces", type=str, default='')
+    parser.add_argument("--port",                   help="port to listen on, default is 5454", type=int, default=5454)
+    parser.add_argument("-g", "--num-generations",  help="stop once every node reached this generation, default is 500", type=int, default=500)
+    parser.add_argument("--min-nodes",              help="wait for this many nodes before the run starts, default is 1", type=int, default=1)
+    parser.add_argument("--timeout",                help="seconds without a heartbeat before a node counts as gone, default is 30", type=float, default=30.0)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    args = parser.parse_args()
+
+    if args.verbosity >= 1:
+        __log__.setLevel(logging.INFO)
+
+    coordinator = Coordinator(args.host, args.port, timeout=args.timeout)
+    __log__.info('Coordinator listening on %s:%d', *coordinator.address)
+
+    while len(coordinator.connected()) < args.min_nodes:
+        time.sleep(1)
+
+    exp = report.get_experiment(args.results_dir)
+    inst = exp.create_instance(1, {
+        'NUM_GENERATIONS': args.num_generations,
+        'DISTRIBUTED': 1
+    })
+    run = report.AsyncRun(inst.runs[0])
+    run.begin()
+
+    reported = 0
+
+    while True:
+        try:
+            coordinator.progress.get(timeout=1.0)
+        except Queue.Empty:
+            pass
+
+        # lost nodes are not waited for, they catch up when they reconnect
+        status = coordinator.archipelago()
+
+        if status is None:
+            if coordinator.reconnecting():
+                continue
+
+            __log__.warning('Every node left the archipelago')
+            break
+
+        archipelago_generation, nodes, avg_fitness = status
+
+        if archipelago_generation > reported:
+            reported = archipelago_generation
+            fitness, genome, best_node = coordinator.best()
+
+            run.progress(min(1.0, reported / float(args.num_generations)), {
+                'generation': reported,
+                'nodes': nodes,
+                'avg_fitness': avg_fitness,
+                'best_fitness': fitness,
+                'best_node': best_node,
+                'best_genome': codec.to_hex(genome)
+            })
+
+        if reported >= args.num_generations:
+            break
+
+    coordinator.stop()
+    run.done()
+
+if __name__=="__main__":
+    main()
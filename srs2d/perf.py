@@ -21,6 +21,7 @@ __date__ = "04 Jul 2013"
 import argparse
 import time
 import physics
+import codec
 import random
 import pyopencl as cl
 import numpy as np
@@ -41,25 +42,21 @@ class TestPerfSimulator(object):
         simulator = physics.Simulator(context, queue, num_worlds=args.num_worlds, num_robots=args.num_robots, ta=args.ta, tb=args.tb, random_targets=args.random_targets)
         print 'sizeof(world_t) = ', simulator.sizeof_world_t
         print 'work_group_size = ', simulator.work_group_size
-        print 'global_size = ', simulator.global_size
+        print 'global_size = ', simulator.global_size(args.num_worlds)
         print 'local_size = ', simulator.local_size
 
         if args.params is not None:
-            pos = args.params.decode('hex')
+            pos = codec.from_hex(args.params)
         else:
-            pos = ''
-            for i in xrange(physics.ANN_PARAMS_SIZE):
-                pos += chr(random.randint(0,255))
+            pos = codec.random_genome(physics.ANN_PARAMS_SIZE)
 
-        decoded = np.zeros(len(pos))
-        for i in xrange(len(pos)):
-            decoded[i] = float(ord(pos[i])) / 255
+        params = codec.to_matrix([ pos ] * args.num_worlds)
 
         times = []
 
         for i in xrange(args.num_trials):
             start = time.time()
-            simulator.simulate([ decoded for i in xrange(args.num_worlds) ], targets_distance=args.targets_distance, targets_angle=args.targets_angle)
+            simulator.simulate(params, targets_distance=args.targets_distance, targets_angle=args.targets_angle)
             end = time.time()
 
             times.append(end - start)
@@ -24,14 +24,22 @@ import argparse
 import random
 import logging
 import physics
+import codec
+import checkpoint
+import recorder
 import pyopencl as cl
-import solace
+import report
 import subprocess
-import tempfile
 import math
 import ga
+import evaluator
+import net
+import socket
+import traceback
+import multiprocessing
+import multiprocessing.sharedctypes
+import numpy as np
 import Queue
-import threading
 
 logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
 __log__ = logging.getLogger(__name__)
@@ -62,6 +70,15 @@ def main():
     parser.add_argument("-e", "--elite-size",       help="size of population elite, default is 24", type=int, default=24)
     parser.add_argument("--migration-rate",         help="proportion of individual of a population that migrate, default is 0.1", type=float, default=0.1)
     parser.add_argument("--migration-freq",         help="frequency of migration (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--topology",               help="migration topology (ring, torus or full), default is ring", type=str, default='ring')
+    parser.add_argument("--mailbox-size",           help="migrant batches kept in each mailbox, older ones are dropped, default is 4", type=int, default=4)
+    parser.add_argument("--balance-after",          help="resize island populations after N generations so that every device takes the same time per generation (0 disables), default is 3", metavar="N", type=int, default=3)
+    parser.add_argument("--checkpoint",             help="save the state of each run to FILE.runNN periodically", metavar="FILE", type=str)
+    parser.add_argument("--checkpoint-freq",        help="frequency of checkpoints (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--resume",                 help="resume runs from their checkpoints (requires --checkpoint)", action="store_true")
+    parser.add_argument("--lazy-recording",         help="do not record new bests, write an index to FILE.runNN to replay them later", metavar="FILE", type=str)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    parser.add_argument("--coordinator",            help="join the archipelago of the coordinator at HOST:PORT (see net.py), which reports the results", metavar="HOST:PORT", type=str)
     args = parser.parse_args()
 
     if args.verbosity >= 2:
@@ -78,18 +95,28 @@ def main():
         __log__.error('Offspring must be an even number!')
         sys.exit(1)
 
-    uri = os.environ.get('SOLACE_URI')
-    username = os.environ.get('SOLACE_USERNAME')
-    password = os.environ.get('SOLACE_PASSWORD')
+    if args.topology not in ('ring', 'torus', 'full'):
+        __log__.error('Topology must be ring, torus or full!')
+        sys.exit(1)
+
+    if args.resume and (args.checkpoint is None):
+        __log__.error('--resume requires --checkpoint!')
+        sys.exit(1)
+
+    coordinator = None
+    if args.coordinator:
+        try:
+            host, port = args.coordinator.rsplit(':', 1)
+            coordinator = (host, int(port))
+        except ValueError:
+            __log__.error('Coordinator must be given as HOST:PORT!')
+            sys.exit(1)
 
     try:
         git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
     except:
         git_version = None
 
-    if (uri is None) or (username is None) or (password is None):
-        raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set!')
-
     device_type = cl.device_type.ALL
     if args.device_type == 'cpu':
         device_type = cl.device_type.CPU
@@ -98,9 +125,21 @@ def main():
 
     platform = cl.get_platforms()[0]
     devices = platform.get_devices(device_type=device_type)
+
+    # fork the device processes before this one creates its own context
+    pga = PGA(args, len(devices))
+
     context = cl.Context(devices=devices)
 
-    exp = solace.get_experiment(uri, username, password)
+    if coordinator:
+        # the coordinator owns the (single) run of the archipelago
+        node = net.Node(coordinator[0], coordinator[1], name=socket.gethostname())
+        run_pga(pga, args, context, None, 1, node)
+        node.close()
+        pga.close()
+        return
+
+    exp = report.get_experiment(args.results_dir)
     inst = exp.create_instance(args.num_runs, {
         'PCROSSOVER': args.pcrossover,
         'PMUTATION': args.pmutation,
@@ -121,110 +160,690 @@ def main():
         'SYMETRICAL_TARGETS': 1 if args.symetrical_targets else 0
     }, code_version=git_version)
 
-    for run in inst.runs:
-        PGA(context, args).execute(run)
+    for i, run in enumerate(inst.runs):
+        run_pga(pga, args, context, report.AsyncRun(run), i+1)
+
+    pga.close()
+
+def run_pga(pga, args, context, run, run_index, node=None):
+    checkpointer = None
+    if args.checkpoint:
+        filename = checkpoint.run_filename(args.checkpoint, run_index)
+        if (not args.resume) and os.path.exists(filename):
+            os.remove(filename)
+        checkpointer = checkpoint.Checkpointer(filename, args.checkpoint_freq)
+
+    best_recorder = None
+    if run:
+        best_recorder = recorder.create(context, args, run_index)
+
+    pga.reset()
+    pga.execute(run, checkpointer, best_recorder, node)
+
+    if checkpointer:
+        checkpointer.close()
+
+def balance(sizes, step_times, minimum):
+    """
+    New population sizes proportional to the throughput (individuals per
+    second) of each island, keeping the total population.
+    """
+    total = sum(sizes)
+    throughput = [ size / max(t, 1e-6) for size, t in zip(sizes, step_times) ]
+
+    exact = [ total * t / sum(throughput) for t in throughput ]
+    new_sizes = [ max(minimum, int(math.floor(e))) for e in exact ]
+
+    # largest remainders get the missing individuals, the largest islands
+    # give back what the minimum size added
+    order = sorted(xrange(len(sizes)), key=lambda i: exact[i] - math.floor(exact[i]), reverse=True)
+    i = 0
+    while sum(new_sizes) < total:
+        new_sizes[order[i % len(order)]] += 1
+        i += 1
+
+    while sum(new_sizes) > total:
+        largest = max(xrange(len(new_sizes)), key=lambda i: new_sizes[i])
+        new_sizes[largest] -= 1
+
+    return new_sizes
+
+def neighbours(topology, n):
+    """ Islands receiving the emigrants of each island. """
+    if n == 1:
+        return [ [] ]
+
+    if topology == 'ring':
+        return [ [ (i+1) % n ] for i in xrange(n) ]
+
+    if topology == 'full':
+        return [ [ j for j in xrange(n) if j != i ] for i in xrange(n) ]
+
+    if topology == 'torus':
+        # most square grid with rows*cols == n, the (up to) four neighbours
+        # of each island wrap around the edges
+        rows = int(math.sqrt(n))
+        while (n % rows) != 0:
+            rows -= 1
+        cols = n / rows
+
+        result = []
+        for i in xrange(n):
+            r, c = i / cols, i % cols
+            targets = set([ r * cols + (c+1) % cols, r * cols + (c-1) % cols,
+                            ((r+1) % rows) * cols + c, ((r-1) % rows) * cols + c ])
+            targets.discard(i)
+            result.append(sorted(targets))
+        return result
+
+    raise Exception('Unknown topology %s!' % topology)
+
+class Mailbox(object):
+    """
+    Bounded mailbox of migrant batches in shared memory, written by one
+    island and read by another. When it is full the oldest batch is
+    overwritten, so posting never blocks.
+    """
+
+    def __init__(self, capacity, num_migrants, genome_size):
+        self.capacity = capacity
+        self.num_migrants = num_migrants
+        self.genome_size = genome_size
+
+        self.genomes = multiprocessing.sharedctypes.RawArray('B', capacity * num_migrants * genome_size)
+        self.fitness = multiprocessing.sharedctypes.RawArray('d', capacity * num_migrants)
+        self.head = multiprocessing.sharedctypes.RawValue('L', 0)
+        self.tail = multiprocessing.sharedctypes.RawValue('L', 0)
+        self.lock = multiprocessing.Lock()
+
+    def post(self, individuals):
+        genomes = np.frombuffer(self.genomes, dtype=np.uint8).reshape(self.capacity, self.num_migrants, self.genome_size)
+        fitness = np.frombuffer(self.fitness, dtype=np.float64).reshape(self.capacity, self.num_migrants)
+
+        with self.lock:
+            if self.tail.value - self.head.value == self.capacity:
+                self.head.value += 1
+
+            slot = self.tail.value % self.capacity
+            genomes[slot] = codec.to_matrix([ ind.genome for ind in individuals ])
+            fitness[slot] = [ ind.fitness for ind in individuals ]
+            self.tail.value += 1
+
+    def collect(self):
+        genomes = np.frombuffer(self.genomes, dtype=np.uint8).reshape(self.capacity, self.num_migrants, self.genome_size)
+        fitness = np.frombuffer(self.fitness, dtype=np.float64).reshape(self.capacity, self.num_migrants)
+
+        individuals = []
+        with self.lock:
+            while self.head.value != self.tail.value:
+                slot = self.head.value % self.capacity
+                for genome, f in zip(genomes[slot], fitness[slot]):
+                    ind = ga.Individual(self.genome_size)
+                    ind.genome = genome.tostring()
+                    ind.fitness = float(f)
+                    individuals.append(ind)
+                self.head.value += 1
+
+        return individuals
+
+class DeviceEvaluator(object):
+    """
+    Fused evaluation of the islands of a device, in shared memory. Each
+    island process has a slot (genomes in, fitness out) and the evaluator
+    process of the device, once every island that joined has submitted,
+    simulates all of them in a single batch and writes the fitness back.
+    Islands stay separate processes, only the kernel launch is shared.
+    """
+
+    IDLE, SUBMITTED, DONE, FAILED = range(4)
+
+    def __init__(self, num_slots, capacity, genome_size):
+        self.capacity = capacity
+        self.genome_size = genome_size
+
+        self.genomes = [ multiprocessing.sharedctypes.RawArray('B', capacity * genome_size) for i in xrange(num_slots) ]
+        self.fitness = [ multiprocessing.sharedctypes.RawArray('d', capacity) for i in xrange(num_slots) ]
+        self.counts = multiprocessing.sharedctypes.RawArray('L', num_slots)
+        self.state = multiprocessing.sharedctypes.RawArray('b', num_slots)
+        self.active = multiprocessing.sharedctypes.RawValue('l', 0)
+        self.stopping = multiprocessing.sharedctypes.RawValue('b', 0)
+        self.cond = multiprocessing.Condition()
+
+    def slot(self, index):
+        return EvaluatorSlot(self, index)
+
+    def stop(self):
+        with self.cond:
+            self.stopping.value = 1
+            self.cond.notify_all()
+
+    def serve(self, evaluate):
+        """ Loop of the evaluator process, evaluate(params) gives the fitness of a genome matrix. """
+        while True:
+            with self.cond:
+                while True:
+                    if self.stopping.value:
+                        return
+
+                    submitted = [ i for i in xrange(len(self.state)) if self.state[i] == self.SUBMITTED ]
+                    if submitted and len(submitted) >= self.active.value:
+                        break
+
+                    self.cond.wait()
+
+            # the submitting islands wait, nothing else touches their slots
+            sizes = [ self.counts[i] for i in submitted ]
+            params = np.vstack([ np.frombuffer(self.genomes[i], dtype=np.uint8)[:n * self.genome_size].reshape(n, self.genome_size)
+                                 for i, n in zip(submitted, sizes) ])
+
+            try:
+                fitness = evaluate(params)
+                status = self.DONE
+
+                offset = 0
+                for i, n in zip(submitted, sizes):
+                    np.frombuffer(self.fitness[i], dtype=np.float64)[:n] = fitness[offset:offset+n]
+                    offset += n
+
+            except Exception:
+                __log__.exception('Fused evaluation failed')
+                status = self.FAILED
+
+            with self.cond:
+                for i in submitted:
+                    self.state[i] = status
+                self.cond.notify_all()
+
+class EvaluatorSlot(object):
+    """ Island side of a DeviceEvaluator, used as the engine's fused evaluator. """
+
+    def __init__(self, device_evaluator, index):
+        self.device_evaluator = device_evaluator
+        self.index = index
+
+    def join(self):
+        shared = self.device_evaluator
+        with shared.cond:
+            shared.active.value += 1
+            shared.cond.notify_all()
+
+    def leave(self):
+        shared = self.device_evaluator
+        with shared.cond:
+            shared.active.value -= 1
+            shared.cond.notify_all()
+
+    def evaluate(self, params):
+        """ Fitness of each row of params (a genome matrix, see codec.to_matrix). """
+        shared = self.device_evaluator
+        n = len(params)
+
+        if n > shared.capacity:
+            raise Exception('Population of %d individuals does not fit in the evaluator (%d)!' % (n, shared.capacity))
+
+        np.frombuffer(shared.genomes[self.index], dtype=np.uint8)[:n * shared.genome_size] = np.ascontiguousarray(params, dtype=np.uint8).ravel()
+        shared.counts[self.index] = n
+
+        with shared.cond:
+            shared.state[self.index] = shared.SUBMITTED
+            shared.cond.notify_all()
+
+            while shared.state[self.index] == shared.SUBMITTED:
+                shared.cond.wait()
+
+            status = shared.state[self.index]
+            shared.state[self.index] = shared.IDLE
+
+        if status == shared.FAILED:
+            raise Exception('Evaluation failed on the device of island %d' % self.index)
+
+        return np.frombuffer(shared.fitness[self.index], dtype=np.float64)[:n].copy()
+
+class IslandWorker(object):
+    """
+    Body of an island process: owns a GA whose populations are evaluated by
+    the evaluator process of its device (see DeviceEvaluator). Commands come
+    from PGA through conn; while evolving, the island only looks at them
+    between generations and reports every generation on the shared results
+    queue.
+    """
+
+    def __init__(self, conn, results, index, evaluator_slot, args, inboxes, outboxes):
+        self.conn = conn
+        self.results = results
+        self.index = index
+        self.evaluator = evaluator_slot
+        self.engine = evaluator.Engine(None, None, args, evaluator_slot)
+        self.args = args
+        self.inboxes = inboxes
+        self.outboxes = outboxes
+
+        self.num_migrants = int(args.population_size * args.migration_rate)
+
+        self.island = None
+        self.generation = 0
+
+    def main(self):
+        while True:
+            command, params = self.conn.recv()
+
+            if command == 'stop':
+                self.conn.send(('ok', None))
+                return
+
+            if command == 'evolve':
+                try:
+                    self.evolve()
+                    self.results.put(('done', self.index))
+                except Exception:
+                    self.results.put(('error', self.index, traceback.format_exc()))
+                finally:
+                    self.evaluator.leave()
+            else:
+                self.handle(command, params)
+
+    def handle(self, command, params):
+        try:
+            result = None
+
+            if command == 'reset':
+                # forked device processes share the parent's generators, give each one its own
+                random.seed(params[0])
+                np.random.seed(params[0])
+                self.island = ga.GA(self.args)
+                self.generation = 0
+
+                # every island of the device takes part in the next evaluations
+                self.evaluator.join()
 
-class PGA:
-    def __init__(self, context, args):
-        self.context = context
+                # migrants left over from the previous run
+                for inbox in self.inboxes:
+                    inbox.collect()
+
+            elif command == 'resize':
+                self.island.resize(params[0])
+
+            elif command == 'halt':
+                self.generation = max(self.generation, self.args.num_generations)
+
+            elif command == 'get_state':
+                header, arrays = self.island.get_state()
+                rng_header, rng_arrays = checkpoint.get_rng_state()
+                for k, v in rng_header.iteritems():
+                    header['rng_' + k] = v
+                for k, v in rng_arrays.iteritems():
+                    arrays['rng_' + k] = v
+                result = (header, arrays)
+
+            elif command == 'set_state':
+                header, arrays, generation = params
+                self.island.set_state(header, arrays)
+                checkpoint.set_rng_state(dict((k[4:], v) for k, v in header.iteritems() if k.startswith('rng_')),
+                                         dict((k[4:], v) for k, v in arrays.iteritems() if k.startswith('rng_')))
+                self.generation = generation
+
+            self.conn.send(('ok', result))
+
+        except Exception:
+            self.conn.send(('error', traceback.format_exc()))
+
+    def evolve(self):
+        while self.generation < self.args.num_generations:
+            while self.conn.poll():
+                self.handle(*self.conn.recv())
+
+            if self.generation >= self.args.num_generations:
+                break
+
+            immigrants = []
+            for inbox in self.inboxes:
+                immigrants.extend(inbox.collect())
+
+            self.generation += 1
+
+            num_emigrants = 0
+            if self.outboxes and self.num_migrants > 0 and (self.generation % self.args.migration_freq) == 0:
+                num_emigrants = self.num_migrants
+
+            emigrants = self.island.step(self.engine, immigrants, num_emigrants)
+
+            if emigrants:
+                for outbox in self.outboxes:
+                    outbox.post(emigrants)
+
+            self.results.put(('generation', self.index, self.generation,
+                              self.island.avg_fitness, self.island.best.fitness, self.island.best.genome,
+                              len(self.island.population), self.island.avg_step_time))
+
+def island_main(conn, results, index, evaluator_slot, args, inboxes, outboxes):
+    IslandWorker(conn, results, index, evaluator_slot, args, inboxes, outboxes).main()
+
+def device_main(device_index, args, device_evaluator):
+    """
+    Body of the evaluator process of a device: one context, command queue
+    and simulator, serving the islands of the device.
+    """
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
+
+    platform = cl.get_platforms()[0]
+    device = platform.get_devices(device_type=device_type)[device_index]
+    context = cl.Context(devices=[device])
+    queue = cl.CommandQueue(context)
+
+    simulator = physics.Simulator(context, queue,
+                                  num_worlds=device_evaluator.capacity,
+                                  num_robots=args.num_robots,
+                                  ta=args.ta, tb=args.tb,
+                                  random_targets=args.random_targets,
+                                  symetrical_targets=args.symetrical_targets)
+
+    device_evaluator.serve(lambda params: evaluator.evaluate_genomes(simulator, params,
+                                                                     args.targets_distances, args.targets_angles, args.trials))
+
+class Island(object):
+    """ Handle of an island running in a process of its own. """
+
+    def __init__(self, index):
+        self.index = index
+        self.conn, self.child_conn = multiprocessing.Pipe()
+
+    def send(self, command, *params):
+        self.conn.send((command, params))
+
+    def recv(self):
+        status, result = self.conn.recv()
+
+        if status == 'error':
+            raise Exception('Island %d failed:\n%s' % (self.index, result))
+
+        return result
+
+    def call(self, command, *params):
+        self.send(command, *params)
+        return self.recv()
+
+class PGA(object):
+    """
+    Asynchronous island model GA. Every island is a separate process, so
+    breeding runs in parallel, and every device has an evaluator process
+    with its own queue. The islands of a device are evaluated together in a
+    single simulation batch (see DeviceEvaluator), islands on different
+    devices evolve at their own pace: there is no barrier between them. Every --migration-freq generations an
+    island posts copies of its best individuals to a bounded shared memory
+    mailbox for each neighbour in the topology (ring, torus or full), and
+    the migrants it finds in its own mailboxes replace its worst individuals
+    before breeding, so population sizes never change.
+
+    The main process only gathers the statistics of each generation once
+    every island has reported it, to report progress, record bests and
+    take checkpoints.
+
+    The island and device processes are forked when the PGA is created, before
+    the caller creates any OpenCL context, and are reused by every run (see
+    reset()).
+
+    After --balance-after generations the island populations are resized in
+    proportion to their measured throughput, so that islands on slow devices
+    (usually the CPU) do not fall behind.
+
+    With --coordinator the archipelago is one node of a larger one (see
+    net.py): island 0 also emigrates to a gateway mailbox, whose migrants
+    the main process sends to the coordinator, and the migrants received
+    from other nodes are posted to a gateway mailbox of island 0.
+    """
+
+    def __init__(self, args, num_devices):
         self.args = args
 
-        self.archipelago = []
-        for device in self.context.devices:
-            for i in xrange(args.islands_per_device):
-                queue = cl.CommandQueue(context, device)
-                self.archipelago.append(ga.GA(self.context, queue, args))
+        num_islands = num_devices * args.islands_per_device
+        num_migrants = int(args.population_size * args.migration_rate)
+
+        # smallest island that still has an elite, a couple and its emigrants
+        self.min_island_size = max(args.elite_size + args.offspring, num_migrants, 2)
 
-        self.worker_queue = Queue.Queue()
+        self.results = multiprocessing.Queue()
 
-        for i in xrange(len(self.archipelago)):
-             t = threading.Thread(target=self.worker)
-             t.daemon = True
-             t.start()
+        inboxes = [ [] for i in xrange(num_islands) ]
+        outboxes = [ [] for i in xrange(num_islands) ]
+        if num_migrants > 0:
+            for i, targets in enumerate(neighbours(args.topology, num_islands)):
+                for j in targets:
+                    mailbox = Mailbox(args.mailbox_size, num_migrants, physics.ANN_PARAMS_SIZE)
+                    outboxes[i].append(mailbox)
+                    inboxes[j].append(mailbox)
 
-    def execute(self, run):
+        self.gateway_in = None
+        self.gateway_out = None
+        if args.coordinator and num_migrants > 0:
+            self.gateway_in = Mailbox(args.mailbox_size, num_migrants, physics.ANN_PARAMS_SIZE)
+            self.gateway_out = Mailbox(args.mailbox_size, num_migrants, physics.ANN_PARAMS_SIZE)
+            inboxes[0].append(self.gateway_in)
+            outboxes[0].append(self.gateway_out)
+
+        # an island never grows beyond the whole archipelago (see balance())
+        capacity = num_islands * args.population_size
+
+        self.archipelago = []
+        self.device_evaluators = []
+        self.processes = []
+        for device_index in xrange(num_devices):
+            device_evaluator = DeviceEvaluator(args.islands_per_device, capacity, physics.ANN_PARAMS_SIZE)
+            self.device_evaluators.append(device_evaluator)
+
+            process = multiprocessing.Process(target=device_main, args=(device_index, args, device_evaluator))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+
+            for i in xrange(args.islands_per_device):
+                island = Island(len(self.archipelago))
+                self.archipelago.append(island)
+
+                process = multiprocessing.Process(target=island_main, args=(island.child_conn, self.results, island.index,
+                                                                            device_evaluator.slot(i), args,
+                                                                            inboxes[island.index], outboxes[island.index]))
+                process.daemon = True
+                process.start()
+                self.processes.append(process)
+
+    def reset(self):
+        """ New random populations for every island. """
+        for island in self.archipelago:
+            island.send('reset', random.randint(0, 2**31-1))
+        for island in self.archipelago:
+            island.recv()
+
+        self.sizes = [ self.args.population_size ] * len(self.archipelago)
+
+    def close(self):
+        for island in self.archipelago:
+            island.call('stop')
+        for device_evaluator in self.device_evaluators:
+            device_evaluator.stop()
+        for process in self.processes:
+            process.join()
+
+    def execute(self, run, checkpointer=None, best_recorder=None, node=None):
         __log__.info(' Parallel GA Starting (archipelago size = %d)...' % len(self.archipelago))
 
         if run:
             run.begin()
 
-        last_best_fitness = None
-        generation = 1
-        while (generation <= self.args.num_generations):
-            __log__.info('[gen=%d] Evaluating archipelago...', generation)
-
-            # evaluate every island
-            for island in self.archipelago:
-                self.worker_queue.put(island)
-            self.worker_queue.join()
+        self.last_best_fitness = None
+        generation = 0
 
-            # find avg and best fitness
-            self.avg_fitness = 0
-            self.best = None
-            for island in self.archipelago:
-                self.avg_fitness += island.avg_fitness
+        state = checkpointer.load() if checkpointer else None
+        if state is not None:
+            self.set_state(*state)
+            self.last_best_fitness = state[0]['last_best_fitness']
+            generation = state[0]['generation']
 
-                if (self.best is None) or (island.best.fitness > self.best.fitness):
-                    self.best = island.best
+        for island in self.archipelago:
+            island.send('evolve')
 
-            self.avg_fitness /= len(self.archipelago)
+        # statistics of the generations not yet reported by every island
+        pending = [ {} for island in self.archipelago ]
+        finished = 0
+        halted = False
 
-            # migration
-            if (generation % self.args.migration_freq) == 0:
-                for i in xrange(len(self.archipelago)):
-                    cur = self.archipelago[i]
-                    next = self.archipelago[(i+1) % len(self.archipelago)]
+        while finished < len(self.archipelago):
+            if node is None:
+                record = self.results.get()
+            else:
+                if node.stopped.is_set() and not halted:
+                    __log__.info('Stopped by the coordinator')
+                    for island in self.archipelago:
+                        island.send('halt')
 
-                    for n in xrange(int(self.args.population_size * self.args.migration_rate)):
-                        next.population.append(cur.population.pop())
+                    # the answers are read right away, later calls (resize,
+                    # get_state) would take them for their own
+                    for island in self.archipelago:
+                        island.recv()
+                    halted = True
 
-            # save partial results
+                self.exchange(node)
 
-            __log__.info('[gen=%d] Archipelago evaluated, avg_fitness = %.5f, best fitness = %.5f', generation, self.avg_fitness, self.best.fitness)
+                try:
+                    record = self.results.get(timeout=0.1)
+                except Queue.Empty:
+                    continue
 
-            if run:
-                run.progress(generation / float(self.args.num_generations), {
-                    'generation': generation,
-                    'avg_fitness': self.avg_fitness,
-                    'best_fitness': self.best.fitness,
-                    'best_genome': self.best.genome_hex
-                })
+            if record[0] == 'error':
+                raise Exception('Island %d failed:\n%s' % (record[1], record[2]))
 
-            if (last_best_fitness is None) or (self.best.fitness > last_best_fitness):
-                last_best_fitness = self.best.fitness
+            if record[0] == 'done':
+                finished += 1
+                continue
 
-                if run and (not self.args.no_save):
-                    __log__.info('[gen=%d] Saving simulation for the new found best...', generation)
-                    _, filename = tempfile.mkstemp(prefix='sim_', suffix='.srs')
+            index, island_generation = record[1], record[2]
+            pending[index][island_generation] = record[3:]
 
-                    fitness = self.archipelago[1].simulator.simulate_and_save(
-                        filename,
-                        [ self.best.genome_decoded for i in xrange(self.args.population_size) ],
-                        targets_distance=self.args.targets_distances[ random.randint(0, len(self.args.targets_distances)-1) ],
-                        targets_angle=self.args.targets_angles[ random.randint(0, len(self.args.targets_angles)-1) ]
-                    )
+            while all((generation+1) in p for p in pending):
+                generation += 1
+                self.generation_finished(run, checkpointer, best_recorder, generation,
+                                         [ p.pop(generation) for p in pending ])
 
-                    run.upload(filename, 'run-%02d-new-best-gen-%04d-fit-%.4f.srs' % (run.id, generation, fitness[0]) )
-                    os.remove(filename)
+                if node is not None:
+                    node.report(generation, self.avg_fitness, self.best.fitness, self.best.genome)
 
-            generation += 1
+        if best_recorder:
+            best_recorder.close()
 
         if run:
             run.done()
 
-    def worker(self):
-        while True:
-            island = self.worker_queue.get()
-            island.step()
+    def exchange(self, node):
+        """ Moves migrants between the gateway mailboxes and the other nodes. """
+        if self.gateway_out is None:
+            return
 
-            if island.queue.device.type == cl.device_type.GPU:
-                __log__.debug('GPU island step finished (avg_step_time: %.2f seconds)', island.avg_step_time)
-            elif island.queue.device.type == cl.device_type.CPU:
-                __log__.debug('CPU island step finished (avg_step_time: %.2f seconds)', island.avg_step_time)
-            else:
-                __log__.debug('Unknown device island step finished (avg_step_time: %.2f seconds)', island.avg_step_time)
+        node.post_migrants([ (ind.genome, ind.fitness) for ind in self.gateway_out.collect() ])
+
+        # other nodes may use another migration rate, post whole batches only
+        batch = []
+        for genome, fitness in node.collect_migrants():
+            if len(genome) != physics.ANN_PARAMS_SIZE:
+                continue
+
+            ind = ga.Individual(len(genome))
+            ind.genome = genome
+            ind.fitness = fitness
+            batch.append(ind)
+
+            if len(batch) == self.gateway_in.num_migrants:
+                self.gateway_in.post(batch)
+                batch = []
+
+    def generation_finished(self, run, checkpointer, best_recorder, generation, stats):
+        self.avg_fitness = 0
+        self.best = None
+        step_times = []
+        total_size = 0
+
+        for index, (avg_fitness, best_fitness, best_genome, size, avg_step_time) in enumerate(stats):
+            __log__.debug('Island %d generation %d (avg_step_time: %.2f seconds)', index, generation, avg_step_time)
 
-            self.worker_queue.task_done()
+            self.avg_fitness += avg_fitness * size
+            total_size += size
+            step_times.append(avg_step_time)
+
+            if (self.best is None) or (best_fitness > self.best.fitness):
+                self.best = ga.Individual(len(best_genome))
+                self.best.genome = best_genome
+                self.best.fitness = best_fitness
+
+        self.avg_fitness /= total_size
+
+        if generation == self.args.balance_after and len(self.archipelago) > 1:
+            self.sizes = balance(self.sizes, step_times, self.min_island_size)
+            __log__.info('[gen=%d] Island population sizes: %s', generation, self.sizes)
+
+            for island in self.archipelago:
+                island.call('resize', self.sizes[island.index])
+
+        __log__.info('[gen=%d] Archipelago evaluated, avg_fitness = %.5f, best fitness = %.5f', generation, self.avg_fitness, self.best.fitness)
+
+        if run:
+            run.progress(generation / float(self.args.num_generations), {
+                'generation': generation,
+                'avg_fitness': self.avg_fitness,
+                'best_fitness': self.best.fitness,
+                'best_genome': self.best.genome_hex
+            })
+
+        if (self.last_best_fitness is None) or (self.best.fitness > self.last_best_fitness):
+            self.last_best_fitness = self.best.fitness
+
+            if run and best_recorder:
+                __log__.info('[gen=%d] Recording the new found best...', generation)
+                best_recorder.record(run, generation, self.best.genome,
+                                     'run-%02d-new-best-gen-%04d-fit-%%.4f.srs' % (run.id, generation),
+                                     targets_distance=self.args.targets_distances[ random.randint(0, len(self.args.targets_distances)-1) ],
+                                     targets_angle=self.args.targets_angles[ random.randint(0, len(self.args.targets_angles)-1) ],
+                                     fitness=self.best.fitness)
+
+        if checkpointer and checkpointer.due(generation, self.args.num_generations):
+            # islands answer between two of their own generations, faster
+            # ones may already be a few generations ahead
+            header, arrays = self.get_state()
+            header['last_best_fitness'] = self.last_best_fitness
+            checkpointer.save(generation, header, arrays)
+
+    def get_state(self):
+        header = {
+            'avg_fitness': float(self.avg_fitness),
+            'best_fitness': float(self.best.fitness),
+            'islands': []
+        }
+        arrays = { 'best': codec.to_array(self.best.genome) }
+
+        for i, island in enumerate(self.archipelago):
+            island_header, island_arrays = island.call('get_state')
+            header['islands'].append(island_header)
+
+            for k, v in island_arrays.iteritems():
+                arrays['island%02d_%s' % (i, k)] = v
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        if len(header['islands']) != len(self.archipelago):
+            raise Exception('Checkpoint has %d islands, archipelago has %d!' % (len(header['islands']), len(self.archipelago)))
+
+        for i, island in enumerate(self.archipelago):
+            prefix = 'island%02d_' % i
+            island_arrays = dict((k[len(prefix):], v) for k, v in arrays.iteritems() if k.startswith(prefix))
+            island.call('set_state', header['islands'][i], island_arrays, header['generation'])
+            self.sizes[i] = len(island_arrays['population'])
+
+        self.best = ga.Individual(len(arrays['best']))
+        self.best.genome = arrays['best'].tostring()
+        self.best.fitness = header['best_fitness']
+        self.avg_fitness = header['avg_fitness']
 
 if __name__=="__main__":
     main()
@@ -36,18 +36,47 @@ NUM_HIDDEN = 3
 
 ANN_PARAMS_SIZE = NUM_ACTUATORS * (NUM_SENSORS+NUM_HIDDEN) + NUM_ACTUATORS + NUM_HIDDEN * NUM_SENSORS + NUM_HIDDEN + NUM_HIDDEN
 
+RANDOM_PER_ROBOT = 50
+
+# default time step of a simulation step (seconds)
+TIME_STEP = 1/10.0
+
+# seeds of consecutive worlds of a launch are this far apart
+WORLD_SEED_STEP = 0x9e3779b9
+
+def random_seeds(num_worlds):
+    return np.random.randint(0, 2**31-1, num_worlds)
+
+def world_seeds(base_seed, num_worlds):
+    """
+    Seeds of the worlds of a launch without explicit seeds. The random values
+    of a world are generated on the device from its seed alone, so a world
+    simulated with the same seed, parameters and scenario reproduces the same
+    trajectory regardless of its batch.
+    """
+    seeds = np.uint64(base_seed) + np.uint64(WORLD_SEED_STEP) * np.arange(num_worlds, dtype=np.uint64)
+    return (seeds % np.uint64(2**32)).astype(np.uint32)
+
 class Simulator(object):
-    def __init__(self, context, queue, num_worlds=1, num_robots=10, ta=600, tb=5400, time_step=1/10.0, test=False, random_targets=True, symetrical_targets=False):
+    """
+    Simulates batches of worlds of num_robots robots. num_worlds is the
+    default batch size and the initial capacity: a launch may have any
+    number of worlds, the world buffers grow (doubling) when a batch does
+    not fit and the program is never rebuilt for a batch size.
+    """
+
+    def __init__(self, context, queue, num_worlds=1, num_robots=10, ta=600, tb=5400, time_step=TIME_STEP, test=False, random_targets=True, symetrical_targets=False):
         self.context = context
         self.queue = queue
 
         self.num_worlds = num_worlds
+        self.capacity = 0
         self.num_robots = num_robots
         self.ta = ta
         self.tb = tb
         self.time_step = time_step
 
-        self.sizeof_world_t = self.__query_sizeof_world_t(context, queue, num_robots)
+        self.sizeof_world_t, self.sizeof_controller_t = self.__query_sizeof(context, queue, num_robots)
 
         # estimate how many work items can be executed in parallel in each work group
         # self.work_group_size = pyopencl.characterize.get_simd_group_size(self.queue.device, self.sizeof_world_t)
@@ -55,26 +84,21 @@ class Simulator(object):
 
         if self.work_group_size < num_robots:
             self.work_items_are_worlds = True
-            self.global_size = (self.num_worlds,1)
             self.local_size = (1,1)
 
         elif self.queue.device.type == cl.device_type.GPU:
             self.work_items_are_worlds = False
-            self.global_size = (self.num_worlds,self.num_robots)
             self.local_size = (1,self.num_robots)
 
         else:
             self.work_items_are_worlds = True
-            self.global_size = (self.num_worlds,1)
             self.local_size = (1,1)
 
         options = [
             '-I"%s"' % os.path.join(__dir__, 'kernels/'),
-            '-DNUM_WORLDS=%d' % num_worlds,
             '-DROBOTS_PER_WORLD=%d' % num_robots,
-            '-DTIME_STEP=%f' % time_step,
-            '-DTA=%d' % ta,
-            '-DTB=%d' % tb,
+            '-DRANDOM_PER_WORLD=%d' % (num_robots * RANDOM_PER_ROBOT),
+            '-DWORLD_SEED_STEP=0x%xu' % WORLD_SEED_STEP,
             '-DWORLDS_PER_LOCAL=%d' % self.local_size[0],
             '-DROBOTS_PER_LOCAL=%d' % self.local_size[1],
         ]
@@ -94,40 +118,77 @@ class Simulator(object):
         src = open(os.path.join(__dir__, 'kernels/physics.cl'), 'r')
         self.prg = cl.Program(context, src.read()).build(options=' '.join(options))
 
-        # create worlds buffer
-        self.worlds = cl.Buffer(context, 0, num_worlds * self.sizeof_world_t)
-
-    def __query_sizeof_world_t(self, context, queue, num_robots):
+        # seeds of the worlds in the last simulation
+        self.seeds = None
+
+        # worlds, controllers and random values buffers
+        self.worlds = None
+        self.controllers = None
+        self.random = None
+        self.reserve(num_worlds)
+
+    def reserve(self, num_worlds):
+        """ Makes room for num_worlds worlds, at least doubling the capacity when it grows. """
+        if num_worlds <= self.capacity:
+            return
+
+        # worlds and controllers are initialized by every launch, nothing to copy
+        self.capacity = max(num_worlds, 2 * self.capacity)
+        self.worlds = cl.Buffer(self.context, 0, self.capacity * self.sizeof_world_t)
+        self.controllers = cl.Buffer(self.context, 0, self.capacity * self.sizeof_controller_t)
+        self.random = cl.Buffer(self.context, 0, self.capacity * self.num_robots * RANDOM_PER_ROBOT * 4)
+
+    def global_size(self, num_worlds):
+        """ Work items of a launch of num_worlds worlds. """
+        if self.work_items_are_worlds:
+            return (num_worlds,1)
+        return (num_worlds,self.num_robots)
+
+    def __query_sizeof(self, context, queue, num_robots):
         src = '''
         #include <defs.cl>
 
-        __kernel void size_of_world_t(__global unsigned int *result)
+        __kernel void size_of(__global unsigned int *result)
         {
-            *result = (unsigned int) sizeof(world_t);
+            result[0] = (unsigned int) sizeof(world_t);
+            result[1] = (unsigned int) sizeof(controller_t);
         }
         '''
 
         prg = cl.Program(context, src).build(options='-I"%s" -DROBOTS_PER_WORLD=%d' % (os.path.join(__dir__, 'kernels/'), num_robots))
 
-        sizeof_buf = cl.Buffer(context, 0, 4)
-        prg.size_of_world_t(queue, (1,), None, sizeof_buf).wait()
+        sizeof_buf = cl.Buffer(context, 0, 8)
+        prg.size_of(queue, (1,), None, sizeof_buf).wait()
 
-        sizeof = np.zeros(1, dtype=np.uint32)
+        sizeof = np.zeros(2, dtype=np.uint32)
         cl.enqueue_copy(queue, sizeof, sizeof_buf).wait()
-        return int(sizeof[0])
-
-    def simulate(self, param_list, targets_distance=1.0, targets_angle=2.356194490192345, save_hist=False):
-        if len(param_list) != self.num_worlds:
-            raise Exception('Number of parameters is not equal to the number of worlds!')
-
-        param = np.zeros((len(param_list), len(param_list[0])), np.float32)
-        param[:] = param_list
-        param_buf = cl.Buffer(self.context, cl.mem_flags.COPY_HOST_PTR, hostbuf=param)
-
-        random_vector = np.random.rand(self.num_worlds * self.num_robots * 50).astype(np.float32)
-        random_vector_buf = cl.Buffer(self.context, cl.mem_flags.COPY_HOST_PTR, hostbuf=random_vector)
+        return int(sizeof[0]), int(sizeof[1])
+
+    def simulate(self, param_list, targets_distance=1.0, targets_angle=2.356194490192345, save_hist=False, seeds=None, ta=None, tb=None, time_step=None, num_worlds=None):
+        # one world per parameter set, or num_worlds worlds sharing fewer sets
+        # (world i uses param_list[i % len(param_list)]); ta, tb and
+        # time_step default to the ones given to the constructor
+        ta, tb, time_step = self.episode(ta, tb, time_step)
+
+        if num_worlds is None:
+            num_worlds = len(seeds) if seeds is not None else len(param_list)
+
+        if (len(param_list) == 0) or (num_worlds % len(param_list)) != 0:
+            raise Exception('Number of worlds is not a multiple of the number of parameters!')
+
+        # genomes given as a uint8 matrix are uploaded as they are and scaled
+        # to [0,1] on the device, everything else goes as float32
+        if isinstance(param_list, np.ndarray) and param_list.dtype == np.uint8:
+            raw_param = np.ascontiguousarray(param_list)
+            raw_param_buf = cl.Buffer(self.context, cl.mem_flags.READ_ONLY | cl.mem_flags.COPY_HOST_PTR, hostbuf=raw_param)
+            param_buf = None
+        else:
+            param = np.zeros((len(param_list), len(param_list[0])), np.float32)
+            param[:] = param_list
+            param_buf = cl.Buffer(self.context, cl.mem_flags.READ_ONLY | cl.mem_flags.COPY_HOST_PTR, hostbuf=param)
+            raw_param_buf = None
 
-        fitness_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * self.num_worlds))
+        fitness_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * num_worlds))
 
         if save_hist:
             robot_radius_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=4)
@@ -135,48 +196,27 @@ class Simulator(object):
             target_areas_pos_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=16)
             target_areas_radius_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=8)
 
-            fitness_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (self.ta+self.tb) * self.num_robots))
-            energy_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (self.ta+self.tb) * self.num_robots))
-            transform_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(16 * (self.ta+self.tb) * self.num_robots))
-            sensors_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (self.ta+self.tb) * self.num_robots * NUM_SENSORS))
-            actuators_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (self.ta+self.tb) * self.num_robots * NUM_ACTUATORS))
-            hidden_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (self.ta+self.tb) * self.num_robots * NUM_HIDDEN))
+            fitness_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (ta+tb) * self.num_robots))
+            energy_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (ta+tb) * self.num_robots))
+            transform_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(16 * (ta+tb) * self.num_robots))
+            sensors_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (ta+tb) * self.num_robots * NUM_SENSORS))
+            actuators_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (ta+tb) * self.num_robots * NUM_ACTUATORS))
+            hidden_hist_buf = cl.Buffer(self.context, cl.mem_flags.WRITE_ONLY, size=(4 * (ta+tb) * self.num_robots * NUM_HIDDEN))
+
+            hist_bufs = ( robot_radius_buf, arena_size_buf,
+                          target_areas_pos_buf, target_areas_radius_buf,
+                          fitness_hist_buf, energy_hist_buf, transform_hist_buf,
+                          sensors_hist_buf, actuators_hist_buf, hidden_hist_buf )
         else:
-            robot_radius_buf = None
-            arena_size_buf = None
-            target_areas_pos_buf = None
-            target_areas_radius_buf = None
-
-            fitness_hist_buf = None
-            energy_hist_buf = None
-            transform_hist_buf = None
-            sensors_hist_buf = None
-            actuators_hist_buf = None
-            hidden_hist_buf = None
+            hist_bufs = None
 
-        simulate = self.prg.simulate
-        simulate.set_scalar_arg_dtypes((None,
-                                        None, np.float32, np.float32,
-                                        None, np.uint32,
-                                        None,
-                                        None, None,
-                                        None, None,
-                                        None, None, None,
-                                        None, None, None,
-                                        np.uint32))
+        self.enqueue_simulate(fitness_buf, targets_distance, targets_angle,
+                              param_buf=param_buf, raw_param_buf=raw_param_buf,
+                              param_size=len(param_list[0]), num_controllers=len(param_list),
+                              hist_bufs=hist_bufs, seeds=seeds, ta=ta, tb=tb, time_step=time_step,
+                              num_worlds=num_worlds).wait()
 
-        simulate(self.queue, self.global_size, self.local_size,
-                 random_vector_buf,
-                 self.worlds, targets_distance, targets_angle,
-                 param_buf, len(param_list[0]),
-                 fitness_buf,
-                 robot_radius_buf, arena_size_buf,
-                 target_areas_pos_buf, target_areas_radius_buf,
-                 fitness_hist_buf, energy_hist_buf, transform_hist_buf,
-                 sensors_hist_buf, actuators_hist_buf, hidden_hist_buf,
-                 1 if save_hist else 0).wait()
-
-        fitness = np.zeros(self.num_worlds, dtype=np.float32)
+        fitness = np.zeros(num_worlds, dtype=np.float32)
         cl.enqueue_copy(self.queue, fitness, fitness_buf)
 
         if save_hist:
@@ -185,12 +225,17 @@ class Simulator(object):
             target_areas_pos = np.zeros((2, 2), dtype=np.float32)
             target_areas_radius = np.zeros(2, dtype=np.float32)
 
-            fitness_hist = np.zeros((self.ta+self.tb, self.num_robots), dtype=np.float32)
-            energy_hist = np.zeros((self.ta+self.tb, self.num_robots), dtype=np.float32)
-            transform_hist = np.zeros((self.ta+self.tb, self.num_robots, 4), dtype=np.float32)
-            sensors_hist = np.zeros((self.ta+self.tb, self.num_robots, NUM_SENSORS), dtype=np.float32)
-            actuators_hist = np.zeros((self.ta+self.tb, self.num_robots, NUM_ACTUATORS), dtype=np.float32)
-            hidden_hist = np.zeros((self.ta+self.tb, self.num_robots, NUM_HIDDEN), dtype=np.float32)
+            fitness_hist = np.zeros((ta+tb, self.num_robots), dtype=np.float32)
+            energy_hist = np.zeros((ta+tb, self.num_robots), dtype=np.float32)
+            transform_hist = np.zeros((ta+tb, self.num_robots, 4), dtype=np.float32)
+            sensors_hist = np.zeros((ta+tb, self.num_robots, NUM_SENSORS), dtype=np.float32)
+            actuators_hist = np.zeros((ta+tb, self.num_robots, NUM_ACTUATORS), dtype=np.float32)
+            hidden_hist = np.zeros((ta+tb, self.num_robots, NUM_HIDDEN), dtype=np.float32)
+
+            ( robot_radius_buf, arena_size_buf,
+              target_areas_pos_buf, target_areas_radius_buf,
+              fitness_hist_buf, energy_hist_buf, transform_hist_buf,
+              sensors_hist_buf, actuators_hist_buf, hidden_hist_buf ) = hist_bufs
 
             cl.enqueue_copy(self.queue, robot_radius, robot_radius_buf)
             cl.enqueue_copy(self.queue, arena_size, arena_size_buf)
@@ -213,6 +258,90 @@ class Simulator(object):
         else:
             return fitness
 
+    def episode(self, ta=None, tb=None, time_step=None):
+        """ (ta, tb, time_step) of a launch, the constructor's where not given. """
+        return (self.ta if ta is None else ta,
+                self.tb if tb is None else tb,
+                self.time_step if time_step is None else time_step)
+
+    def enqueue_simulate(self, fitness_buf, targets_distance, targets_angle, param_buf=None, raw_param_buf=None, param_size=ANN_PARAMS_SIZE, num_controllers=None, hist_bufs=None, seeds=None, ta=None, tb=None, time_step=None, num_worlds=None):
+        """
+        Enqueues a simulation of num_worlds worlds (default one per seed, or
+        self.num_worlds) with parameters already in device memory (float32
+        param_buf or uint8 raw_param_buf). The buffers hold num_controllers
+        parameter sets (default one per world). The fitness of each world
+        is written to fitness_buf; nothing is read back.
+
+        Each world gets its own seed, they are kept in self.seeds. Without
+        explicit seeds only a base seed is drawn from numpy's generator and
+        passed as a kernel argument: the random values are generated on the
+        device, so a launch uploads nothing. The episode length (ta, tb) and
+        time_step are kernel arguments, any of them can change from one
+        launch to the next without rebuilding the program.
+        """
+        ta, tb, time_step = self.episode(ta, tb, time_step)
+
+        if num_worlds is None:
+            num_worlds = len(seeds) if seeds is not None else self.num_worlds
+
+        if (seeds is not None) and (len(seeds) != num_worlds):
+            raise Exception('Number of seeds is not equal to the number of worlds!')
+
+        self.reserve(num_worlds)
+
+        init_random = self.prg.init_random
+        init_random.set_scalar_arg_dtypes((np.uint32, None, None))
+
+        if seeds is None:
+            base_seed = random_seeds(1)[0]
+            self.seeds = world_seeds(base_seed, num_worlds)
+            init_random(self.queue, (num_worlds,), None, base_seed, None, self.random)
+        else:
+            self.seeds = np.asarray(seeds, dtype=np.uint32)
+            seeds_buf = cl.Buffer(self.context, cl.mem_flags.READ_ONLY | cl.mem_flags.COPY_HOST_PTR, hostbuf=self.seeds)
+            init_random(self.queue, (num_worlds,), None, 0, seeds_buf, self.random)
+
+        if num_controllers is None:
+            num_controllers = num_worlds
+
+        init_controllers = self.prg.init_controllers
+        init_controllers.set_scalar_arg_dtypes((None, None, np.uint32, None))
+        init_controllers(self.queue, (num_controllers,), None,
+                         param_buf, raw_param_buf, param_size, self.controllers)
+
+        save_hist = hist_bufs is not None
+        if not save_hist:
+            hist_bufs = (None,) * 10
+
+        ( robot_radius_buf, arena_size_buf,
+          target_areas_pos_buf, target_areas_radius_buf,
+          fitness_hist_buf, energy_hist_buf, transform_hist_buf,
+          sensors_hist_buf, actuators_hist_buf, hidden_hist_buf ) = hist_bufs
+
+        simulate = self.prg.simulate
+        simulate.set_scalar_arg_dtypes((None,
+                                        None, np.float32, np.float32,
+                                        None, np.uint32,
+                                        np.uint32, np.uint32, np.float32,
+                                        None,
+                                        None, None,
+                                        None, None,
+                                        None, None, None,
+                                        None, None, None,
+                                        np.uint32))
+
+        return simulate(self.queue, self.global_size(num_worlds), self.local_size,
+                        self.random,
+                        self.worlds, targets_distance, targets_angle,
+                        self.controllers, num_controllers,
+                        ta, tb, time_step,
+                        fitness_buf,
+                        robot_radius_buf, arena_size_buf,
+                        target_areas_pos_buf, target_areas_radius_buf,
+                        fitness_hist_buf, energy_hist_buf, transform_hist_buf,
+                        sensors_hist_buf, actuators_hist_buf, hidden_hist_buf,
+                        1 if save_hist else 0)
+
     def simulate_and_save(self, filename, param_list, **kwargs):
         fitness, hist = self.simulate(param_list, save_hist=True, **kwargs)
 
@@ -220,7 +349,9 @@ class Simulator(object):
           fitness_hist, energy_hist, transform_hist,
           sensors_hist, actuators_hist, hidden_hist ) = hist
 
-        save_file = io.SaveFile.new(filename, step_rate=1/float(self.time_step))
+        ta, tb, time_step = self.episode(kwargs.get('ta'), kwargs.get('tb'), kwargs.get('time_step'))
+
+        save_file = io.SaveFile.new(filename, step_rate=1/float(time_step))
 
         world = 0
 
@@ -249,7 +380,7 @@ class Simulator(object):
                 hidden2=hidden_hist[0][rid][2])
 
         cur = 0
-        while (cur < (self.ta+self.tb)):
+        while (cur < (ta+tb)):
             for rid in xrange(self.num_robots):
                 robot_obj[rid].update(
                     x=transform_hist[cur][rid][0], y=transform_hist[cur][rid][1],
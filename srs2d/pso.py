@@ -19,24 +19,29 @@ __author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
 __date__ = "04 Jul 2013"
 
 import os
+import sys
 import argparse
 import random
 import logging
 import physics
+import codec
+import checkpoint
+import recorder
 import pyopencl as cl
 import logging.config
-import solace
+import report
+import sweep
+import evaluator
 import io
 # import png
 import subprocess
 import numpy as np
 import math
-import tempfile
 
 logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
 __log__ = logging.getLogger(__name__)
 
-def main():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbosity",        help="increase output verbosity", action="count")
     parser.add_argument("-q", "--quiet",            help="supress output (except errors)", action="store_true")
@@ -58,7 +63,15 @@ def main():
     parser.add_argument("--random-targets",         help="place targets at random position (obeying targets distances)", action="store_true")
     parser.add_argument("--symetrical-targets",     help="place targets at symetrical position", action="store_true")
     parser.add_argument("-t", "--trials",           help="number of trials per distance, default is 3", type=int, default=3)
-    args = parser.parse_args()
+    parser.add_argument("--checkpoint",             help="save the state of each run to FILE.runNN periodically", metavar="FILE", type=str)
+    parser.add_argument("--checkpoint-freq",        help="frequency of checkpoints (in generations), default is 10", type=int, default=10)
+    parser.add_argument("--resume",                 help="resume runs from their checkpoints (requires --checkpoint)", action="store_true")
+    parser.add_argument("--lazy-recording",         help="do not record new bests, write an index to FILE.runNN to replay them later", metavar="FILE", type=str)
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
+    parser.add_argument("--device-swarm",           help="keep the swarm in device memory and update it there", action="store_true")
+    parser.add_argument("--lockstep",               help="advance all runs together, evaluating their populations in one simulation batch per generation", action="store_true")
+    evaluator.add_arguments(parser)
+    args = parser.parse_args(argv)
 
     if args.verbosity >= 2:
         __log__.setLevel(logging.DEBUG)
@@ -70,31 +83,28 @@ def main():
     if args.quiet:
         __log__.setLevel(logging.ERROR)
 
-    uri = os.environ.get('SOLACE_URI')
-    username = os.environ.get('SOLACE_USERNAME')
-    password = os.environ.get('SOLACE_PASSWORD')
+    if args.resume and (args.checkpoint is None):
+        __log__.error('--resume requires --checkpoint!')
+        sys.exit(1)
 
     try:
-        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
-    except:
-        git_version = None
+        evaluator.check_args(args)
+    except ValueError as e:
+        __log__.error(str(e))
+        sys.exit(1)
 
-    if (uri is None) or (username is None) or (password is None):
-        raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set!')
+    if args.lockstep and args.device_swarm:
+        __log__.error('--lockstep cannot be used with --device-swarm!')
+        sys.exit(1)
 
-    device_type = cl.device_type.ALL
-    if args.device_type == 'cpu':
-        device_type = cl.device_type.CPU
-    elif args.device_type == 'gpu':
-        device_type = cl.device_type.GPU
+    if (args.cache_fitness or args.racing or args.surrogate or args.promote) and args.device_swarm:
+        __log__.error('--cache-fitness, --racing, --surrogate and --promote cannot be used with --device-swarm!')
+        sys.exit(1)
 
-    platform = cl.get_platforms()[0]
-    devices = platform.get_devices(device_type=device_type)
-    context = cl.Context(devices=devices)
-    queue = cl.CommandQueue(context)
+    return args
 
-    exp = solace.get_experiment(uri, username, password)
-    inst = exp.create_instance(args.num_runs, {
+def instance_params(args):
+    params = {
         'W': args.inertia,
         'ALFA': args.alfa,
         'BETA': args.beta,
@@ -109,112 +119,104 @@ def main():
         'TRIALS': args.trials,
         'RANDOM_TARGETS': 1 if args.random_targets else 0,
         'SYMETRICAL_TARGETS': 1 if args.symetrical_targets else 0
-    }, code_version=git_version)
+    }
 
-    for run in inst.runs:
-        PSO(context, queue).execute(run, args)
+    params.update(evaluator.instance_params(args))
+    return params
 
-class PSO(object):
-    def __init__(self, context, queue):
-        self.context = context
-        self.queue = queue
+def main():
+    args = parse_args()
 
-    def execute(self, run, args):
-        __log__.info('Starting PSO...')
+    try:
+        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
+    except:
+        git_version = None
+
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
 
-        run.begin()
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
 
-        self.gbest = None
-        self.gbest_fitness = None
+    exp = report.get_experiment(args.results_dir)
+    inst = exp.create_instance(args.num_runs, instance_params(args), code_version=git_version)
 
-        self.particles = [ Particle(physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta) for i in range(args.population_size) ]
+    runs = [ report.AsyncRun(run) for run in inst.runs ]
 
-        self.simulator = physics.Simulator(self.context, self.queue,
-                                           num_worlds=args.population_size,
-                                           num_robots=args.num_robots,
-                                           ta=args.ta, tb=args.tb,
-                                           random_targets=args.random_targets,
-                                           symetrical_targets=args.symetrical_targets)
+    if args.lockstep:
+        sweep.lockstep(context, queue, [ (args, run, i+1) for i, run in enumerate(runs) ], execute_run)
+    else:
+        for i, run in enumerate(runs):
+            execute_run(context, queue, args, run, i+1)
 
-        generation = 1
-        while (generation <= args.num_generations):
-            __log__.info('[gen=%d] Evaluating particles...', generation)
-            self.evaluate(args.targets_distances, args.targets_angles, args.trials)
+def execute_run(context, queue, args, run, run_index, fused_evaluator=None):
+    """ Executes one run, the populations are evaluated by fused_evaluator when given (see sweep.py). """
+    checkpointer = None
+    if args.checkpoint:
+        filename = checkpoint.run_filename(args.checkpoint, run_index)
+        if (not args.resume) and os.path.exists(filename):
+            os.remove(filename)
+        checkpointer = checkpoint.Checkpointer(filename, args.checkpoint_freq)
 
-            __log__.info('[gen=%d] Updating particles...', generation)
-            for p in self.particles:
-                p.update_pbest()
+    best_recorder = recorder.create(context, args, run_index)
 
-            new_gbest = False
-            for p in self.particles:
-                if (self.gbest is None) or (p.pbest.fitness > self.gbest.fitness):
-                    self.gbest = p.pbest.copy()
-                    new_gbest = True
+    engine = evaluator.create_engine(context, queue, args, fused_evaluator)
 
-            for p in self.particles:
-                p.gbest = self.gbest
-                p.update_pos_vel()
+    if args.device_swarm:
+        optimizer = DevicePSO(context, queue, args)
+    else:
+        optimizer = PSO(args)
 
-            avg_fitness = 0
-            best_fitness = 0
-            for p in self.particles:
-                if p.fitness >= best_fitness:
-                    best_fitness = p.fitness
-                avg_fitness += p.fitness
-            avg_fitness /= len(self.particles)
+    engine.run(optimizer, run, checkpointer, best_recorder)
 
-            __log__.info('[gen=%d] Particles updated, avg fitness) = %.5f, best fitness: %.5f', generation, avg_fitness, best_fitness)
+    if checkpointer:
+        checkpointer.close()
 
-            run.progress(generation / float(args.num_generations), {
-                'generation': generation,
-                'avg_fitness': avg_fitness,
-                'best_fitness': best_fitness,
-                'gbest_position': self.gbest.position_hex
-            })
+class PSO(evaluator.Optimizer):
+    best_name = 'gbest'
 
-            if new_gbest and (not args.no_save):
-                __log__.info('[gen=%d] Saving simulation for the new found gbest...', generation)
-                _, filename = tempfile.mkstemp(prefix='pso_sim_', suffix='.srs')
+    def __init__(self, args):
+        self.args = args
+        self.swarm = self.create_swarm(args)
 
-                fitness = self.simulator.simulate_and_save(
-                    filename,
-                    [ self.gbest.position_decoded for i in xrange(len(self.particles)) ],
-                    targets_distance=args.targets_distances[ random.randint(0, len(args.targets_distances)-1) ],
-                    targets_angle=args.targets_angles[ random.randint(0, len(args.targets_angles)-1) ]
-                )
+    def create_swarm(self, args):
+        return Swarm(args.population_size, physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta)
 
-                run.upload(filename, 'run-%02d-new-gbest-gen-%04d-fit-%.4f.srs' % (run.id, generation, fitness[0]) )
-                os.remove(filename)
+    def ask(self):
+        return self.swarm.position.astype(np.float32)
 
-            generation += 1
+    def tell(self, fitness, measured=None):
+        self.swarm.fitness = np.asarray(fitness, dtype=np.float64)
+        self.swarm.update_bests(measured)
+        self.swarm.update_pos_vel()
 
-        run.done()
+    def statistics(self):
+        avg_fitness, best_fitness = self.swarm.statistics()
 
-    def evaluate(self, targets_distances, targets_angles, trials):
-        for p in self.particles:
-            p.fitness = 0.0
+        return {
+            'avg_fitness': avg_fitness,
+            'best_fitness': max(0.0, best_fitness),
+            'gbest_position': codec.to_hex(codec.encode(self.swarm.gbest_position))
+        }
 
-        for d in targets_distances:
-            for a in targets_angles:
-                for t in range(trials):
-                    fitness = self.simulator.simulate([ p.position_decoded for p in self.particles ], targets_distance=d, targets_angle=a)
+    def get_best(self):
+        return self.swarm.gbest_position.tolist(), self.swarm.gbest_fitness
 
-                    for i in xrange(len(self.particles)):
-                        self.particles[i].fitness += fitness[i]
+    def get_state(self):
+        return self.swarm.get_state()
 
-        for p in self.particles:
-            p.fitness /= len(targets_distances) * len(targets_angles) * trials
+    def set_state(self, header, arrays):
+        self.swarm.set_state(header, arrays)
 
     def generate_image(self, filename, block_width=8, block_height=8):
-        blocks = [ [] for p in xrange(len(self.particles)) ]
+        blocks = [ codec.to_array(codec.encode(position)).tolist() for position in self.swarm.position ]
         pixels = []
 
-        for p in xrange(len(self.particles)):
-            pos = self.particles[p].position_hex.decode('hex')
-
-            for c in pos:
-                blocks[p].append(ord(c))
-
         for i in xrange(len(blocks[0])):
             line = []
             for b in blocks:
@@ -226,63 +228,283 @@ class PSO(object):
 
         # png.from_array(pixels, 'L').save(filename)
 
-class Particle(object):
+class DevicePSO(PSO):
+    """
+    Same algorithm as PSO, but the swarm never leaves the device (see
+    DeviceSwarm): the simulations read their parameters straight from the
+    positions buffer. Only the statistics of each generation, and the gbest
+    position when it changes, are read back.
+    """
+
+    def __init__(self, context, queue, args):
+        self.context = context
+        self.queue = queue
+        PSO.__init__(self, args)
+
+    def create_swarm(self, args):
+        return DeviceSwarm(self.context, self.queue, args.population_size, physics.ANN_PARAMS_SIZE, args.inertia, args.alfa, args.beta)
+
+    def step(self, engine):
+        swarm = self.swarm
+        n = swarm.num_particles
+        simulator = engine.get_simulator()
+
+        swarm.prg.clear_fitness(self.queue, (n,), None, swarm.total_fitness_buf)
+
+        for d in self.args.targets_distances:
+            for a in self.args.targets_angles:
+                for t in range(self.args.trials):
+                    simulator.enqueue_simulate(swarm.fitness_buf, d, a, param_buf=swarm.position_buf, num_worlds=n)
+                    swarm.prg.accumulate_fitness(self.queue, (n,), None, swarm.total_fitness_buf, swarm.fitness_buf)
+
+        swarm.scale = 1.0 / (len(self.args.targets_distances) * len(self.args.targets_angles) * self.args.trials)
+
+        swarm.update_bests()
+        swarm.update_pos_vel()
+
+class Swarm(object):
+    """
+    The whole swarm as (particles x dimensions) matrices: position, velocity
+    and the position of each personal best, updated in bulk. The random
+    coefficients are drawn per particle and dimension.
+    """
+
     MIN_SPEED = -0.1
     MAX_SPEED =  0.1
 
     MIN_POS = 0
     MAX_POS = 1
 
-    def __init__(self, size, inertia=0.9, alfa=2.0, beta=2.0):
-        self.id = id(self)
-
-        self.fitness = 0
-
+    def __init__(self, num_particles, size, inertia=0.9, alfa=2.0, beta=2.0):
         self.inertia = inertia
         self.alfa = alfa
         self.beta = beta
 
-        self.position = np.random.uniform(self.MIN_POS, self.MAX_POS, size)
-        self.velocity = np.random.uniform(self.MIN_SPEED, self.MAX_SPEED, size)
+        self.position = np.random.uniform(self.MIN_POS, self.MAX_POS, (num_particles, size))
+        self.velocity = np.random.uniform(self.MIN_SPEED, self.MAX_SPEED, (num_particles, size))
+        self.fitness = np.zeros(num_particles)
+
+        self.pbest_position = np.copy(self.position)
+        self.pbest_fitness = np.empty(num_particles)
+        self.pbest_fitness.fill(-np.inf)
 
-        self.pbest = None
-        self.gbest = None
+        self.gbest_position = None
+        self.gbest_fitness = None
+
+        # particles of the last update_bests() simulated in full
+        self.measured = None
+
+    def update_bests(self, measured=None):
+        """
+        Updates the personal and global bests from the particles in the
+        measured mask (default all), returns True if the global best changed.
+        """
+        self.measured = measured
+
+        improved = self.fitness > self.pbest_fitness
+        if measured is not None:
+            improved &= measured
+        self.pbest_position[improved] = self.position[improved]
+        self.pbest_fitness[improved] = self.fitness[improved]
+
+        best = np.argmax(self.pbest_fitness)
+        if (self.gbest_fitness is None) or (self.pbest_fitness[best] > self.gbest_fitness):
+            self.gbest_position = np.copy(self.pbest_position[best])
+            self.gbest_fitness = float(self.pbest_fitness[best])
+            return True
+
+        return False
+
+    def statistics(self):
+        """ Average and best fitness of the particles measured in the last evaluation. """
+        fitness = evaluator.measured_fitness(self.fitness, self.measured)
+        return float(np.mean(fitness)), float(np.max(fitness))
+
+    def update_pos_vel(self):
+        r1 = np.random.uniform(0, 1.0, self.position.shape)
+        r2 = np.random.uniform(0, 1.0, self.position.shape)
+
+        self.velocity *= self.inertia
+        self.velocity += self.alfa * r1 * (self.pbest_position - self.position)
+        self.velocity += self.beta * r2 * (self.gbest_position - self.position)
+        np.clip(self.velocity, self.MIN_SPEED, self.MAX_SPEED, out=self.velocity)
+
+        self.position += self.velocity
+        np.clip(self.position, self.MIN_POS, self.MAX_POS, out=self.position)
+
+    def get_state(self):
+        header = { 'gbest_fitness': float(self.gbest_fitness) }
+        # copies, the checkpoint is written in the background while the
+        # swarm keeps being updated in place
+        arrays = {
+            'position': np.copy(self.position),
+            'velocity': np.copy(self.velocity),
+            'fitness': np.copy(self.fitness),
+            'pbest_position': np.copy(self.pbest_position),
+            'pbest_fitness': np.copy(self.pbest_fitness),
+            'gbest_position': np.copy(self.gbest_position)
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        # checkpoints of the former per particle swarm also had the velocity
+        # of each best, which is not needed
+        self.position = np.array(arrays['position'], dtype=np.float64)
+        self.velocity = np.array(arrays['velocity'], dtype=np.float64)
+        self.fitness = np.array(arrays['fitness'], dtype=np.float64)
+        self.pbest_position = np.array(arrays['pbest_position'], dtype=np.float64)
+        self.pbest_fitness = np.array(arrays['pbest_fitness'], dtype=np.float64)
+        self.gbest_position = np.array(arrays['gbest_position'], dtype=np.float64)
+        self.gbest_fitness = header['gbest_fitness']
+
+class DeviceSwarm(object):
+    """
+    Swarm with the same interface as Swarm, kept in device memory and
+    updated by the kernels in pso.cl. Positions are float32.
+
+    The gbest and the statistics come from a work group tree reduction in
+    two passes, with at most REDUCE_SIZE groups of REDUCE_SIZE work items.
+    """
+
+    REDUCE_SIZE = 64
+
+    def __init__(self, context, queue, num_particles, size, inertia=0.9, alfa=2.0, beta=2.0):
+        self.context = context
+        self.queue = queue
+        self.num_particles = num_particles
+        self.size = size
+        self.inertia = inertia
+        self.alfa = alfa
+        self.beta = beta
 
-    def __repr__(self):
-        return 'Particle(%d, fitness=%.5f)' % (self.id, self.fitness)
+        options = [
+            '-I"%s"' % os.path.join(physics.__dir__, 'kernels/'),
+            '-DDIMS=%d' % size,
+            '-DMIN_SPEED=%ff' % Swarm.MIN_SPEED,
+            '-DMAX_SPEED=%ff' % Swarm.MAX_SPEED,
+            '-DMIN_POS=%ff' % Swarm.MIN_POS,
+            '-DMAX_POS=%ff' % Swarm.MAX_POS,
+            '-DREDUCE_SIZE=%d' % self.REDUCE_SIZE,
+        ]
+
+        src = open(os.path.join(physics.__dir__, 'kernels/pso.cl'), 'r')
+        self.prg = cl.Program(context, src.read()).build(options=' '.join(options))
+
+        n = num_particles
+        self.position_buf = cl.Buffer(context, 0, 4 * n * size)
+        self.velocity_buf = cl.Buffer(context, 0, 4 * n * size)
+        self.pbest_position_buf = cl.Buffer(context, 0, 4 * n * size)
+        self.pbest_fitness_buf = cl.Buffer(context, 0, 4 * n)
+        self.gbest_position_buf = cl.Buffer(context, 0, 4 * size)
+        self.fitness_buf = cl.Buffer(context, 0, 4 * n)
+        self.total_fitness_buf = cl.Buffer(context, 0, 4 * n)
+
+        # partial results of the first reduction pass, one per group
+        self.num_groups = min((n + self.REDUCE_SIZE - 1) / self.REDUCE_SIZE, self.REDUCE_SIZE)
+        self.group_sum_buf = cl.Buffer(context, 0, 4 * self.num_groups)
+        self.group_best_buf = cl.Buffer(context, 0, 4 * self.num_groups)
+        self.group_pbest_buf = cl.Buffer(context, 0, 4 * self.num_groups)
+        self.group_index_buf = cl.Buffer(context, 0, 4 * self.num_groups)
+
+        self.stats = np.array([ 0, 0, -np.inf, 0 ], dtype=np.float32)
+        self.stats_buf = cl.Buffer(context, cl.mem_flags.COPY_HOST_PTR, hostbuf=self.stats)
+
+        # ranluxcl needs 112 bytes of state per work item
+        self.rng_buf = cl.Buffer(context, 0, 112 * n)
+        self.prg.init_rng(queue, (n,), None, np.uint32(np.random.randint(0, 2**31)), self.rng_buf)
+        self.prg.random_swarm(queue, (n,), None, self.rng_buf, self.position_buf, self.velocity_buf, self.pbest_fitness_buf)
+
+        self.scale = 1.0
+        self.gbest_fitness = None
+        self._gbest_position = None
 
     @property
-    def position_hex(self):
-        ret = ''
-        for v in self.position:
-            ret += chr(int(v * 255)).encode('hex')
-        return ret
+    def position(self):
+        """ Positions read back from the device, only for generate_image() and the like. """
+        return self.read(self.position_buf, (self.num_particles, self.size))
 
     @property
-    def position_decoded(self):
-        return self.position.tolist()
-
-    def copy(self):
-        p = Particle(len(self.position), self.inertia, self.alfa, self.beta)
-        p.fitness = self.fitness
-        p.position = np.copy(self.position)
-        p.velocity = np.copy(self.velocity)
-        p.pbest = self.pbest
-        p.gbest = self.gbest
-        return p
-
-    def update_pbest(self):
-        if (self.pbest is None) or (self.fitness > self.pbest.fitness):
-            self.pbest = self.copy()
+    def gbest_position(self):
+        if self._gbest_position is None:
+            self._gbest_position = np.zeros(self.size, dtype=np.float32)
+            cl.enqueue_copy(self.queue, self._gbest_position, self.gbest_position_buf).wait()
+        return self._gbest_position
+
+    def update_bests(self):
+        """ Updates the personal and global bests, returns True if the global best changed. """
+        n = self.num_particles
+
+        self.prg.update_pbest(self.queue, (n,), None,
+                              self.total_fitness_buf, np.float32(self.scale),
+                              self.position_buf, self.pbest_position_buf, self.pbest_fitness_buf)
+        self.prg.reduce_swarm(self.queue, (self.num_groups * self.REDUCE_SIZE,), (self.REDUCE_SIZE,),
+                              self.total_fitness_buf, np.uint32(n), self.pbest_fitness_buf,
+                              self.group_sum_buf, self.group_best_buf, self.group_pbest_buf, self.group_index_buf)
+        self.prg.update_gbest(self.queue, (self.REDUCE_SIZE,), (self.REDUCE_SIZE,),
+                              self.group_sum_buf, self.group_best_buf, self.group_pbest_buf, self.group_index_buf,
+                              np.uint32(self.num_groups), np.float32(self.scale), np.uint32(n),
+                              self.pbest_position_buf, self.gbest_position_buf, self.stats_buf)
+        cl.enqueue_copy(self.queue, self.stats, self.stats_buf).wait()
+
+        if self.stats[3] == 0:
+            return False
+
+        self.gbest_fitness = float(self.stats[2])
+        self._gbest_position = None
+        return True
+
+    def statistics(self):
+        return float(self.stats[0]), float(self.stats[1])
 
     def update_pos_vel(self):
-        self.velocity = self.inertia * self.velocity + \
-                        self.alfa * random.uniform(0, 1.0) * (self.pbest.position - self.position) + \
-                        self.beta * random.uniform(0, 1.0) * (self.gbest.position - self.position)
-        self.velocity = np.clip(self.velocity, self.MIN_SPEED, self.MAX_SPEED)
-
-        self.position = self.position + self.velocity
-        self.position = np.clip(self.position, self.MIN_POS, self.MAX_POS)
+        self.prg.update_swarm(self.queue, (self.num_particles,), None,
+                              self.rng_buf, self.position_buf, self.velocity_buf,
+                              self.pbest_position_buf, self.gbest_position_buf,
+                              np.float32(self.inertia), np.float32(self.alfa), np.float32(self.beta))
+
+    def read(self, buf, shape, dtype=np.float32):
+        array = np.zeros(shape, dtype=dtype)
+        cl.enqueue_copy(self.queue, array, buf).wait()
+        return array
+
+    def write(self, buf, array, dtype=np.float32):
+        cl.enqueue_copy(self.queue, buf, np.ascontiguousarray(array, dtype=dtype)).wait()
+
+    def get_state(self):
+        n, size = self.num_particles, self.size
+
+        header = { 'gbest_fitness': float(self.gbest_fitness) }
+        arrays = {
+            'position': self.position,
+            'velocity': self.read(self.velocity_buf, (n, size)),
+            'fitness': self.read(self.total_fitness_buf, n) * self.scale,
+            'pbest_position': self.read(self.pbest_position_buf, (n, size)),
+            'pbest_fitness': self.read(self.pbest_fitness_buf, n),
+            'gbest_position': self.gbest_position,
+            'device_rng': self.read(self.rng_buf, 112 * n, np.uint8)
+        }
+
+        return header, arrays
+
+    def set_state(self, header, arrays):
+        self.write(self.position_buf, arrays['position'])
+        self.write(self.velocity_buf, arrays['velocity'])
+        self.write(self.total_fitness_buf, arrays['fitness'])
+        self.write(self.pbest_position_buf, arrays['pbest_position'])
+        self.write(self.pbest_fitness_buf, arrays['pbest_fitness'])
+        self.write(self.gbest_position_buf, arrays['gbest_position'])
+
+        # checkpoints of the host swarm have no device generator state
+        if 'device_rng' in arrays:
+            self.write(self.rng_buf, arrays['device_rng'], np.uint8)
+
+        self.scale = 1.0
+        self.gbest_fitness = header['gbest_fitness']
+        self._gbest_position = None
+
+        self.stats[:] = [ 0, 0, self.gbest_fitness, 0 ]
+        self.write(self.stats_buf, self.stats)
 
 if __name__=="__main__":
     main()
\ No newline at end of file
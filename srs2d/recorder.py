@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Background recording of new best individuals.
+
+The recorder owns its own command queue and a one world simulator (only
+world 0 is ever written to the .srs file) on the last device of the context,
+which is a spare one when there are several. The recording simulation, the
+encoding of the .srs file and the upload all happen while evolution goes on.
+A best still waiting to be recorded is dropped when a newer one of the same
+run arrives. One recorder is created per configuration and shared by the
+runs of the process; its thread is stopped by close() and started again by
+the next recording.
+
+With --lazy-recording nothing is simulated at all, LazyRecorder only appends
+the seed and scenario of each recording to an index (see replay.py).
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import logging
+import tempfile
+import threading
+import numpy as np
+import pyopencl as cl
+import physics
+import codec
+import checkpoint
+import replay
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+# recorders already created, by context and simulator configuration
+recorders = {}
+
+def create(context, args, run_index):
+    """ Best recorder for a run as configured by the command line, or None. """
+    if args.no_save:
+        return None
+
+    if args.lazy_recording:
+        filename = checkpoint.run_filename(args.lazy_recording, run_index)
+        return LazyRecorder(filename, args, truncate=not args.resume)
+
+    key = (context, args.num_robots, args.ta, args.tb, args.random_targets, args.symetrical_targets)
+    if key not in recorders:
+        recorders[key] = Recorder(context, args)
+
+    return recorders[key]
+
+class Recorder(object):
+    def __init__(self, context, args, device=None):
+        if device is None:
+            device = context.devices[-1]
+
+        self.queue = cl.CommandQueue(context, device)
+        self.simulator = physics.Simulator(context, self.queue,
+                                           num_worlds=1,
+                                           num_robots=args.num_robots,
+                                           ta=args.ta, tb=args.tb,
+                                           random_targets=args.random_targets,
+                                           symetrical_targets=args.symetrical_targets)
+
+        # seeds of the recordings, numpy's global generator is the
+        # optimizers' and is checkpointed
+        self.random_state = np.random.RandomState()
+
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.busy = False
+        self.stopping = False
+        self.thread = None
+
+    def record(self, run, generation, params, name, targets_distance, targets_angle, fitness=None):
+        """
+        Queues the recording of a single controller, either a genome (byte
+        string) or a list of floats. name is formatted with the recorded
+        fitness, e.g. 'run-01-new-best-gen-0004-fit-%.4f.srs'; fitness (the
+        optimizer's) is only used by LazyRecorder, which simulates nothing.
+        """
+        with self.cond:
+            if run in self.pending:
+                __log__.debug('Dropping superseded recording %s', self.pending[run][2])
+
+            self.pending[run] = (generation, params, name, targets_distance, targets_angle)
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker)
+                self.thread.daemon = True
+                self.thread.start()
+
+            self.cond.notify_all()
+
+    def close(self):
+        """ Blocks until every queued recording was handed to its run, then stops the thread. """
+        with self.cond:
+            while self.pending or self.busy:
+                self.cond.wait()
+
+            thread = self.thread
+            self.stopping = True
+            self.cond.notify_all()
+
+        if thread is not None:
+            thread.join()
+
+        with self.cond:
+            self.stopping = False
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+
+                # a recording queued while stopping is still made
+                if not self.pending:
+                    self.thread = None
+                    return
+
+                run, job = self.pending.popitem()
+                self.busy = True
+
+            try:
+                self.save(run, *job)
+            except Exception:
+                __log__.exception('Could not record %s', job[2])
+
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+    def save(self, run, generation, params, name, targets_distance, targets_angle):
+        if isinstance(params, str):
+            param_list = codec.to_matrix([ params ])
+        else:
+            param_list = np.array([ params ], dtype=np.float32)
+
+        fd, filename = tempfile.mkstemp(prefix='sim_', suffix='.srs')
+        os.close(fd)
+
+        fitness = self.simulator.simulate_and_save(filename, param_list,
+                                                   targets_distance=targets_distance,
+                                                   targets_angle=targets_angle,
+                                                   seeds=self.random_state.randint(0, 2**31-1, 1))
+
+        run.upload(filename, name % fitness[0], delete=True)
+
+class LazyRecorder(object):
+    """
+    Writes an index entry per recording and uploads the index when the run
+    is finished, trajectories are regenerated later with replay.py.
+    """
+
+    def __init__(self, filename, args, truncate=True, time_step=physics.TIME_STEP):
+        self.args = args
+        self.time_step = time_step
+        self.index = replay.Index(filename, truncate=truncate)
+        self.run = None
+
+        # not numpy's global generator, it is checkpointed with the optimizers
+        self.random_state = np.random.RandomState()
+
+    def record(self, run, generation, params, name, targets_distance, targets_angle, fitness=None):
+        self.run = run
+
+        # named after the optimizer's fitness, a replay gives the fitness of its scenario
+        if fitness is not None:
+            name = name % fitness
+
+        self.index.append(replay.make_entry(generation, params, name, targets_distance, targets_angle,
+                                            self.random_state.randint(0, 2**31-1), self.args, self.time_step))
+
+    def close(self):
+        if self.run is not None:
+            self.run.upload(self.index.filename, 'run-%02d-replay-index.jsonl' % self.run.id)
@@ -24,8 +24,9 @@ import argparse
 import random
 import logging
 import physics
+import codec
 import pyopencl as cl
-import solace
+import report
 import png
 import subprocess
 import tempfile
@@ -53,6 +54,7 @@ def main():
         are located each trial (between 0 and PI), default is [3*pi/4]", type=float, nargs='+', default=[2.356194490192345])
     parser.add_argument("--random-targets",         help="place targets at random position (obeying targets distances)", action="store_true")
     parser.add_argument("--symetrical-targets",     help="place targets at symetrical position", action="store_true")
+    parser.add_argument("--results-dir",            help="store results in DIR (SQLite database and files) when solace is not configured", metavar="DIR", type=str)
     args = parser.parse_args()
 
     if args.verbosity >= 2:
@@ -65,18 +67,11 @@ def main():
     if args.quiet:
         __log__.setLevel(logging.ERROR)
 
-    uri = os.environ.get('SOLACE_URI')
-    username = os.environ.get('SOLACE_USERNAME')
-    password = os.environ.get('SOLACE_PASSWORD')
-
     try:
         git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
     except:
         git_version = None
 
-    if (uri is None) or (username is None) or (password is None):
-        raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set!')
-
     device_type = cl.device_type.ALL
     if args.device_type == 'cpu':
         device_type = cl.device_type.CPU
@@ -88,7 +83,7 @@ def main():
     context = cl.Context(devices=devices)
     queue = cl.CommandQueue(context)
 
-    exp = solace.get_experiment(uri, username, password)
+    exp = report.get_experiment(args.results_dir)
     inst = exp.create_instance(1, {
         'STEPS_TA': args.ta,
         'STEPS_TB': args.tb,
@@ -102,7 +97,8 @@ def main():
     }, code_version=git_version)
 
     for run in inst.runs:
-        ReEval(context, queue, args).execute(run)
+        # every trial is a separate record, do not merge them
+        ReEval(context, queue, args).execute(report.AsyncRun(run, coalesce=False))
 
 class ReEval(object):
     def __init__(self, context, queue, args):
@@ -118,15 +114,9 @@ class ReEval(object):
                                            symetrical_targets=args.symetrical_targets)
 
         if args.params is not None:
-            params = args.params.decode('hex')
+            self.ann_params = codec.from_hex(args.params)
         else:
-            params = ''
-            for i in xrange(physics.ANN_PARAMS_SIZE):
-                params += chr(random.randint(0,255))
-
-        self.ann_params = np.zeros(len(params))
-        for i in xrange(len(params)):
-            self.ann_params[i] = float(ord(params[i])) / 255
+            self.ann_params = codec.random_genome(physics.ANN_PARAMS_SIZE)
 
         self.step_count = 0
 
@@ -144,7 +134,8 @@ class ReEval(object):
 
             fitness = self.simulator.simulate_and_save(
                 filename,
-                [ self.ann_params for i in xrange(self.args.granularity) ],
+                codec.to_matrix([ self.ann_params ]),
+                num_worlds=self.args.granularity,
                 targets_distance=self.args.targets_distances[ random.randint(0, len(self.args.targets_distances)-1) ],
                 targets_angle=self.args.targets_angles[ random.randint(0, len(self.args.targets_angles)-1) ]
             )
@@ -156,9 +147,9 @@ class ReEval(object):
                         'fitness': float(fitness[i])
                     })
 
-                run.upload(filename, 'reeval-%02d-fit-%.4f.srs' % (trial, float(fitness[0])) )
-
-            os.remove(filename)
+                run.upload(filename, 'reeval-%02d-fit-%.4f.srs' % (trial, float(fitness[0])), delete=True)
+            else:
+                os.remove(filename)
 
             trial += self.args.granularity
 
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Replay of recordings from their seeds.
+
+Instead of simulating and uploading a trajectory every time a new best is
+found, runs started with --lazy-recording append an entry to an index file
+(one JSON object per line) with everything needed to regenerate it: the
+genome, the scenario, the simulator configuration and the seed of the
+world. replay() simulates an entry again, which gives the same trajectory
+bit for bit on the same device and build.
+
+    python -m srs2d.replay INDEX                  # list the entries
+    python -m srs2d.replay INDEX -e 3 -o best.srs # regenerate entry 3
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import sys
+import json
+import argparse
+import logging
+import physics
+import codec
+import pyopencl as cl
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+def make_entry(generation, params, name, targets_distance, targets_angle, seed, args, time_step=physics.TIME_STEP):
+    """ Index entry for a controller (genome byte string or list of floats). """
+    entry = {
+        'generation': generation,
+        'name': name,
+        'targets_distance': float(targets_distance),
+        'targets_angle': float(targets_angle),
+        'seed': int(seed),
+        'num_robots': args.num_robots,
+        'ta': args.ta,
+        'tb': args.tb,
+        'time_step': time_step,
+        'random_targets': bool(args.random_targets),
+        'symetrical_targets': bool(args.symetrical_targets)
+    }
+
+    if isinstance(params, str):
+        entry['genome'] = codec.to_hex(params)
+    else:
+        entry['params'] = [ float(p) for p in params ]
+
+    return entry
+
+class Index(object):
+    def __init__(self, filename, truncate=False):
+        self.filename = filename
+
+        if truncate and os.path.exists(filename):
+            os.remove(filename)
+
+    def append(self, entry):
+        with open(self.filename, 'a') as fd:
+            fd.write(json.dumps(entry, sort_keys=True) + '\n')
+
+def read_index(filename):
+    with open(filename, 'r') as fd:
+        return [ json.loads(line) for line in fd if line.strip() ]
+
+def replay(context, queue, entry, filename):
+    """ Regenerates the recording of an index entry into filename, returns its fitness. """
+    simulator = physics.Simulator(context, queue,
+                                  num_worlds=1,
+                                  num_robots=entry['num_robots'],
+                                  ta=entry['ta'], tb=entry['tb'],
+                                  time_step=entry.get('time_step', physics.TIME_STEP),
+                                  random_targets=entry['random_targets'],
+                                  symetrical_targets=entry['symetrical_targets'])
+
+    if 'genome' in entry:
+        param_list = codec.to_matrix([ codec.from_hex(entry['genome']) ])
+    else:
+        param_list = [ entry['params'] ]
+
+    fitness = simulator.simulate_and_save(filename, param_list,
+                                          targets_distance=entry['targets_distance'],
+                                          targets_angle=entry['targets_angle'],
+                                          seeds=[ entry['seed'] ])
+    return float(fitness[0])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("index",                    help="index file written with --lazy-recording", type=str)
+    parser.add_argument("-e", "--entry",            help="entry to replay (negative values count from the end), default is to list the entries", type=int)
+    parser.add_argument("-o", "--output",           help="output file, default is the entry name", type=str)
+    parser.add_argument("--device-type",            help="device type (all, gpu or cpu), default is all", type=str, default='all')
+    args = parser.parse_args()
+
+    entries = read_index(args.index)
+
+    if args.entry is None:
+        for i, entry in enumerate(entries):
+            print '%4d  gen=%04d  seed=%10d  %s' % (i, entry['generation'], entry['seed'], entry['name'])
+        return
+
+    try:
+        entry = entries[args.entry]
+    except IndexError:
+        __log__.error('Index has only %d entries!', len(entries))
+        sys.exit(1)
+
+    device_type = cl.device_type.ALL
+    if args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
+
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
+
+    output = args.output
+    if output is None:
+        output = entry['name'].replace('-fit-%.4f', '')
+
+    fitness = replay(context, queue, entry, output)
+    print '%s: fitness = %.4f' % (output, fitness)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Result reporting.
+
+Runs (solace or local) all expose the same interface: id, begin(),
+progress(value, data), upload(filename, name) and done(). AsyncRun wraps any
+of them so that the optimizers only enqueue records; a background worker
+sends them, coalescing queued progress updates and retrying failures with
+exponential backoff.
+
+LocalExperiment stores everything in a SQLite database plus a files
+directory and needs no service, so runs can be done offline or in tests.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import time
+import json
+import shutil
+import sqlite3
+import logging
+import threading
+import Queue
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+def get_experiment(results_dir=None):
+    """
+    Solace experiment if SOLACE_URI, SOLACE_USERNAME and SOLACE_PASSWORD are
+    set, otherwise a LocalExperiment in results_dir.
+    """
+    uri = os.environ.get('SOLACE_URI')
+    username = os.environ.get('SOLACE_USERNAME')
+    password = os.environ.get('SOLACE_PASSWORD')
+
+    if (uri is not None) and (username is not None) and (password is not None):
+        import solace
+        return solace.get_experiment(uri, username, password)
+
+    if results_dir is not None:
+        return LocalExperiment(results_dir)
+
+    raise Exception('Environment variables (SOLACE_URI, SOLACE_USERNAME, SOLACE_PASSWORD) not set and no results directory given!')
+
+class AsyncRun(object):
+    """
+    Non-blocking proxy for a run. Calls are queued and performed in order by
+    a worker thread; progress records still waiting in the queue are merged
+    into the most recent one. upload(..., delete=True) removes the file once
+    it has been sent, since the caller cannot know when that happens.
+    """
+
+    def __init__(self, run, max_retries=5, backoff=1.0, coalesce=True):
+        self.run = run
+        self.id = run.id
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.coalesce = coalesce
+
+        self.queue = Queue.Queue()
+
+        t = threading.Thread(target=self.worker)
+        t.daemon = True
+        t.start()
+
+    def begin(self):
+        self.queue.put(('begin', (), {}))
+
+    def progress(self, value, data):
+        self.queue.put(('progress', (value, data), {}))
+
+    def upload(self, filename, name, delete=False):
+        self.queue.put(('upload', (filename, name), { 'delete': delete }))
+
+    def done(self):
+        """ Queues done() and waits until every record of this run was sent. """
+        self.queue.put(('done', (), {}))
+        self.queue.join()
+
+    def flush(self):
+        self.queue.join()
+
+    def worker(self):
+        while True:
+            records = [ self.queue.get() ]
+
+            while True:
+                try:
+                    records.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            for i in xrange(len(records)):
+                method, args, kwargs = records[i]
+
+                if self.coalesce and (method == 'progress') and (i+1 < len(records)) and (records[i+1][0] == 'progress'):
+                    continue
+
+                self.call(method, args, kwargs)
+
+            for i in xrange(len(records)):
+                self.queue.task_done()
+
+    def call(self, method, args, kwargs):
+        delete = kwargs.pop('delete', False)
+
+        for attempt in xrange(self.max_retries + 1):
+            try:
+                getattr(self.run, method)(*args, **kwargs)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    __log__.exception('Giving up on %s() for run %s', method, self.id)
+                    break
+
+                delay = self.backoff * (2 ** attempt)
+                __log__.warning('%s() failed for run %s, retrying in %.1f seconds', method, self.id, delay)
+                time.sleep(delay)
+
+        if delete and os.path.exists(args[0]):
+            os.remove(args[0])
+
+class LocalExperiment(object):
+    """ Experiment stored in path/results.db, uploaded files go to path/files/. """
+
+    def __init__(self, path):
+        self.path = path
+        self.files_dir = os.path.join(path, 'files')
+
+        if not os.path.isdir(self.files_dir):
+            os.makedirs(self.files_dir)
+
+        conn = self.connect()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS instances (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                params TEXT,
+                code_version TEXT,
+                created REAL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                instance_id INTEGER,
+                status TEXT,
+                progress REAL,
+                started REAL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS progress (
+                run_id INTEGER,
+                value REAL,
+                data TEXT,
+                time REAL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                run_id INTEGER,
+                name TEXT,
+                path TEXT,
+                time REAL
+            );
+        ''')
+        conn.commit()
+        conn.close()
+
+    def connect(self):
+        # one connection per call, runs are used from several threads
+        return sqlite3.connect(os.path.join(self.path, 'results.db'), timeout=60)
+
+    def create_instance(self, num_runs, params, code_version=None):
+        conn = self.connect()
+        cur = conn.execute('INSERT INTO instances (params, code_version, created) VALUES (?, ?, ?)',
+                           (json.dumps(params), code_version, time.time()))
+        instance_id = cur.lastrowid
+
+        run_ids = []
+        for i in xrange(num_runs):
+            cur = conn.execute('INSERT INTO runs (instance_id, status, progress) VALUES (?, ?, ?)',
+                               (instance_id, 'created', 0.0))
+            run_ids.append(cur.lastrowid)
+
+        conn.commit()
+        conn.close()
+
+        return LocalInstance(self, instance_id, [ LocalRun(self, run_id) for run_id in run_ids ])
+
+class LocalInstance(object):
+    def __init__(self, experiment, id, runs):
+        self.experiment = experiment
+        self.id = id
+        self.runs = runs
+
+class LocalRun(object):
+    def __init__(self, experiment, id):
+        self.experiment = experiment
+        self.id = id
+
+    def execute(self, sql, params):
+        conn = self.experiment.connect()
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def begin(self):
+        self.execute('UPDATE runs SET status = ?, started = ? WHERE id = ?', ('running', time.time(), self.id))
+
+    def progress(self, value, data):
+        conn = self.experiment.connect()
+        conn.execute('INSERT INTO progress (run_id, value, data, time) VALUES (?, ?, ?, ?)',
+                     (self.id, value, json.dumps(data), time.time()))
+        conn.execute('UPDATE runs SET progress = ? WHERE id = ?', (value, self.id))
+        conn.commit()
+        conn.close()
+
+    def upload(self, filename, name):
+        path = os.path.join(self.experiment.files_dir, '%06d-%s' % (self.id, name))
+        shutil.copyfile(filename, path)
+        self.execute('INSERT INTO files (run_id, name, path, time) VALUES (?, ?, ?, ?)',
+                     (self.id, name, path, time.time()))
+
+    def done(self):
+        self.execute('UPDATE runs SET status = ?, progress = ?, finished = ? WHERE id = ?', ('done', 1.0, time.time(), self.id))
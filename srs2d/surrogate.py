@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Surrogate models of the fitness, trained online on the genomes already
+simulated, to pre-screen new ones (see evaluator.Engine).
+
+Genomes are compared through their decoded parameters, so byte genomes
+(codec) and the float parameters of PSO and CMA-ES share the same space.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import numpy as np
+
+def features(params):
+    """ Decoded parameters in [0,1] of a genome matrix or a float parameter matrix. """
+    if params.dtype == np.uint8:
+        return params / 255.0
+    return np.asarray(params, dtype=np.float64)
+
+def rank_correlation(a, b):
+    """ Spearman's rank correlation (ties broken arbitrarily), 0 when undefined. """
+    if len(a) < 2:
+        return 0.0
+
+    ra = np.argsort(np.argsort(a)).astype(np.float64)
+    rb = np.argsort(np.argsort(b)).astype(np.float64)
+    ra -= ra.mean()
+    rb -= rb.mean()
+
+    norm = np.sqrt(np.sum(ra ** 2) * np.sum(rb ** 2))
+    if norm == 0:
+        return 0.0
+
+    return float(np.sum(ra * rb) / norm)
+
+class Ridge(object):
+    """ Linear least squares with an L2 penalty on the weights (not on the bias). """
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.weights = None
+        self.bias = 0.0
+
+    def fit(self, x, y):
+        mean_x = x.mean(axis=0)
+        mean_y = y.mean()
+        xc = x - mean_x
+
+        a = np.dot(xc.T, xc) + self.alpha * np.eye(x.shape[1])
+        self.weights = np.linalg.solve(a, np.dot(xc.T, y - mean_y))
+        self.bias = mean_y - np.dot(mean_x, self.weights)
+
+    def predict(self, x):
+        return np.dot(x, self.weights) + self.bias
+
+class KNN(object):
+    """ Inverse distance weighted mean of the k nearest evaluated genomes. """
+
+    def __init__(self, k=5):
+        self.k = k
+        self.x = None
+        self.y = None
+
+    def fit(self, x, y):
+        self.x = x
+        self.y = y
+
+    def predict(self, x):
+        # squared distances from every row of x to every known genome
+        d2 = np.sum(x ** 2, axis=1)[:,np.newaxis] - 2 * np.dot(x, self.x.T) + np.sum(self.x ** 2, axis=1)
+        d2 = np.maximum(d2, 0)
+
+        k = min(self.k, len(self.x))
+        nearest = np.argsort(d2, axis=1)[:,:k]
+        rows = np.arange(len(x))[:,np.newaxis]
+
+        weights = 1.0 / (np.sqrt(d2[rows, nearest]) + 1e-9)
+        return np.sum(weights * self.y[nearest], axis=1) / np.sum(weights, axis=1)
+
+class Surrogate(object):
+    """
+    A model refitted on an archive of the last `capacity` simulated genomes.
+    screen() picks the genomes worth simulating and record() adds their
+    simulated fitness, measuring how well they had been predicted.
+    """
+
+    MODELS = { 'ridge': Ridge, 'knn': KNN }
+
+    def __init__(self, model='ridge', capacity=2000, min_samples=100):
+        self.model = self.MODELS[model]()
+        self.capacity = capacity
+        self.min_samples = min_samples
+
+        self.x = None
+        self.y = None
+
+        # accuracy on the genomes screened last
+        self.rank_correlation = None
+        self.mean_error = None
+
+    @property
+    def ready(self):
+        return (self.y is not None) and (len(self.y) >= self.min_samples)
+
+    def predict(self, params):
+        return self.model.predict(features(params))
+
+    def screen(self, predicted, fraction, exploration=0.0):
+        """
+        Indexes of the genomes to simulate: the best predicted fraction plus
+        an exploration fraction chosen at random among the others.
+        """
+        n = len(predicted)
+        order = np.argsort(-predicted)
+
+        num_best = min(n, max(1, int(round(fraction * n))))
+        num_random = min(n - num_best, int(round(exploration * n)))
+
+        rest = order[num_best:]
+        chosen = np.random.permutation(len(rest))[:num_random]
+
+        return np.sort(np.concatenate((order[:num_best], rest[chosen])))
+
+    def record(self, params, fitness, predicted=None):
+        """ Adds simulated genomes to the archive and refits the model. """
+        fitness = np.asarray(fitness, dtype=np.float64)
+
+        if predicted is not None:
+            self.rank_correlation = rank_correlation(predicted, fitness)
+            self.mean_error = float(np.mean(np.abs(predicted - fitness)))
+
+        x = features(params)
+        if self.y is not None:
+            x = np.vstack((self.x, x))
+            fitness = np.concatenate((self.y, fitness))
+
+        self.x = x[-self.capacity:]
+        self.y = fitness[-self.capacity:]
+
+        self.model.fit(self.x, self.y)
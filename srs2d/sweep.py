@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Independent runs and hyperparameter sweeps in lockstep.
+
+Each run is executed by a thread of its own, and the populations of every
+run are evaluated together by one FusedEvaluator (see evaluator.py), so a
+generation costs a single simulation batch however many runs there are.
+Runs are still reported, checkpointed and recorded separately.
+
+    python -m srs2d.sweep pso --set inertia=0.5,0.7,0.9 --set alfa=1,2 -- -r 3 -p 10
+
+creates one instance per combination of the given settings (6 here), all
+the other options go to the optimizer (ga, pso, bpso, dpso or cmaes) after --.
+"""
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import sys
+import copy
+import argparse
+import itertools
+import logging
+import threading
+import traceback
+import subprocess
+import pyopencl as cl
+import evaluator
+import report
+
+logging.basicConfig(format='[ %(asctime)s ] [%(levelname)s] %(message)s')
+__log__ = logging.getLogger(__name__)
+
+ALGORITHMS = ('ga', 'pso', 'bpso', 'dpso', 'cmaes')
+
+# settings every run of a lockstep must share: the fused evaluator simulates
+# the scenario of the first run for all of them
+SCENARIO = ('ta', 'tb', 'num_robots', 'trials', 'targets_distances', 'targets_angles',
+            'random_targets', 'symetrical_targets')
+
+def lockstep(context, queue, jobs, execute_run):
+    """
+    Executes execute_run(context, queue, args, run, run_index, evaluator) for
+    each (args, run, run_index) in jobs concurrently, sharing one evaluator.
+    Every job must simulate the same scenario (robots, ta, tb, targets and
+    trials), only the optimizer settings may differ.
+    """
+    fused_evaluator = evaluator.FusedEvaluator(context, queue, jobs[0][0])
+    errors = []
+
+    def worker(args, run, run_index):
+        try:
+            execute_run(context, queue, args, run, run_index, fused_evaluator)
+        except Exception:
+            __log__.error('Run %d failed:\n%s', run_index, traceback.format_exc())
+            errors.append(run_index)
+        finally:
+            fused_evaluator.leave()
+
+    # join everyone first, the first generation must already be fused
+    for job in jobs:
+        fused_evaluator.join()
+
+    threads = []
+    for job in jobs:
+        t = threading.Thread(target=worker, args=job)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise Exception('Runs %s failed!' % ', '.join(str(i) for i in sorted(errors)))
+
+def parse_setting(text):
+    """ 'inertia=0.5,0.9' -> ('inertia', ['0.5', '0.9']) """
+    if '=' not in text:
+        raise ValueError('Setting must be given as NAME=VALUE[,VALUE...]: %s' % text)
+
+    name, values = text.split('=', 1)
+    return name.strip().replace('-', '_'), [ v.strip() for v in values.split(',') ]
+
+def parse_value(default, text, parse_option=None):
+    """
+    text converted to the type of the default value of a setting. Settings
+    without a default (None) are converted by parse_option(text), see
+    option_parser().
+    """
+    if isinstance(default, bool):
+        if text.lower() in ('1', 'true', 'yes', 'on'):
+            return True
+        if text.lower() in ('0', 'false', 'no', 'off'):
+            return False
+        raise ValueError('Not a boolean: %s' % text)
+
+    if default is None:
+        if parse_option is None:
+            raise ValueError('Cannot convert %s, the setting has no default value to take the type from' % text)
+        return parse_option(text)
+
+    return type(default)(text)
+
+def option_parser(parse_args, argv, name):
+    """
+    Function converting a value the way the --NAME option of the optimizer
+    does, parse_args and argv being its parse_args() and other options.
+    """
+    option = '--' + name.replace('_', '-')
+
+    def parse(text):
+        try:
+            return getattr(parse_args(argv + [ option, text ]), name)
+        except SystemExit:
+            raise ValueError('Invalid value for %s: %s' % (option, text))
+
+    return parse
+
+def expand(args, settings, parse_args=None, argv=[]):
+    """
+    A copy of args for each combination of settings, a list of (name,
+    values). Settings without a default value need the optimizer's
+    parse_args and the argv args came from to be converted.
+    """
+    parsers = {}
+    for name, values in settings:
+        if not hasattr(args, name):
+            raise ValueError('Unknown setting %s!' % name)
+
+        if args.lockstep and (name in SCENARIO):
+            raise ValueError('Runs in lockstep share one scenario, %s cannot be swept!' % name)
+
+        if parse_args is not None:
+            parsers[name] = option_parser(parse_args, list(argv), name)
+
+    combinations = []
+    for values in itertools.product(*[ v for name, v in settings ]):
+        combination = copy.copy(args)
+        for (name, ignore), value in zip(settings, values):
+            setattr(combination, name, parse_value(getattr(args, name), value, parsers.get(name)))
+
+        # swept settings skipped the optimizer's checks, e.g. --cache-fitness
+        # in lockstep (cache hits skip submissions and desync the rendezvous)
+        evaluator.check_args(combination)
+        combinations.append(combination)
+
+    return combinations
+
+def main():
+    parser = argparse.ArgumentParser(usage='%(prog)s [-h] [--set NAME=V1,V2,...] ALGORITHM [-- OPTIMIZER OPTIONS]')
+    parser.add_argument("algorithm",                help="optimizer (ga, pso, bpso, dpso or cmaes)", type=str)
+    parser.add_argument("--set",                    help="optimizer setting to sweep, e.g. pmutation=0.01,0.03 (may be repeated)", metavar="NAME=V1,V2,...", action="append", default=[])
+    args, optimizer_args = parser.parse_known_args()
+
+    if args.algorithm not in ALGORITHMS:
+        __log__.error('Algorithm must be one of %s!', ', '.join(ALGORITHMS))
+        sys.exit(1)
+
+    optimizer_args = [ a for a in optimizer_args if a != '--' ]
+
+    module = __import__(args.algorithm)
+
+    # --lockstep lets the optimizer reject the options it cannot run in lockstep
+    optimizer_args = optimizer_args + [ '--lockstep' ]
+    base_args = module.parse_args(optimizer_args)
+
+    try:
+        combinations = expand(base_args, [ parse_setting(s) for s in args.set ], module.parse_args, optimizer_args)
+    except ValueError as e:
+        __log__.error(str(e))
+        sys.exit(1)
+
+    try:
+        git_version = subprocess.check_output('git describe --tags --long'.split(), stderr=subprocess.STDOUT).replace('\n', '')
+    except:
+        git_version = None
+
+    device_type = cl.device_type.ALL
+    if base_args.device_type == 'cpu':
+        device_type = cl.device_type.CPU
+    elif base_args.device_type == 'gpu':
+        device_type = cl.device_type.GPU
+
+    platform = cl.get_platforms()[0]
+    devices = platform.get_devices(device_type=device_type)
+    context = cl.Context(devices=devices)
+    queue = cl.CommandQueue(context)
+
+    exp = report.get_experiment(base_args.results_dir)
+
+    # run indexes keep checkpoints and replay indexes of the sweep apart
+    jobs = []
+    for combination in combinations:
+        inst = exp.create_instance(combination.num_runs, module.instance_params(combination), code_version=git_version)
+        for run in inst.runs:
+            jobs.append((combination, report.AsyncRun(run), len(jobs)+1))
+
+    __log__.info('Sweeping %d combinations, %d runs in lockstep', len(combinations), len(jobs))
+
+    lockstep(context, queue, jobs, module.execute_run)
+
+if __name__=="__main__":
+    main()
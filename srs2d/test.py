@@ -20,6 +20,7 @@ __date__ = "04 Jul 2013"
 
 import argparse
 import physics
+import codec
 import random
 import pyopencl as cl
 import numpy as np
@@ -40,21 +41,17 @@ class TestSimulator(object):
         simulator = physics.Simulator(context, queue, num_worlds=args.num_worlds, num_robots=args.num_robots, ta=args.ta, tb=args.tb, test=False, random_targets=args.random_targets)
 
         if args.params is not None:
-            pos = args.params.decode('hex')
+            pos = codec.from_hex(args.params)
         else:
-            pos = ''
-            for i in xrange(physics.ANN_PARAMS_SIZE):
-                pos += chr(random.randint(0,255))
+            pos = codec.random_genome(physics.ANN_PARAMS_SIZE)
 
-        decoded = np.zeros(len(pos))
-        for i in xrange(len(pos)):
-            decoded[i] = float(ord(pos[i])) / 255
+        params = codec.to_matrix([ pos ] * args.num_worlds)
 
         if args.save is None:
-            fitness = simulator.simulate([ decoded for i in xrange(args.num_worlds) ], targets_distance=args.targets_distance, targets_angle=args.targets_angle)
+            fitness = simulator.simulate(params, targets_distance=args.targets_distance, targets_angle=args.targets_angle)
 
         else:
-            fitness = simulator.simulate_and_save(args.save, [ decoded for i in xrange(args.num_worlds) ], targets_distance=args.targets_distance, targets_angle=args.targets_angle)
+            fitness = simulator.simulate_and_save(args.save, params, targets_distance=args.targets_distance, targets_angle=args.targets_angle)
 
         print 'fitness = ', fitness
 
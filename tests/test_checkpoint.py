@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import unittest
+import random
+import tempfile
+import numpy as np
+import srs2d.checkpoint as checkpoint
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.ckpt')
+        os.close(fd)
+        os.remove(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_roundtrip(self):
+        population = np.random.randint(0, 256, (10, 113)).astype(np.uint8)
+        velocity = np.random.uniform(-1, 1, (10, 113))
+
+        ckpt = checkpoint.Checkpointer(self.filename, freq=5)
+        self.assertIsNone(ckpt.load())
+        self.assertTrue(ckpt.due(5, 100))
+        self.assertFalse(ckpt.due(6, 100))
+        self.assertTrue(ckpt.due(100, 100))
+
+        ckpt.save(5, { 'best_fitness': 0.5 }, { 'population': population, 'velocity': velocity })
+        ckpt.close()
+
+        expected_random = random.random()
+        expected_np = np.random.rand(5)
+
+        header, arrays = ckpt.load()
+        self.assertEqual(header['generation'], 5)
+        self.assertEqual(header['best_fitness'], 0.5)
+        self.assertTrue(np.all(arrays['population'] == population))
+        self.assertTrue(np.all(arrays['velocity'] == velocity))
+
+        # generators are back where they were when the snapshot was taken
+        self.assertEqual(random.random(), expected_random)
+        self.assertTrue(np.all(np.random.rand(5) == expected_np))
+
+    def test_not_a_checkpoint(self):
+        with open(self.filename, 'wb') as fd:
+            fd.write('garbage' * 10)
+
+        self.assertRaises(Exception, checkpoint.load, self.filename)
+
+if __name__ == '__main__':
+    unittest.main()
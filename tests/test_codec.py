@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import unittest
+import numpy as np
+import srs2d.codec as codec
+
+class CodecTest(unittest.TestCase):
+    def test_decode_matches_bytes(self):
+        genome = codec.random_genome(113)
+        self.assertEqual(len(genome), 113)
+
+        decoded = codec.decode(genome)
+        for i in xrange(len(genome)):
+            self.assertAlmostEqual(decoded[i], float(ord(genome[i])) / 255)
+
+    def test_hex_roundtrip(self):
+        genome = codec.random_genome(113)
+        self.assertEqual(codec.to_hex(genome), genome.encode('hex'))
+        self.assertEqual(codec.from_hex(codec.to_hex(genome)), genome)
+        self.assertEqual(codec.to_hex(codec.to_array(genome)), genome.encode('hex'))
+
+    def test_encode_truncates(self):
+        values = np.random.uniform(0, 1, 113)
+        encoded = codec.encode(values)
+        for i in xrange(len(values)):
+            self.assertEqual(ord(encoded[i]), int(values[i] * 255))
+
+    def test_matrix(self):
+        genomes = [ codec.random_genome(113) for i in xrange(5) ]
+        matrix = codec.to_matrix(genomes)
+        self.assertEqual(matrix.shape, (5, 113))
+        self.assertEqual(matrix.dtype, np.uint8)
+        for i in xrange(5):
+            self.assertEqual(matrix[i].tostring(), genomes[i])
+
+if __name__ == '__main__':
+    unittest.main()
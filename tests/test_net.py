@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import time
+import socket
+import unittest
+import multiprocessing
+import srs2d.net as net
+
+TIMEOUT = 10
+
+def wait_for(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.01)
+
+def node_process(port, name, go, results):
+    """ Reports a generation, then sends one migrant and waits for one. """
+    node = net.Node('127.0.0.1', port, name=name, retry_interval=0.1)
+    node.wait_connected(TIMEOUT)
+    node.report(1, 0.5, 1.0, name * 4)
+
+    go.wait(TIMEOUT)
+    node.post_migrants([ (name * 4, float(node.node_id)) ])
+
+    migrants = []
+    deadline = time.time() + TIMEOUT
+    while not migrants and time.time() < deadline:
+        migrants = node.collect_migrants()
+        time.sleep(0.01)
+
+    results.put((node.node_id, migrants))
+    node.stopped.wait(TIMEOUT)
+    node.close()
+
+class TestNet(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = net.Coordinator('127.0.0.1', 0)
+        self.port = self.coordinator.address[1]
+
+    def tearDown(self):
+        self.coordinator.stop()
+
+    def test_migrants_codec(self):
+        migrants = [ ('\x00\x01\x02', 1.5), ('\xff\xfe\xfd', -2.0) ]
+        self.assertEqual(net.decode_migrants(net.encode_migrants(migrants)), migrants)
+        self.assertEqual(net.decode_progress(net.encode_progress(7, 0.25, 0.5, 'abc')), (7, 0.25, 0.5, 'abc'))
+
+    def test_ring_of_processes(self):
+        go = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [ multiprocessing.Process(target=node_process, args=(self.port, name, go, results)) for name in 'abc' ]
+        for p in processes:
+            p.start()
+
+        wait_for(lambda: len(self.coordinator.connected()) == 3)
+        go.set()
+
+        received = dict(results.get(timeout=TIMEOUT) for p in processes)
+
+        # each node gets the migrant of the previous one in the ring
+        self.assertEqual(sorted(received.keys()), [1, 2, 3])
+        for node_id, migrants in received.iteritems():
+            self.assertEqual(len(migrants), 1)
+            self.assertEqual(migrants[0][1], float((node_id - 2) % 3 + 1))
+
+        progress = [ self.coordinator.progress.get(timeout=TIMEOUT) for p in processes ]
+        self.assertEqual(sorted(p[1] for p in progress), [1, 1, 1])
+        self.assertEqual(self.coordinator.best()[0], 1.0)
+
+        self.coordinator.stop()
+        for p in processes:
+            p.join(TIMEOUT)
+            self.assertEqual(p.exitcode, 0)
+
+    def test_reconnect_and_leave(self):
+        node = net.Node('127.0.0.1', self.port, retry_interval=0.05)
+        self.assertTrue(node.wait_connected(TIMEOUT))
+        node.report(3, 0.1, 0.2, 'x')
+        node_id = node.node_id
+
+        self.coordinator.disconnect(node_id)
+        wait_for(lambda: not node.connected.is_set())
+        self.assertTrue(node.wait_connected(TIMEOUT))
+        wait_for(lambda: self.coordinator.connected() == [ node_id ])
+
+        # the last progress is sent again after reconnecting
+        wait_for(lambda: self.coordinator.progress.qsize() >= 2)
+
+        node.close()
+        wait_for(lambda: self.coordinator.connected() == [])
+        self.assertEqual(self.coordinator.left, set([ node_id ]))
+
+    def test_silent_node_is_lost(self):
+        self.coordinator.timeout = 0.2
+
+        # a node that reported stays connected through its heartbeats
+        node = net.Node('127.0.0.1', self.port, heartbeat_interval=0.05)
+        self.assertTrue(node.wait_connected(TIMEOUT))
+        node.report(2, 0.5, 1.0, 'x')
+
+        # a node that never reports nor sends heartbeats
+        sock = socket.create_connection(('127.0.0.1', self.port))
+        net.send_message(sock, net.MSG_HELLO, net.NODE_ID.pack(0))
+        self.assertEqual(net.recv_message(sock)[0], net.MSG_WELCOME)
+
+        wait_for(lambda: len(self.coordinator.connected()) == 2)
+        wait_for(lambda: self.coordinator.archipelago() == (0, 2, 0.5))
+
+        # it counts as gone after the timeout, the run goes on without it
+        wait_for(lambda: self.coordinator.connected() == [ node.node_id ])
+        self.assertEqual(len(self.coordinator.lost), 1)
+        self.assertEqual(self.coordinator.archipelago(), (2, 1, 0.5))
+        time.sleep(0.3)
+        self.assertTrue(node.connected.is_set())
+
+        sock.close()
+        node.close()
+        wait_for(lambda: self.coordinator.archipelago() is None)
+
+if __name__ == '__main__':
+    unittest.main()
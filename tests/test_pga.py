@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import unittest
+import argparse
+import threading
+import Queue
+import numpy as np
+import srs2d.physics as physics
+import srs2d.pga as pga
+
+class FakeIsland(object):
+    """ Answers the commands of PGA like IslandWorker, reporting one generation before the halt arrives. """
+
+    def __init__(self, conn, results, index):
+        self.conn = conn
+        self.results = results
+        self.index = index
+
+    def main(self):
+        while True:
+            command, params = self.conn.recv()
+
+            if command == 'stop':
+                self.conn.send(('ok', None))
+                return
+
+            if command == 'evolve':
+                self.results.put(('generation', self.index, 1, 0.5, 1.0, '\x00' * physics.ANN_PARAMS_SIZE, 10, 0.1))
+
+                # waits for the halt
+                command, params = self.conn.recv()
+                self.conn.send(('ok', None))
+                self.results.put(('done', self.index))
+
+            elif command == 'get_state':
+                self.conn.send(('ok', ({ 'index': self.index }, { 'population': np.zeros((10, 4), dtype=np.uint8) })))
+
+            else:
+                self.conn.send(('ok', None))
+
+class FakeNode(object):
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.stopped.set()
+
+    def report(self, *args):
+        pass
+
+class FakeCheckpointer(object):
+    def __init__(self):
+        self.saved = []
+
+    def load(self):
+        return None
+
+    def due(self, generation, num_generations):
+        return True
+
+    def save(self, generation, header, arrays):
+        self.saved.append((generation, header, arrays))
+
+class PGATest(unittest.TestCase):
+    def test_halt_and_checkpoint_in_the_same_generation(self):
+        p = pga.PGA.__new__(pga.PGA)
+        p.args = argparse.Namespace(num_generations=100, balance_after=0)
+        p.results = Queue.Queue()
+        p.gateway_out = None
+        p.archipelago = [ pga.Island(i) for i in xrange(2) ]
+        p.sizes = [ 10, 10 ]
+
+        threads = []
+        for island in p.archipelago:
+            thread = threading.Thread(target=FakeIsland(island.child_conn, p.results, island.index).main)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        checkpointer = FakeCheckpointer()
+        p.execute(None, checkpointer, node=FakeNode())
+
+        self.assertEqual(len(checkpointer.saved), 1)
+        generation, header, arrays = checkpointer.saved[0]
+        self.assertEqual(generation, 1)
+        self.assertEqual([ h['index'] for h in header['islands'] ], [ 0, 1 ])
+
+        # replies are still in step with the commands
+        for island in p.archipelago:
+            self.assertIsNone(island.call('stop'))
+        for thread in threads:
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import unittest
+import tempfile
+import numpy as np
+import srs2d.checkpoint as checkpoint
+import srs2d.pso as pso
+
+class SwarmCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.ckpt')
+        os.close(fd)
+        os.remove(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def step(self, swarm):
+        swarm.fitness = np.random.uniform(0, 1, len(swarm.fitness))
+        swarm.update_bests()
+        swarm.update_pos_vel()
+
+    def test_snapshot_is_not_changed_by_later_steps(self):
+        swarm = pso.Swarm(20, 113)
+        self.step(swarm)
+
+        header, arrays = swarm.get_state()
+        expected = dict((k, np.copy(v)) for k, v in arrays.iteritems())
+
+        ckpt = checkpoint.Checkpointer(self.filename, freq=1)
+        ckpt.save(1, header, arrays)
+        for i in xrange(3):
+            self.step(swarm)
+        ckpt.close()
+
+        _, loaded = ckpt.load()
+        for k, v in expected.iteritems():
+            self.assertTrue(np.all(arrays[k] == v), k)
+            self.assertTrue(np.all(loaded[k] == v), k)
+
+if __name__ == '__main__':
+    unittest.main()
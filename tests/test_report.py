@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import os
+import json
+import shutil
+import sqlite3
+import unittest
+import tempfile
+import srs2d.report as report
+
+class FlakyRun(object):
+    def __init__(self, failures):
+        self.id = 1
+        self.failures = failures
+        self.calls = []
+
+    def progress(self, value, data):
+        if self.failures > 0:
+            self.failures -= 1
+            raise IOError('connection reset')
+        self.calls.append(('progress', value))
+
+    def done(self):
+        self.calls.append(('done',))
+
+class ReportTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_local_run(self):
+        exp = report.LocalExperiment(self.path)
+        inst = exp.create_instance(2, { 'POPULATION_SIZE': 10 }, code_version='v1')
+        self.assertEqual(len(inst.runs), 2)
+
+        fd, filename = tempfile.mkstemp(suffix='.srs')
+        os.write(fd, 'data')
+        os.close(fd)
+
+        run = report.AsyncRun(inst.runs[0], coalesce=False)
+        run.begin()
+        for i in xrange(5):
+            run.progress(i / 5.0, { 'generation': i })
+        run.upload(filename, 'best.srs', delete=True)
+        run.done()
+
+        self.assertFalse(os.path.exists(filename))
+
+        conn = sqlite3.connect(os.path.join(self.path, 'results.db'))
+        status, progress = conn.execute('SELECT status, progress FROM runs WHERE id = ?', (run.id,)).fetchone()
+        self.assertEqual(status, 'done')
+        self.assertEqual(progress, 1.0)
+
+        rows = conn.execute('SELECT data FROM progress WHERE run_id = ? ORDER BY rowid', (run.id,)).fetchall()
+        self.assertEqual([ json.loads(r[0])['generation'] for r in rows ], range(5))
+
+        path, = conn.execute('SELECT path FROM files WHERE run_id = ?', (run.id,)).fetchone()
+        self.assertEqual(open(path).read(), 'data')
+        conn.close()
+
+    def test_retry(self):
+        flaky = FlakyRun(failures=2)
+        run = report.AsyncRun(flaky, backoff=0.01)
+        run.progress(0.5, {})
+        run.done()
+        self.assertEqual(flaky.calls, [('progress', 0.5), ('done',)])
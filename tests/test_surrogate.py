@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of srs2d.
+#
+# srs2d is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# srs2d is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with srs2d. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Eduardo L. Buratti <eburatti09@gmail.com>"
+__date__ = "19 Oct 2026"
+
+import unittest
+import numpy as np
+import srs2d.surrogate as surrogate
+
+class SurrogateTest(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        self.weights = np.random.uniform(-1, 1, 113)
+
+    def fitness(self, params):
+        return np.dot(surrogate.features(params), self.weights)
+
+    def test_models_rank_unseen_genomes(self):
+        for model in ('ridge', 'knn'):
+            s = surrogate.Surrogate(model, capacity=500, min_samples=100)
+            self.assertFalse(s.ready)
+
+            params = np.random.randint(0, 256, (400, 113)).astype(np.uint8)
+            s.record(params, self.fitness(params))
+            self.assertTrue(s.ready)
+
+            # offspring are close to the genomes already simulated
+            offspring = np.clip(surrogate.features(params[:50]) + np.random.normal(0, 0.02, (50, 113)), 0, 1)
+            self.assertGreater(surrogate.rank_correlation(s.predict(offspring), self.fitness(offspring)), 0.8)
+
+    def test_archive_is_bounded(self):
+        s = surrogate.Surrogate('ridge', capacity=120)
+
+        # the first batch is trimmed too
+        params = np.random.uniform(0, 1, (200, 113))
+        s.record(params, self.fitness(params))
+        self.assertEqual(len(s.y), 120)
+        self.assertEqual(len(s.x), 120)
+
+        for i in xrange(3):
+            params = np.random.uniform(0, 1, (50, 113))
+            s.record(params, self.fitness(params), self.fitness(params))
+
+        self.assertEqual(len(s.y), 120)
+        self.assertEqual(s.rank_correlation, 1.0)
+        self.assertEqual(s.mean_error, 0.0)
+
+    def test_screen(self):
+        s = surrogate.Surrogate()
+        predicted = np.arange(20, dtype=np.float64)
+
+        chosen = s.screen(predicted, 0.25, 0.1)
+        self.assertEqual(len(chosen), 7)
+        self.assertEqual(len(set(chosen)), 7)
+        self.assertTrue(set(range(15, 20)) <= set(chosen))
+
+if __name__ == '__main__':
+    unittest.main()